@@ -1,11 +1,15 @@
 import sys
+import json
 import logging
-from typing import Optional
-from dataclasses import dataclass
+from typing import List, Optional
 
 from mcp.server.fastmcp import FastMCP
 from mcp.server.fastmcp.utilities.logging import get_logger
 
+from outlook_tools.com_executor import ComExecutor
+from outlook_tools.connection import OutlookConnections
+from outlook_tools.contacts import ContactCache, MISSING, UserInfo, format_user_info, resolve_user_info
+
 logger = get_logger(__name__)
 
 try:
@@ -15,73 +19,39 @@ except ImportError:
     logger.error("Failed to import win32com. Please ensure pywin32 is installed correctly.")
     sys.exit(1)
 
-def fix_encoding(text: Optional[str]) -> Optional[str]:
-    """Fix encoding issues with Japanese text from Outlook"""
-    if not text:
-        return None
-    try:
-        # Try different encodings
-        for encoding in ['shift_jis', 'cp932', 'iso-2022-jp']:
-            try:
-                encoded = text.encode(encoding, errors='ignore')
-                decoded = encoded.decode(encoding, errors='ignore')
-                if decoded and not all('?' in c for c in decoded):
-                    return decoded
-            except Exception:
-                continue
-        return text
-    except Exception as e:
-        logger.warning(f"Error fixing encoding: {e}")
-        return text
-
-@dataclass
-class UserInfo:
-    name: str
-    email: Optional[str] = None
-    department: Optional[str] = None
-    job_title: Optional[str] = None
-    company: Optional[str] = None
-    phone: Optional[str] = None
-    location: Optional[str] = None
-    manager: Optional[str] = None
-
 # Create MCP server
 mcp = FastMCP("Outlook Search", dependencies=["pywin32"])
 
-class OutlookWrapper:
-    """Class to manage connection with Outlook"""
-    
-    def __init__(self):
-        self.outlook = None
-        self.mail = None
-        
-    def __enter__(self):
-        try:
-            # Initialize COM for each thread
-            pythoncom.CoInitialize()
-            # Connect to Outlook application
-            self.outlook = win32com.client.Dispatch("Outlook.Application")
-            self.mail = self.outlook.CreateItem(0)  # 0: olMailItem
-            return self
-        except Exception as e:
-            logger.error(f"Error initializing Outlook: {e}")
-            self.cleanup()
-            raise
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.cleanup()
-    
-    def cleanup(self):
-        """Clean up resources"""
-        try:
-            if self.mail:
-                self.mail.Close(1)  # 1: olDiscard
-                self.mail = None
-            if self.outlook:
-                self.outlook = None
-            pythoncom.CoUninitialize()
-        except Exception as e:
-            logger.error(f"Error during cleanup: {e}")
+# Resolved users survive across requests, so repeated lookups skip COM entirely
+contact_cache = ContactCache()
+
+# Outlook objects live on one COM thread; the connection is kept across requests and
+# re-established when Outlook restarts
+com = ComExecutor(name="outlook-search")
+connections = OutlookConnections()
+# Seconds to wait for Outlook
+COM_TIMEOUT = 120.0
+
+def _format_user(name: str, info: Optional[UserInfo]) -> str:
+    if info is None:
+        return f"User not found: {name}"
+    result = format_user_info(info)
+    logger.debug(f"Final formatted result: {result}")
+    return result
+
+def _resolve_user(mail, name: str) -> str:
+    """Resolve ``name`` through Outlook and remember the answer."""
+    try:
+        info = resolve_user_info(mail, name)
+    except LookupError:
+        return f"Could not retrieve user information: {name}"
+    contact_cache.put(name, info)
+    return _format_user(name, info)
+
+def _resolve_users(names: List[str]) -> dict:
+    """Resolve ``names`` on the COM thread, sharing its scratch mail item."""
+    mail = connections.get().scratch_mail()
+    return {name: _resolve_user(mail, name) for name in names}
 
 @mcp.tool()  
 async def search_outlook(name: str) -> str:
@@ -93,49 +63,65 @@ async def search_outlook(name: str) -> str:
     """
     try:
         logger.info(f"Searching for user: {name}")
-        
-        with OutlookWrapper() as outlook_wrapper:
-            if not outlook_wrapper.outlook:
-                return "Failed to connect to Outlook"
-            
-            recipient = outlook_wrapper.mail.Recipients.Add(name)
-            
-            if not recipient.Resolve():
-                logger.warning(f"Could not resolve user: {name}")
-                return f"User not found: {name}"
-            
-            address_entry = recipient.AddressEntry
-            exchange_user = address_entry.GetExchangeUser()
-            
-            if not exchange_user:
-                logger.warning(f"Could not get Exchange user details for: {name}")
-                return f"Could not retrieve user information: {name}"
-            
-            # Create debug log
-            logger.debug(f"Raw department value: {exchange_user.Department}")
-            logger.debug(f"Raw company value: {exchange_user.CompanyName}")
-            
-            # Format response with encoding fix for specific fields
-            response = [
-                "User Information:",
-                f"Name: {exchange_user.Name}",
-                f"Email: {exchange_user.PrimarySmtpAddress}" if exchange_user.PrimarySmtpAddress else "",
-                f"Department: {fix_encoding(exchange_user.Department)}" if exchange_user.Department else "",
-                f"Job Title: {fix_encoding(exchange_user.JobTitle)}" if exchange_user.JobTitle else "",
-                f"Company: {fix_encoding(exchange_user.CompanyName)}" if exchange_user.CompanyName else "",
-                f"Phone: {exchange_user.BusinessTelephoneNumber}" if exchange_user.BusinessTelephoneNumber else "",
-                f"Location: {fix_encoding(exchange_user.OfficeLocation)}" if exchange_user.OfficeLocation else "",
-                f"Manager: {fix_encoding(exchange_user.Manager)}" if exchange_user.Manager else ""
-            ]
-            
-            result = "\n".join(line for line in response if line)
-            logger.debug(f"Final formatted result: {result}")
-            return result
+
+        cached = contact_cache.get(name)
+        if cached is not MISSING:
+            # Cached (including known-unresolvable names): no COM session needed
+            return _format_user(name, cached)
+
+        resolved = await com.run(connections.call, _resolve_users, [name], timeout=COM_TIMEOUT)
+        return resolved[name]
             
     except Exception as e:
         logger.error(f"Error during Outlook search: {str(e)}", exc_info=True)
         return f"Error searching Outlook: {str(e)}"
 
+@mcp.tool()
+async def search_contacts(names: List[str]) -> str:
+    """
+    Search for several users in Outlook using a single Outlook session.
+
+    Args:
+        names: Names or emails to search for
+    """
+    try:
+        unique_names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+        if not unique_names:
+            return "No names given."
+        logger.info(f"Searching for {len(unique_names)} users")
+
+        results = {}
+        for name in unique_names:
+            cached = contact_cache.get(name)
+            if cached is not MISSING:
+                results[name] = _format_user(name, cached)
+
+        misses = [name for name in unique_names if name not in results]
+        if misses:
+            results.update(await com.run(connections.call, _resolve_users, misses, timeout=COM_TIMEOUT))
+
+        return "\n\n".join(results[name] for name in unique_names)
+
+    except Exception as e:
+        logger.error(f"Error during Outlook search: {str(e)}", exc_info=True)
+        return f"Error searching Outlook: {str(e)}"
+
+@mcp.tool()
+async def get_contact_cache_stats() -> str:
+    """Show hit/miss statistics of the resolved-contact cache"""
+    return json.dumps(contact_cache.stats())
+
+@mcp.tool()
+async def get_connection_stats() -> str:
+    """Show how often the Outlook connection was set up, reused and re-established"""
+    return json.dumps(connections.stats())
+
+@mcp.tool()
+async def clear_contact_cache(name: str = "") -> str:
+    """Forget a cached contact (or every cached contact when no name is given)"""
+    removed = contact_cache.invalidate(name or None)
+    return f"Removed {removed} cached contact(s)."
+
 def main():
     logging.basicConfig(level=logging.DEBUG)
     logger.info("Starting Outlook Search MCP Server")
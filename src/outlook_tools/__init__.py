@@ -1 +1,6 @@
-from .server import mcp
\ No newline at end of file
+def __getattr__(name):
+    # Importing the server connects to Outlook; only do it when asked for.
+    if name == "mcp":
+        from .server import mcp
+        return mcp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,152 @@
+"""Validation, clash detection and reporting for batches of appointments.
+
+``add_appointments`` checks every entry before anything is written, so a
+typo in item 30 does not leave items 1-29 behind. Duplicates and
+overlaps are then found against one ranged fetch of the existing calendar
+covering the whole batch: the existing appointments are sorted once and
+each new entry bisects into them, instead of one Restrict per entry.
+"""
+import bisect
+import datetime
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+OL_FREE = 0  # BusyStatus olFree; free time never conflicts
+
+CREATED = "created"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+ROLLED_BACK = "rolled back"
+NOT_SAVED = "not saved"
+
+FIELDS = ("subject", "start_time", "end_time", "location", "description", "categories", "busy_status")
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(tzinfo=None)
+
+
+@dataclass(frozen=True)
+class AppointmentRequest:
+    """One validated entry; ``number`` is its 1-based position in the batch."""
+    number: int
+    subject: str
+    start: datetime.datetime
+    end: datetime.datetime
+    location: str = ""
+    body: str = ""
+    categories: str = ""
+    busy_status: int = 1
+
+    @property
+    def sends_invitation(self) -> bool:
+        # Same rule as add_appointment: categorized or non-tentative items are sent
+        return bool(self.categories) or self.busy_status != 1
+
+
+@dataclass
+class Clash:
+    duplicate: bool = False
+    conflicts: List[str] = field(default_factory=list)
+
+
+@dataclass
+class AppointmentResult:
+    request: AppointmentRequest
+    status: str = NOT_SAVED
+    entry_id: Optional[str] = None
+    error: str = ""
+    conflicts: List[str] = field(default_factory=list)
+
+
+def parse_requests(items: Sequence[Any],
+                   parse: Callable[[str], datetime.datetime]) -> Tuple[List[AppointmentRequest], List[str]]:
+    """Validate raw tool entries; returns the requests and one message per problem."""
+    requests, errors = [], []
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            errors.append(f"Item {number}: expected an object with {', '.join(FIELDS)}")
+            continue
+        problems = [f"unknown field '{name}'" for name in item if name not in FIELDS]
+        subject = str(item.get("subject") or "").strip()
+        if not subject:
+            problems.append("subject is required")
+        times = []
+        for name in ("start_time", "end_time"):
+            text = str(item.get(name) or "").strip()
+            try:
+                times.append(parse(text) if text else None)
+            except (ValueError, OverflowError):
+                problems.append(f"invalid {name} '{text}'")
+                times.append(None)
+            else:
+                if not text:
+                    problems.append(f"{name} is required")
+        start, end = times
+        if start is not None and end is not None and end <= start:
+            problems.append("end_time must be after start_time")
+        try:
+            busy_status = int(item.get("busy_status", 1))
+            if not 0 <= busy_status <= 4:
+                raise ValueError(busy_status)
+        except (TypeError, ValueError):
+            problems.append("busy_status must be 0-4")
+            busy_status = 1
+        if problems:
+            errors.append(f"Item {number}: " + "; ".join(problems))
+            continue
+        requests.append(AppointmentRequest(number, subject, start, end, str(item.get("location") or ""),
+                                           str(item.get("description") or ""),
+                                           str(item.get("categories") or ""), busy_status))
+    return requests, errors
+
+
+def find_clashes(requests: Sequence[AppointmentRequest], existing: Iterable[Any]) -> List[Clash]:
+    """Duplicates of, and overlaps with, ``existing`` rows and earlier requests.
+
+    A duplicate has the same subject, start and end. Overlaps only count
+    when neither side is free time.
+    """
+    booked = sorted((_naive(row.start), _naive(row.end), (row.subject or "").strip(), row.busy_status)
+                    for row in existing)
+    starts = [entry[0] for entry in booked]
+    longest = max((end - start for start, end, _, _ in booked), default=datetime.timedelta(0))
+    clashes = []
+    for request in requests:
+        clash = Clash()
+        # Anything starting earlier than this cannot reach request.start
+        lo = bisect.bisect_left(starts, request.start - longest)
+        hi = bisect.bisect_left(starts, request.end)
+        for start, end, subject, busy_status in booked[lo:hi]:
+            if end <= request.start:
+                continue
+            if (start, end, subject) == (request.start, request.end, request.subject):
+                clash.duplicate = True
+            elif busy_status != OL_FREE and request.busy_status != OL_FREE:
+                clash.conflicts.append(f"{subject} ({start:%Y-%m-%d %H:%M}-{end:%H:%M})")
+        if clash.duplicate:
+            # Already in the calendar; its overlaps are nothing new
+            clash.conflicts.clear()
+        clashes.append(clash)
+        if not clash.duplicate:
+            # Later entries of the same batch are checked against this one too
+            index = bisect.bisect_right(starts, request.start)
+            starts.insert(index, request.start)
+            booked.insert(index, (request.start, request.end, request.subject, request.busy_status))
+            longest = max(longest, request.end - request.start)
+    return clashes
+
+
+def format_results(results: Sequence[AppointmentResult]) -> str:
+    created = sum(result.status == CREATED for result in results)
+    lines = [f"Added {created} of {len(results)} appointment(s):"]
+    for result in results:
+        request = result.request
+        line = (f"{request.number}. {result.status}: {request.subject} "
+                f"({request.start:%Y-%m-%d %H:%M}-{request.end:%H:%M})")
+        if result.error:
+            line += f" - {result.error}"
+        if result.conflicts:
+            line += " - overlaps " + ", ".join(result.conflicts)
+        lines.append(line)
+    return "\n".join(lines)
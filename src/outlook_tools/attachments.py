@@ -0,0 +1,558 @@
+"""Keyword search in the text of mail attachments.
+
+The answer to a search is often in an attached PDF, Word, Excel or
+PowerPoint file rather than in the mail itself. :class:`AttachmentSearch`
+saves such attachments with ``Attachment.SaveAsFile`` into a temp area of
+bounded size and extracts their text in a process pool, so that parsing
+a large file neither holds the GIL of the server nor a COM thread longer
+than the wait for its result. Every parser streams its input and stops
+at ``max_chars`` characters; decompressed data is capped as well.
+
+Extracted text is kept in a :class:`TextCache` on disk, keyed by EntryID,
+attachment index and size, and evicted least recently used first. An
+attachment is therefore extracted once, however often it is searched.
+
+Only the standard library is needed. PDFs use ``pypdf`` when it is
+installed; otherwise a small built-in reader handles text drawn with
+simple fonts, which excludes most Japanese PDFs.
+"""
+import codecs
+import concurrent.futures
+import contextlib
+import hashlib
+import html
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from mcp.server.fastmcp.utilities.logging import get_logger
+
+logger = get_logger(__name__)
+
+OL_BY_VALUE = 1  # olByValue: a file stored in the item
+DEFAULT_MAX_ATTACHMENT_BYTES = 20 * 1024 * 1024
+DEFAULT_MAX_TEXT_CHARS = 200_000
+DEFAULT_TEMP_BYTES = 100 * 1024 * 1024
+DEFAULT_CACHE_BYTES = 200 * 1024 * 1024
+DEFAULT_EXTRACT_WORKERS = 2
+DEFAULT_EXTRACT_TIMEOUT = 60.0
+# Upper bound on the XML or PDF stream bytes inflated per character of output
+_INFLATE_RATIO = 64
+_EXCERPT_CHARS = 80
+
+_WORD = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_SHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DRAWING = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+PLAIN_EXTENSIONS = frozenset({".txt", ".csv", ".tsv", ".md", ".log", ".json", ".xml", ".htm", ".html"})
+SUPPORTED_EXTENSIONS = PLAIN_EXTENSIONS | {".docx", ".xlsx", ".pptx", ".pdf"}
+
+
+def default_cache_path() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.path.join(base, "mcp-outlook-tools", "attachments")
+
+
+def extension(file_name: str) -> str:
+    return os.path.splitext(file_name or "")[1].lower()
+
+
+# -- extraction (runs in the process pool) -------------------------------------
+
+class _Full(Exception):
+    """Raised once the output holds ``max_chars`` characters."""
+
+
+class _Output:
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.size = 0
+
+    def add(self, text: Optional[str]):
+        if not text:
+            return
+        room = self.max_chars - self.size
+        self.parts.append(text[:room])
+        self.size += min(len(text), room)
+        if self.size >= self.max_chars:
+            raise _Full
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+class _Capped:
+    """Read-only file wrapper ending the stream after ``limit`` bytes."""
+
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.remaining = limit
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def _decode(data: bytes, final: bool = True) -> str:
+    """Decode ``data``; unless ``final``, it may end in the middle of a character."""
+    for encoding in ("utf-8-sig", "cp932"):
+        try:
+            return codecs.getincrementaldecoder(encoding)().decode(data, final=final)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _plain(path: str, out: _Output):
+    # Enough bytes for max_chars characters in any of the encodings tried
+    limit = out.max_chars * 4
+    with open(path, "rb") as f:
+        data = f.read(limit)
+    text = _decode(data, final=len(data) < limit)
+    if extension(path) in (".htm", ".html"):
+        text = html.unescape(re.sub(r"<[^>]*>", " ", re.sub(r"(?is)<(script|style).*?</\1>", " ", text)))
+    out.add(text)
+
+
+def _xml_parts(archive: zipfile.ZipFile, names: List[str], out: _Output) -> Iterator[Tuple[str, Any]]:
+    """(event, element) of each part in turn, stopping quietly at the inflate cap or bad XML."""
+    budget = out.max_chars * _INFLATE_RATIO
+    for name in names:
+        with archive.open(name) as part:
+            capped = _Capped(part, budget)
+            try:
+                yield from ElementTree.iterparse(capped, events=("end",))
+            except ElementTree.ParseError:
+                # Truncated by the cap, or malformed; keep what was read
+                pass
+            budget = capped.remaining
+        if budget <= 0:
+            return
+
+
+def _numbered(names: List[str], pattern: str) -> List[str]:
+    matches = [(int(match.group(1)), name) for name in names for match in [re.fullmatch(pattern, name)] if match]
+    return [name for _, name in sorted(matches)]
+
+
+def _docx(path: str, out: _Output):
+    with zipfile.ZipFile(path) as archive:
+        for _, element in _xml_parts(archive, ["word/document.xml"], out):
+            tag = element.tag
+            if tag == _WORD + "t":
+                out.add(element.text)
+            elif tag in (_WORD + "tab", _WORD + "br"):
+                out.add(" ")
+            elif tag == _WORD + "p":
+                out.add("\n")
+                element.clear()
+
+
+def _pptx(path: str, out: _Output):
+    with zipfile.ZipFile(path) as archive:
+        slides = _numbered(archive.namelist(), r"ppt/slides/slide(\d+)\.xml")
+        for _, element in _xml_parts(archive, slides, out):
+            if element.tag == _DRAWING + "t":
+                out.add(element.text)
+            elif element.tag == _DRAWING + "p":
+                out.add("\n")
+                element.clear()
+
+
+def _xlsx(path: str, out: _Output):
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in names:
+            # Shared strings are only referenced; bound them like the output
+            strings = _Output(out.max_chars)
+            try:
+                for _, element in _xml_parts(archive, ["xl/sharedStrings.xml"], out):
+                    if element.tag == _SHEET + "si":
+                        text = "".join(node.text or "" for node in element.iter(_SHEET + "t"))
+                        shared.append(text)
+                        element.clear()
+                        strings.add(text)
+            except _Full:
+                pass
+        sheets = _numbered(names, r"xl/worksheets/sheet(\d+)\.xml")
+        for _, element in _xml_parts(archive, sheets, out):
+            if element.tag == _SHEET + "c":
+                kind = element.get("t")
+                if kind == "inlineStr":
+                    value = "".join(node.text or "" for node in element.iter(_SHEET + "t"))
+                else:
+                    value = element.findtext(_SHEET + "v") or ""
+                    if kind == "s" and value.isdigit():
+                        index = int(value)
+                        value = shared[index] if index < len(shared) else ""
+                if value:
+                    out.add(value + "\t")
+                element.clear()
+            elif element.tag == _SHEET + "row":
+                out.add("\n")
+                element.clear()
+
+
+_PDF_STREAM = re.compile(rb"(?<!end)stream\r?\n")
+_PDF_TEXT = re.compile(rb"BT(.*?)ET", re.S)
+_PDF_STRING = re.compile(rb"\((?:\\.|[^\\)])*\)", re.S)
+# A string or an array of strings with the operator showing it
+_PDF_SHOW = re.compile(rb"(\((?:\\.|[^\\)])*\)|\[(?:\((?:\\.|[^\\)])*\)|[^\]])*\])\s*(?:Tj|TJ|'|\")", re.S)
+_PDF_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+
+
+def _pdf_string(literal: bytes) -> str:
+    def unescape(match):
+        escaped = match.group(1)
+        if escaped[:1].isdigit():
+            return bytes([int(escaped, 8) & 0xFF])
+        return _PDF_ESCAPES.get(escaped, escaped)
+
+    return re.sub(rb"\\([0-7]{1,3}|.)", unescape, literal[1:-1], flags=re.S).decode("latin-1")
+
+
+def _pdf_builtin(path: str, out: _Output):
+    with open(path, "rb") as f:
+        data = f.read()
+    budget = out.max_chars * _INFLATE_RATIO
+    for match in _PDF_STREAM.finditer(data):
+        start = match.end()
+        end = data.find(b"endstream", start)
+        if end < 0:
+            break
+        dictionary = data[data.rfind(b"obj", 0, match.start()):match.start()]
+        raw = data[start:end]
+        if b"/FlateDecode" in dictionary:
+            try:
+                raw = zlib.decompressobj().decompress(raw, budget)
+            except zlib.error:
+                continue
+        elif b"/Filter" in dictionary:
+            # Images and other encodings hold no text
+            continue
+        budget -= len(raw)
+        for block in _PDF_TEXT.finditer(raw):
+            shown = [_PDF_STRING.findall(operand) for operand in _PDF_SHOW.findall(block.group(1))]
+            out.add(" ".join("".join(_pdf_string(literal) for literal in literals) for literals in shown))
+            out.add("\n")
+        if budget <= 0:
+            break
+
+
+def _pdf(path: str, out: _Output):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        _pdf_builtin(path, out)
+        return
+    for page in PdfReader(path).pages:
+        out.add(page.extract_text())
+        out.add("\n")
+
+
+_EXTRACTORS = {".docx": _docx, ".xlsx": _xlsx, ".pptx": _pptx, ".pdf": _pdf}
+
+
+def extract_text(path: str, max_chars: int = DEFAULT_MAX_TEXT_CHARS) -> str:
+    """Text of the file at ``path``, at most ``max_chars`` characters; chosen by file extension."""
+    out = _Output(max_chars)
+    try:
+        _EXTRACTORS.get(extension(path), _plain)(path, out)
+    except _Full:
+        pass
+    return out.text()
+
+
+# -- cache ---------------------------------------------------------------------
+
+def cache_key(entry_id: str, index: int, size: int) -> str:
+    return hashlib.sha1(f"{entry_id}\x1f{index}\x1f{size}".encode("utf-8")).hexdigest()
+
+
+class TextCache:
+    """Extracted texts on disk, least recently used evicted beyond ``max_bytes``.
+
+    The directory is only read when first used.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".txt")
+
+    def _load(self) -> "OrderedDict[str, int]":
+        if self._entries is None:
+            os.makedirs(self.directory, exist_ok=True)
+            found = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".txt"):
+                    status = entry.stat()
+                    found.append((status.st_mtime, entry.name[:-4], status.st_size))
+            self._entries = OrderedDict((key, size) for _, key, size in sorted(found))
+            self._bytes = sum(self._entries.values())
+        return self._entries
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entries = self._load()
+            if key not in entries:
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                text = f.read()
+            os.utime(self._path(key))
+            return text
+        except OSError:
+            with self._lock:
+                self._bytes -= entries.pop(key, 0)
+            return None
+
+    def put(self, key: str, text: str):
+        data = text.encode("utf-8")
+        with self._lock:
+            entries = self._load()
+            path = self._path(key)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self._bytes += len(data) - entries.pop(key, 0)
+            entries[key] = len(data)
+            while self._bytes > self.max_bytes and len(entries) > 1:
+                old, size = entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old))
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = len(self._entries) if self._entries is not None else 0
+            return {"entries": entries, "bytes": self._bytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+# -- search --------------------------------------------------------------------
+
+class _TempArea:
+    """Directory for saved attachments holding at most ``max_bytes`` at a time."""
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self._directory = directory
+        self._used = 0
+        self._condition = threading.Condition()
+
+    @property
+    def directory(self) -> str:
+        with self._condition:
+            if self._directory is None:
+                self._directory = tempfile.mkdtemp(prefix="outlook-attachments-")
+            return self._directory
+
+    def reserve(self, size: int, timeout: Optional[float]) -> bool:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._used + size <= self.max_bytes, timeout):
+                return False
+            self._used += size
+            return True
+
+    def release(self, size: int):
+        with self._condition:
+            self._used -= size
+            self._condition.notify_all()
+
+    def remove(self):
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+
+@dataclass(frozen=True)
+class AttachmentMatch:
+    """Attachment whose text contains the keyword, with the text around it."""
+    file_name: str
+    excerpt: str
+
+
+def excerpt(text: str, position: int, length: int) -> str:
+    start = max(0, position - _EXCERPT_CHARS)
+    end = min(len(text), position + length + _EXCERPT_CHARS)
+    snippet = " ".join(text[start:end].split())
+    return ("..." if start else "") + snippet + ("..." if end < len(text) else "")
+
+
+class AttachmentSearch:
+    """Finds keywords in attachment text; call :meth:`find` on a COM thread.
+
+    ``executor`` runs :func:`extract_text`; by default a process pool of
+    ``workers`` processes is started on first use.
+    """
+
+    def __init__(self, cache: TextCache, max_size: int = DEFAULT_MAX_ATTACHMENT_BYTES,
+                 max_chars: int = DEFAULT_MAX_TEXT_CHARS, temp_bytes: int = DEFAULT_TEMP_BYTES,
+                 workers: int = DEFAULT_EXTRACT_WORKERS, timeout: float = DEFAULT_EXTRACT_TIMEOUT,
+                 executor: Optional[concurrent.futures.Executor] = None, temp_dir: Optional[str] = None):
+        self.cache = cache
+        self.max_size = min(max_size, temp_bytes)
+        self.max_chars = max_chars
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = executor
+        self._temp = _TempArea(temp_bytes, temp_dir)
+        self._lock = threading.Lock()
+        self._counts = {"extracted": 0, "skipped": 0, "failed": 0}
+        # Extractions by cache key whose file and result are still to be settled
+        self._running: Dict[str, Tuple[concurrent.futures.Future, str, int, str]] = {}
+        self._settling = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    @property
+    def executor(self) -> concurrent.futures.Executor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers on every platform: the server's COM threads must not be forked
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _extract(self, attachment, file_name: str, size: int, key: str) -> Optional[concurrent.futures.Future]:
+        if not self._temp.reserve(size, self.timeout):
+            self._count("skipped")
+            return None
+        path = os.path.join(self._temp.directory, uuid.uuid4().hex + extension(file_name))
+        try:
+            attachment.SaveAsFile(path)
+            future = self.executor.submit(extract_text, path, self.max_chars)
+        except Exception:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            self._temp.release(size)
+            raise
+
+        with self._lock:
+            self._running[key] = (future, path, size, file_name)
+        future.add_done_callback(lambda done: self._settle(key))
+        return future
+
+    def _in_flight(self, key: str) -> Optional[concurrent.futures.Future]:
+        with self._lock:
+            running = self._running.get(key)
+        return running[0] if running else None
+
+    def _settle(self, key: str):
+        """Remove the saved file and cache the text; whichever of waiter and callback comes first.
+
+        The other one waits until this is done, so a finished extraction is always in the cache.
+        """
+        with self._settling:
+            with self._lock:
+                running = self._running.pop(key, None)
+            if running is None:
+                return
+            future, path, size, file_name = running
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            self._temp.release(size)
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                self._count("extracted")
+                self.cache.put(key, future.result())
+            else:
+                # Remembered as empty so that a broken file is not parsed again
+                self._count("failed")
+                logger.warning(f"Could not extract text from {file_name}: {error}")
+                self.cache.put(key, "")
+
+    def texts(self, item, entry_id: str) -> Iterator[Tuple[str, str]]:
+        """(file name, text) of each searchable attachment of ``item``."""
+        attachments = item.Attachments
+        pending: List[Tuple[str, str, Optional[str], Optional[concurrent.futures.Future]]] = []
+        for index in range(1, attachments.Count + 1):
+            attachment = attachments.Item(index)
+            file_name = attachment.FileName or ""
+            if attachment.Type != OL_BY_VALUE or extension(file_name) not in SUPPORTED_EXTENSIONS:
+                continue
+            size = attachment.Size
+            key = cache_key(entry_id, index, size)
+            text = self.cache.get(key)
+            if text is not None:
+                pending.append((file_name, key, text, None))
+            elif size > self.max_size:
+                self._count("skipped")
+            else:
+                # Saved and submitted together, so one item's attachments are parsed in parallel
+                future = self._in_flight(key) or self._extract(attachment, file_name, size, key)
+                if future is not None:
+                    pending.append((file_name, key, None, future))
+        deadline = time.monotonic() + self.timeout
+        for file_name, key, text, future in pending:
+            if future is not None:
+                try:
+                    text = future.result(max(0.0, deadline - time.monotonic()))
+                except concurrent.futures.TimeoutError:
+                    logger.warning(f"Extracting text from {file_name} timed out")
+                    continue
+                except Exception:
+                    continue
+                finally:
+                    if future.done():
+                        self._settle(key)
+            yield file_name, text
+
+    def find(self, item, entry_id: str, keyword: str) -> Optional[AttachmentMatch]:
+        """The first attachment of ``item`` whose text contains ``keyword`` (case-insensitively)."""
+        needle = keyword.lower()
+        for file_name, text in self.texts(item, entry_id):
+            position = text.lower().find(needle)
+            if position >= 0:
+                return AttachmentMatch(file_name, excerpt(text, position, len(needle)))
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counts)
+        stats["cache"] = self.cache.stats()
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._temp.remove()
@@ -0,0 +1,279 @@
+"""Interval cache of expanded calendar occurrences.
+
+Planning a week means many ``get_calendar`` calls over overlapping ranges,
+and each one re-runs ``Sort``, recurrence expansion and ``Restrict`` in
+Outlook. :class:`CalendarRangeCache` remembers which time ranges it has
+fetched completely and keeps every occurrence overlapping them, so any
+sub-range is answered from memory and only uncovered gaps go to Outlook.
+
+Entries are dropped precisely: by time range for our own writes, by
+``EntryID`` for ItemAdd/ItemChange events, and by EntryID reconciliation for
+ItemRemove (which does not say what was removed).
+"""
+import bisect
+import datetime
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .table_reader import JET_DATE_FORMAT, AppointmentRow, TableReader
+
+DEFAULT_MAX_ROWS = 5000
+
+_Key = Tuple[str, datetime.datetime]
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    # pywin32 tags local COM times with a tzinfo; compare wall-clock values.
+    return value.replace(tzinfo=None)
+
+
+def fetch_appointments(folder, reader: TableReader, start: datetime.datetime,
+                       end: datetime.datetime) -> List[AppointmentRow]:
+    """Every occurrence overlapping ``[start, end)``, sorted by start."""
+    restriction = "[Start] < '{}' AND [End] > '{}'".format(
+        end.strftime(JET_DATE_FORMAT), start.strftime(JET_DATE_FORMAT))
+
+    # Single appointments come from one batched table read. Tables do not
+    # expand recurring series, so occurrences still go through Items.
+    result = list(reader.read(AppointmentRow, restriction + " AND [IsRecurring] = False"))
+
+    items = folder.Items
+    items.IncludeRecurrences = True
+    items.Sort("[Start]")
+    for appointment in items.Restrict(restriction + " AND [IsRecurring] = True"):
+        result.append(AppointmentRow.from_item(appointment))
+
+    result.sort(key=lambda row: _naive(row.start))
+    return result
+
+
+class CalendarRangeCache:
+    """Caches occurrences for the time ranges it has fully fetched.
+
+    ``fetch(start, end)`` must return every occurrence overlapping
+    ``[start, end)``. :meth:`get` keeps the original ``get_calendar_items``
+    semantics and returns occurrences lying entirely inside the range.
+    """
+
+    def __init__(self, fetch: Callable[[datetime.datetime, datetime.datetime], Iterable[AppointmentRow]],
+                 max_rows: int = DEFAULT_MAX_ROWS, clock: Callable[[], float] = time.monotonic):
+        self._fetch = fetch
+        self.max_rows = max_rows
+        self._clock = clock
+        # Disjoint [start, end, last_used] segments known to be complete,
+        # sorted by start
+        self._covered: List[list] = []
+        self._rows: Dict[_Key, AppointmentRow] = {}
+        self._by_start: List[Tuple[datetime.datetime, str]] = []
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetched_rows = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    # -- coverage bookkeeping -------------------------------------------------
+
+    def _gaps(self, start: datetime.datetime, end: datetime.datetime) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        gaps = []
+        cursor = start
+        for covered_start, covered_end, _ in self._covered:
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def _cover(self, start: datetime.datetime, end: datetime.datetime):
+        # Each fetched gap stays its own segment, so eviction can drop the
+        # least recently used part of a long browsed range.
+        bisect.insort(self._covered, [start, end, self._clock()])
+
+    def _touch(self, start: datetime.datetime, end: datetime.datetime):
+        now = self._clock()
+        for interval in self._covered:
+            if interval[0] < end and interval[1] > start:
+                interval[2] = now
+
+    def _uncover(self, start: datetime.datetime, end: datetime.datetime):
+        remaining = []
+        for interval in self._covered:
+            covered_start, covered_end, used = interval
+            if covered_end <= start or covered_start >= end:
+                remaining.append(interval)
+                continue
+            if covered_start < start:
+                remaining.append([covered_start, start, used])
+            if covered_end > end:
+                remaining.append([end, covered_end, used])
+        self._covered = remaining
+
+    # -- rows -----------------------------------------------------------------
+
+    def _add(self, row: AppointmentRow):
+        start = _naive(row.start)
+        key = (row.entry_id, start)
+        if key not in self._rows:
+            bisect.insort(self._by_start, (start, row.entry_id))
+        self._rows[key] = row
+
+    def _remove(self, key: _Key):
+        del self._rows[key]
+        index = bisect.bisect_left(self._by_start, (key[1], key[0]))
+        del self._by_start[index]
+
+    def _drop(self, keys: Iterable[_Key], start: Optional[datetime.datetime] = None,
+              end: Optional[datetime.datetime] = None):
+        """Remove rows and stop claiming coverage wherever they overlapped.
+
+        A dropped row must not leave a covered range that would now silently
+        miss it, so the uncovered span grows to include every dropped row
+        (and whatever further rows that span overlaps).
+        """
+        pending = list(keys)
+        while pending:
+            for key in pending:
+                row = self._rows.get(key)
+                if row is None:
+                    continue
+                self._remove(key)
+                row_start, row_end = key[1], _naive(row.end)
+                start = row_start if start is None else min(start, row_start)
+                end = row_end if end is None else max(end, row_end)
+            pending = self._overlapping(start, end) if start is not None else []
+        if start is not None:
+            self._uncover(start, end)
+
+    def _overlapping(self, start: datetime.datetime, end: datetime.datetime) -> List[_Key]:
+        # A full scan is fine at max_rows scale and catches long events
+        # that start well before the range.
+        return [key for key, row in self._rows.items()
+                if key[1] < end and _naive(row.end) > start]
+
+    # -- public API ----------------------------------------------------------
+
+    def get(self, start: datetime.datetime, end: datetime.datetime) -> List[AppointmentRow]:
+        """Occurrences with ``start <= Start`` and ``End <= end``, sorted by start."""
+        start, end = _naive(start), _naive(end)
+        gaps = self._gaps(start, end)
+        if not gaps:
+            self.hits += 1
+        elif gaps == [(start, end)]:
+            self.misses += 1
+        else:
+            self.partial_hits += 1
+
+        for gap_start, gap_end in gaps:
+            rows = list(self._fetch(gap_start, gap_end))
+            self.fetches += 1
+            self.fetched_rows += len(rows)
+            for row in rows:
+                self._add(row)
+            self._cover(gap_start, gap_end)
+        self._touch(start, end)
+
+        lo = bisect.bisect_left(self._by_start, (start, ""))
+        result = []
+        for row_start, entry_id in self._by_start[lo:]:
+            if row_start >= end:
+                break
+            row = self._rows[(entry_id, row_start)]
+            if _naive(row.end) <= end:
+                result.append(row)
+
+        self._evict(keep=(start, end))
+        return result
+
+    def _evict(self, keep: Tuple[datetime.datetime, datetime.datetime]):
+        while len(self._rows) > self.max_rows:
+            candidates = [interval for interval in self._covered
+                          if not (interval[0] < keep[1] and interval[1] > keep[0])]
+            if not candidates:
+                break
+            victim = min(candidates, key=lambda interval: interval[2])
+            self._drop(self._overlapping(victim[0], victim[1]), victim[0], victim[1])
+            self.evictions += 1
+
+    def invalidate_range(self, start: datetime.datetime, end: datetime.datetime):
+        """Forget everything overlapping ``[start, end)`` (e.g. after a write)."""
+        start, end = _naive(start), _naive(end)
+        self.invalidations += 1
+        self._drop(self._overlapping(start, end), start, end)
+
+    def invalidate_entry(self, entry_id: str, spans: Iterable[Tuple[datetime.datetime, datetime.datetime]] = ()):
+        """Forget every occurrence of ``entry_id`` plus the given new spans."""
+        self.invalidations += 1
+        keys = [key for key in self._rows if key[0] == entry_id]
+        self._drop(keys)
+        for span_start, span_end in spans:
+            span_start, span_end = _naive(span_start), _naive(span_end)
+            self._drop(self._overlapping(span_start, span_end), span_start, span_end)
+
+    def reconcile(self, present_entry_ids: Set[str]):
+        """Drop occurrences whose item no longer exists."""
+        gone = [key for key in self._rows if key[0] not in present_entry_ids]
+        if gone:
+            self.invalidations += 1
+            self._drop(gone)
+
+    def clear(self):
+        self._covered.clear()
+        self._rows.clear()
+        self._by_start.clear()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "rows": len(self._rows),
+            "max_rows": self.max_rows,
+            "ranges": len(self._covered),
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+            "fetched_rows": self.fetched_rows,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+
+def item_spans(item) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """Time spans an added or changed item can occupy."""
+    spans = [(item.Start, item.End)]
+    if item.IsRecurring:
+        pattern = item.GetRecurrencePattern()
+        if pattern.NoEndDate:
+            spans.append((pattern.PatternStartDate, datetime.datetime.max))
+        else:
+            spans.append((pattern.PatternStartDate,
+                          _naive(pattern.PatternEndDate) + datetime.timedelta(days=1)))
+    return spans
+
+
+class CalendarCacheEvents:
+    """Event sink for ``DispatchWithEvents(calendar.Items, CalendarCacheEvents)``.
+
+    Set :attr:`cache` and :attr:`entry_ids` (a callable returning the
+    EntryIDs currently in the folder) on the returned object.
+    """
+    cache: Optional[CalendarRangeCache] = None
+    entry_ids: Optional[Callable[[], Set[str]]] = None
+
+    def OnItemAdd(self, item):
+        if self.cache is not None:
+            self.cache.invalidate_entry(item.EntryID, item_spans(item))
+
+    def OnItemChange(self, item):
+        if self.cache is not None:
+            self.cache.invalidate_entry(item.EntryID, item_spans(item))
+
+    def OnItemRemove(self):
+        if self.cache is not None and self.entry_ids is not None:
+            self.cache.reconcile(self.entry_ids())
@@ -1,52 +1,142 @@
 import win32com.client
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Dict, List, Optional, Set, Tuple
+
+from mcp.server.fastmcp.utilities.logging import get_logger
+
+from .appointment_batch import (
+    CREATED, DUPLICATE, FAILED, ROLLED_BACK, AppointmentRequest, AppointmentResult, find_clashes,
+)
+from .calendar_cache import DEFAULT_MAX_ROWS, CalendarCacheEvents, CalendarRangeCache, fetch_appointments
+from .connection import OutlookConnections
+from .table_reader import AppointmentRow, OutlookTableBackend, TableReader
+from .tracing import untraced
+
+logger = get_logger(__name__)
 
 class OutlookCalendarService:
-    def __init__(self):
-        self.outlook = win32com.client.Dispatch("Outlook.Application")
-        self.namespace = self.outlook.GetNamespace("MAPI")
-        self.calendar = self.namespace.GetDefaultFolder(9)
-
-    def get_calendar_items(self, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
-        items = self.calendar.Items
-        items.IncludeRecurrences = True
-        items.Sort("[Start]")
-
-        restriction = "[Start] >= '{}' AND [End] <= '{}'".format(
-            start_date.strftime("%m/%d/%Y %H:%M %p"),
-            end_date.strftime("%m/%d/%Y %H:%M %p")
-        )
-        restricted_items = items.Restrict(restriction)
-
-        result = []
-        for appointment in restricted_items:
-            result.append({
-                "subject": appointment.Subject,
-                "start": appointment.Start.strftime("%Y-%m-%d %H:%M"),
-                "end": appointment.End.strftime("%Y-%m-%d %H:%M"),
-                "location": appointment.Location,
-                "body": appointment.Body,
-                "categories": appointment.Categories,
-                "busy_status": appointment.BusyStatus
-            })
-        return result
+    def __init__(self, max_cached_rows: int = DEFAULT_MAX_ROWS, connections: Optional[OutlookConnections] = None):
+        # Handles of the calling COM thread, shared with the other services given the same connections
+        connection = (connections or OutlookConnections()).get()
+        self.outlook = connection.application
+        self.namespace = connection.namespace
+        self.calendar = connection.default_folder(9)
+        self.table_reader = TableReader(OutlookTableBackend(self.calendar, self.namespace))
+        self.cache = CalendarRangeCache(self._fetch_range, max_rows=max_cached_rows)
+        # Keep the events object alive; Outlook calls it while the COM
+        # thread pumps messages.
+        self._events = win32com.client.DispatchWithEvents(untraced(self.calendar.Items), CalendarCacheEvents)
+        self._events.cache = self.cache
+        self._events.entry_ids = self._entry_ids
+
+    def get_calendar_items(self, start_date: datetime, end_date: datetime) -> List[AppointmentRow]:
+        return self.cache.get(start_date, end_date)
+
+    def _fetch_range(self, start: datetime, end: datetime) -> List[AppointmentRow]:
+        return fetch_appointments(self.calendar, self.table_reader, start, end)
+
+    def _entry_ids(self) -> Set[str]:
+        return {row[0] for row in OutlookTableBackend(self.calendar, None).rows(None, ("EntryID",), 1000)}
+
+    def busy_intervals(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime, int]]:
+        """(start, end, BusyStatus) of own appointments overlapping the range."""
+        return [(row.start, row.end, row.busy_status) for row in self._fetch_range(start, end)]
+
+    def get_free_busy(self, attendees: List[str], start: datetime,
+                      minutes: int) -> Tuple[Dict[str, str], List[str]]:
+        """FreeBusy code strings per attendee, plus the names that failed.
+
+        All attendees are added to one scratch meeting and resolved together;
+        each string has one character per ``minutes`` from midnight of ``start``.
+        """
+        meeting = self.outlook.CreateItem(1)  # olAppointmentItem
+        try:
+            recipients = [meeting.Recipients.Add(name) for name in attendees]
+            meeting.Recipients.ResolveAll()
+            free_busy, failed = {}, []
+            for name, recipient in zip(attendees, recipients):
+                try:
+                    if not recipient.Resolved:
+                        raise LookupError(name)
+                    free_busy[name] = recipient.FreeBusy(start, minutes, True)
+                except Exception:
+                    failed.append(name)
+            return free_busy, failed
+        finally:
+            meeting.Close(1)  # olDiscard
+
+    def _save(self, request: AppointmentRequest):
+        appointment = self.calendar.Items.Add()
+        appointment.Subject = request.subject
+        appointment.Start = request.start
+        appointment.End = request.end
+        appointment.Location = request.location
+        appointment.Body = request.body
+        appointment.Categories = request.categories
+        appointment.BusyStatus = request.busy_status
+        appointment.Save()
+        return appointment
 
     def add_appointment(self, subject: str, start: datetime, end: datetime, 
                        location: str = "", body: str = "", categories: str = "", busy_status: int = 1) -> bool:
         try:
-            appointment = self.calendar.Items.Add()
-            appointment.Subject = subject
-            appointment.Start = start
-            appointment.End = end
-            appointment.Location = location
-            appointment.Body = body
-            appointment.Categories = categories
-            appointment.BusyStatus = busy_status
-            appointment.Save()
-            if categories or busy_status != 1:
+            request = AppointmentRequest(1, subject, start, end, location, body, categories, busy_status)
+            appointment = self._save(request)
+            self.cache.invalidate_range(start, end)
+            if request.sends_invitation:
                 appointment.Send()
             return True
         except Exception as e:
-            print(f"Error adding appointment: {e}")
+            logger.error(f"Error adding appointment: {e}")
             return False
+
+    def add_appointments(self, requests: List[AppointmentRequest], rollback: bool = False) -> List[AppointmentResult]:
+        """Save validated requests in one pass; duplicates of existing appointments are skipped.
+
+        Clashes are checked against one fetch of the range the batch spans.
+        With ``rollback``, the first failure stops the batch and the items
+        saved so far are deleted again by EntryID. Invitations are sent only
+        once every item has been saved, so a rollback never follows a send.
+        """
+        if not requests:
+            return []
+        start = min(request.start for request in requests)
+        end = max(request.end for request in requests)
+        clashes = find_clashes(requests, self._fetch_range(start, end))
+        results = [AppointmentResult(request, conflicts=clash.conflicts)
+                   for request, clash in zip(requests, clashes)]
+        saved = []
+        try:
+            for result, clash in zip(results, clashes):
+                if clash.duplicate:
+                    result.status = DUPLICATE
+                    continue
+                try:
+                    appointment = self._save(result.request)
+                except Exception as e:
+                    logger.error(f"Error adding appointment: {e}")
+                    result.status, result.error = FAILED, str(e)
+                    if rollback:
+                        break
+                    continue
+                result.status, result.entry_id = CREATED, appointment.EntryID
+                saved.append((result, appointment))
+
+            if rollback and any(result.status == FAILED for result in results):
+                for result, _ in saved:
+                    try:
+                        self.namespace.GetItemFromID(result.entry_id).Delete()
+                        result.status = ROLLED_BACK
+                    except Exception as e:
+                        result.error = f"rollback failed: {e}"
+                return results
+
+            for result, appointment in saved:
+                if result.request.sends_invitation:
+                    try:
+                        appointment.Send()
+                    except Exception as e:
+                        result.error = f"saved, but sending failed: {e}"
+            return results
+        finally:
+            self.cache.invalidate_range(start, end)
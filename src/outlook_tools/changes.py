@@ -0,0 +1,277 @@
+"""Change notifications for new mail and calendar edits.
+
+Instead of re-scanning the Inbox or calendar to notice what changed,
+:class:`ChangeWatcher` hooks Outlook's ``NewMailEx`` application event and
+the ``ItemAdd``/``ItemChange``/``ItemRemove`` events of folder ``Items``
+through ``DispatchWithEvents`` on the COM thread. Handlers only record the
+event in a :class:`ChangeLog`, which coalesces bursts for the same item
+(``NewMailEx`` plus ``ItemAdd`` for one message, a save firing several
+``ItemChange``) and settles them once no event arrived for ``debounce``
+seconds.
+
+Settled changes get consecutive sequence numbers and go into a bounded ring
+buffer. Callers read them with an opaque token, get a new token back, and
+are told when changes were lost in between: evicted from a full buffer, or
+missed while Outlook was disconnected. Then they should rescan once.
+"""
+import collections
+import datetime
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from mcp.server.fastmcp.utilities.logging import get_logger
+
+from .tracing import untraced
+
+logger = get_logger(__name__)
+
+DEFAULT_CAPACITY = 1000
+DEFAULT_DEBOUNCE = 1.0  # seconds without events before a change settles
+DEFAULT_MAX_DELAY = 10.0  # seconds a busy item may keep a change pending
+
+MAIL = "mail"
+APPOINTMENT = "appointment"
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+
+
+class ChangeTokenError(ValueError):
+    """The token was not returned by get_changes."""
+
+
+@dataclass(frozen=True)
+class Change:
+    seq: int
+    kind: str
+    action: str
+    # Empty for removals: ItemRemove does not say which item was removed
+    entry_id: str
+    subject: Optional[str]
+    # Received time of mail, start of appointments
+    time: Optional[datetime.datetime]
+    folder: Optional[str]
+    # When the last event coalesced into this change arrived
+    at: datetime.datetime
+
+    def describe(self) -> str:
+        text = f"{self.at:%Y-%m-%d %H:%M:%S} {self.kind} {self.action}"
+        if self.subject:
+            text += f": {self.subject}"
+        if self.time is not None:
+            text += f" ({self.time:%Y-%m-%d %H:%M})"
+        if self.folder:
+            text += f" in {self.folder}"
+        return text + (f" [{self.entry_id}]" if self.entry_id else "")
+
+
+@dataclass
+class ChangeBatch:
+    changes: List[Change]
+    # Token to pass next time
+    token: str
+    # Changes after the given token were dropped; rescan once
+    missed: bool = False
+    # More changes are buffered than fit in the limit
+    more: bool = False
+
+
+class _Pending:
+    __slots__ = ("kind", "action", "entry_id", "subject", "time", "folder", "first", "last", "at")
+
+    def __init__(self, kind, action, entry_id, folder, now, at):
+        self.kind, self.action, self.entry_id, self.folder = kind, action, entry_id, folder
+        self.subject = self.time = None
+        self.first = self.last = now
+        self.at = at
+
+
+class ChangeLog:
+    """Debounced, coalesced ring buffer of changes; thread-safe.
+
+    Events are recorded from the COM thread; :meth:`flush` settles them and
+    :meth:`since` reads them from any thread.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, debounce: float = DEFAULT_DEBOUNCE,
+                 max_delay: float = DEFAULT_MAX_DELAY, clock: Callable[[], float] = time.monotonic,
+                 now: Callable[[], datetime.datetime] = datetime.datetime.now):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._clock = clock
+        self._now = now
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, Optional[str]], _Pending] = {}
+        self._buffer: Deque[Change] = collections.deque(maxlen=max(1, capacity))
+        # Tokens of an earlier server run (or log) are recognized as such
+        self._epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        # Tokens below this sequence number missed changes
+        self._missed_through = 0
+        self._events = 0
+        self._dropped = 0
+
+    # -- recording (COM thread) --------------------------------------------
+
+    def record(self, kind: str, action: str, entry_id: str = "", subject: Optional[str] = None,
+               when: Optional[datetime.datetime] = None, folder: Optional[str] = None):
+        """Note one event; events for the same item coalesce until it settles."""
+        key = (kind, entry_id, folder if not entry_id else None)
+        now = self._clock()
+        with self._lock:
+            self._events += 1
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _Pending(kind, action, entry_id, folder, now, self._now())
+            else:
+                pending.last = now
+                pending.at = self._now()
+                # An item added and then edited is still new to the reader
+                if action == ADDED:
+                    pending.action = ADDED
+            if subject is not None:
+                pending.subject = subject
+            if when is not None:
+                pending.time = when
+            if folder is not None:
+                pending.folder = folder
+
+    def record_item(self, kind: str, action: str, item, folder: Optional[str] = None):
+        """Note an event carrying an Outlook item, reading the few properties a change shows."""
+        try:
+            moment = item.ReceivedTime if kind == MAIL else item.Start
+            self.record(kind, action, item.EntryID, item.Subject, moment.replace(tzinfo=None), folder)
+        except Exception as e:
+            # 読めないアイテム (会議出席依頼の一部など) でもイベント自体は記録する
+            logger.warning(f"Could not read a changed {kind} item: {e}")
+            self.record(kind, action, folder=folder)
+
+    # -- reading -----------------------------------------------------------
+
+    def flush(self, force: bool = False) -> int:
+        """Move settled changes into the buffer; returns how many."""
+        now = self._clock()
+        with self._lock:
+            settled = [key for key, pending in self._pending.items()
+                       if force or now - pending.last >= self.debounce or now - pending.first >= self.max_delay]
+            for key in sorted(settled, key=lambda key: self._pending[key].first):
+                pending = self._pending.pop(key)
+                if len(self._buffer) == self._buffer.maxlen:
+                    self._missed_through = max(self._missed_through, self._buffer[0].seq)
+                    self._dropped += 1
+                self._seq += 1
+                self._buffer.append(Change(self._seq, pending.kind, pending.action, pending.entry_id,
+                                           pending.subject, pending.time, pending.folder, pending.at))
+            return len(settled)
+
+    def mark_missed(self):
+        """Events may have been lost (e.g. Outlook restarted); tokens issued so far report it."""
+        # 切断前に届いたイベントは失われていないので先に確定させる
+        self.flush(force=True)
+        with self._lock:
+            self._seq += 1
+            self._missed_through = self._seq
+
+    def _parse(self, token: str) -> Tuple[int, bool]:
+        epoch, _, seq = token.strip().partition("-")
+        if not seq.isdigit():
+            raise ChangeTokenError(f"Invalid change token: {token}")
+        if epoch != self._epoch:
+            # 前回の起動で発行されたトークン: その後の変更は分からない
+            return 0, True
+        return int(seq), False
+
+    def since(self, token: str = "", limit: int = 100) -> ChangeBatch:
+        """Settled changes after ``token`` (every buffered change without one)."""
+        seq, missed = self._parse(token) if token else (0, False)
+        with self._lock:
+            if token:
+                missed = missed or seq < self._missed_through
+            found = [change for change in self._buffer if change.seq > seq]
+            limit = max(1, limit)
+            changes = found[:limit]
+            last = changes[-1].seq if changes else self._seq
+            return ChangeBatch(changes, f"{self._epoch}-{last}", missed, len(found) > limit)
+
+    @property
+    def token(self) -> str:
+        """Token of the present moment, for readers starting now."""
+        with self._lock:
+            return f"{self._epoch}-{self._seq}"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"events": self._events, "pending": len(self._pending), "buffered": len(self._buffer),
+                    "changes": self._seq, "dropped": self._dropped}
+
+
+# -- Outlook events ------------------------------------------------------------
+
+class NewMailEvents:
+    """Event sink for ``DispatchWithEvents(application, NewMailEvents)``; set :attr:`log`."""
+    log: Optional[ChangeLog] = None
+
+    def OnNewMailEx(self, entry_ids):
+        if self.log is not None:
+            # 複数のメールが同時に届くと EntryID がカンマ区切りで渡される
+            for entry_id in str(entry_ids).split(","):
+                if entry_id.strip():
+                    self.log.record(MAIL, ADDED, entry_id.strip())
+
+
+class ItemChangeEvents:
+    """Event sink for ``DispatchWithEvents(folder.Items, ItemChangeEvents)``.
+
+    Set :attr:`log`, :attr:`kind` and :attr:`folder` (the folder path) on the
+    returned object; events are delivered while the COM thread pumps messages.
+    """
+    log: Optional[ChangeLog] = None
+    kind = MAIL
+    folder: Optional[str] = None
+
+    def OnItemAdd(self, item):
+        if self.log is not None:
+            self.log.record_item(self.kind, ADDED, item, self.folder)
+
+    def OnItemChange(self, item):
+        if self.log is not None:
+            self.log.record_item(self.kind, CHANGED, item, self.folder)
+
+    def OnItemRemove(self):
+        if self.log is not None:
+            self.log.record(self.kind, REMOVED, folder=self.folder)
+
+
+class ChangeWatcher:
+    """Connects the event sinks feeding a :class:`ChangeLog`; use on the COM thread."""
+
+    def __init__(self, log: ChangeLog):
+        self.log = log
+        self._sinks: List[Any] = []
+
+    @property
+    def watching(self) -> bool:
+        return bool(self._sinks)
+
+    def watch(self, application, inbox, calendar):
+        """Follow new mail, the Inbox and the calendar."""
+        import win32com.client
+        self.stop()
+        sink = win32com.client.DispatchWithEvents(untraced(application), NewMailEvents)
+        sink.log = self.log
+        sinks = [sink]
+        for kind, folder in ((MAIL, inbox), (APPOINTMENT, calendar)):
+            # Keep the events objects alive; Outlook calls them while the COM thread pumps messages.
+            sink = win32com.client.DispatchWithEvents(untraced(folder.Items), ItemChangeEvents)
+            sink.log, sink.kind, sink.folder = self.log, kind, folder.FolderPath
+            sinks.append(sink)
+        self._sinks = sinks
+
+    def stop(self):
+        """Stop recording; the sinks of a dead connection are simply dropped."""
+        for sink in self._sinks:
+            sink.log = None
+        self._sinks = []
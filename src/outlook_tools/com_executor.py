@@ -0,0 +1,217 @@
+"""Dedicated COM apartment threads for Outlook calls.
+
+Outlook objects live in a single-threaded apartment: they may only be used
+from the thread that created them, and every call blocks until Outlook
+answers. Calling them straight from an ``async`` tool stalls the whole MCP
+event loop. A :class:`ComExecutor` owns STA worker threads; tools submit
+callables and await the result, with per-job timeouts and a bounded queue.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_IDLE_INTERVAL = 0.1
+
+
+class ComExecutorError(Exception):
+    """Base class for errors raised by the COM executor."""
+
+
+class ComBusyError(ComExecutorError):
+    """The job queue is full; the caller should retry later."""
+
+
+class ComTimeoutError(ComExecutorError):
+    """A job did not finish within its timeout."""
+
+
+def _co_initialize():
+    import pythoncom
+    pythoncom.CoInitialize()
+
+
+def _co_uninitialize():
+    import pythoncom
+    pythoncom.CoUninitialize()
+
+
+def pump_messages():
+    """Deliver pending window messages, and with them COM events."""
+    import pythoncom
+    pythoncom.PumpWaitingMessages()
+
+
+class ComExecutor:
+    """Runs callables on apartment-initialized worker threads.
+
+    Objects created by a job belong to the worker that ran it. With more
+    than one worker, keep per-thread objects in :attr:`local` so that each
+    apartment only touches its own Outlook connection. ``idle`` is called
+    whenever a worker has waited ``idle_interval`` seconds without a job.
+    """
+
+    def __init__(self, workers: int = 1, max_queue: int = DEFAULT_MAX_QUEUE,
+                 name: str = "outlook-com",
+                 initializer: Callable[[], None] = _co_initialize,
+                 finalizer: Callable[[], None] = _co_uninitialize,
+                 idle: Optional[Callable[[], None]] = None,
+                 idle_interval: float = DEFAULT_IDLE_INTERVAL):
+        self.workers = workers
+        self.name = name
+        self.local = threading.local()
+        self._initializer = initializer
+        self._finalizer = finalizer
+        self._idle = idle
+        self._idle_interval = idle_interval
+        self._jobs: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._shutdown:
+                raise ComExecutorError("COM executor has been shut down")
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        try:
+            self._initializer()
+        except Exception:
+            logger.exception("Failed to initialize COM on %s", threading.current_thread().name)
+        try:
+            while True:
+                try:
+                    job = self._jobs.get(timeout=self._idle_interval if self._idle else None)
+                except queue.Empty:
+                    # STA threads must pump messages for COM events to arrive.
+                    self._safe_idle()
+                    continue
+                if job is None:
+                    break
+                future, fn, args, kwargs = job
+                # Skips jobs whose caller already gave up (timeout/cancel).
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            try:
+                self._finalizer()
+            except Exception:
+                logger.exception("Failed to uninitialize COM on %s", threading.current_thread().name)
+
+    def _safe_idle(self):
+        try:
+            self._idle()
+        except Exception:
+            logger.exception("COM idle callback failed")
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> concurrent.futures.Future:
+        """Queue ``fn(*args, **kwargs)``; raises ComBusyError when the queue is full."""
+        self._ensure_started()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        try:
+            self._jobs.put_nowait((future, fn, args, kwargs))
+        except queue.Full:
+            raise ComBusyError("Outlook is busy with other requests. Please try again shortly.") from None
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run ``fn`` on a COM worker and await its result.
+
+        Cancelling the awaiting task, or hitting ``timeout``, drops the job if
+        it has not started yet. A job already inside Outlook cannot be
+        interrupted; its result is discarded when it eventually returns.
+        """
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise ComTimeoutError(f"Outlook did not respond within {timeout:g} seconds.") from None
+
+    def on_worker(self) -> bool:
+        """True when called from one of this executor's worker threads."""
+        return threading.current_thread() in self._threads
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self._jobs.qsize()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers after the jobs already queued have run."""
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._jobs.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+class LazyComObject:
+    """An Outlook-owning object built by ``factory`` on first use.
+
+    Attribute access returns a callable that looks the method up on the
+    real object when it runs, so ``await executor.run(lazy.method, ...)``
+    creates the object inside the job, on the worker that will own it,
+    rather than at import time.
+    """
+
+    def __init__(self, executor: ComExecutor, factory: Callable[[], Any]):
+        self._executor = executor
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def created(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        """The object, constructing it if needed; call on a COM worker."""
+        if self._instance is None:
+            if not self._executor.on_worker():
+                raise ComExecutorError("Outlook objects must be created on the COM worker thread")
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def reset(self):
+        """Drop the object; the next use builds a new one (e.g. after Outlook restarted)."""
+        with self._lock:
+            self._instance = None
+
+    def warm_up(self) -> concurrent.futures.Future:
+        """Construct the object in the background."""
+        return self._executor.submit(self.get)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return getattr(self.get(), name)(*args, **kwargs)
+        call.__name__ = name
+        return call
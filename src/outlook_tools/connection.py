@@ -0,0 +1,219 @@
+"""Shared, health-checked Outlook connections.
+
+Dispatching ``Outlook.Application`` and asking it for the MAPI namespace
+costs a cross-process round trip or two every time, and a handle kept
+across requests dies with ``RPC_E_DISCONNECTED`` when Outlook restarts.
+:class:`OutlookConnections` keeps one :class:`Connection` per COM thread,
+probes it cheaply after it has sat idle, and dispatches again, with
+backoff, once a handle turns out to be dead. A disconnect seen on one
+thread retires the handles of every thread, since they all point into the
+same Outlook process. Idempotent reads go through :meth:`call`, which
+retries them on a fresh connection.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from mcp.server.fastmcp.utilities.logging import get_logger
+
+from .tracing import traced
+
+logger = get_logger(__name__)
+
+RPC_E_DISCONNECTED = -2147417848  # 0x80010108: Outlook exited or restarted
+RPC_S_SERVER_UNAVAILABLE = -2147023174  # 0x800706BA
+CO_E_OBJNOTCONNECTED = -2147220995  # 0x800401FD
+DISCONNECTED = frozenset({RPC_E_DISCONNECTED, RPC_S_SERVER_UNAVAILABLE, CO_E_OBJNOTCONNECTED})
+
+DEFAULT_PROBE_INTERVAL = 30.0
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 8.0
+
+
+def is_disconnected(error: BaseException) -> bool:
+    """True for COM errors meaning the Outlook process behind a handle is gone."""
+    codes = [getattr(error, "hresult", None)]
+    args = getattr(error, "args", ())
+    if args:
+        codes.append(args[0])
+        # DISP_E_EXCEPTION carries the real code in the excepinfo's scode
+        if len(args) > 2 and isinstance(args[2], tuple) and len(args[2]) > 5:
+            codes.append(args[2][5])
+    return any(code in DISCONNECTED for code in codes if isinstance(code, int))
+
+
+def _dispatch(name: str):
+    import win32com.client
+    return win32com.client.Dispatch(name)
+
+
+def _probe(connection: "Connection"):
+    # One property read; fails fast when the server process is gone
+    connection.namespace.CurrentProfileName
+
+
+@dataclass
+class Connection:
+    """Outlook handles of one COM thread."""
+    application: Any
+    namespace: Any
+    generation: int
+    checked: float
+    _folders: Dict[int, Any] = field(default_factory=dict, repr=False)
+    _scratch_mail: Any = field(default=None, repr=False)
+
+    def default_folder(self, folder_type: int):
+        folder = self._folders.get(folder_type)
+        if folder is None:
+            folder = self._folders[folder_type] = self.namespace.GetDefaultFolder(folder_type)
+        return folder
+
+    def scratch_mail(self):
+        """An unsaved mail item whose Recipients resolve names; discarded with the connection."""
+        if self._scratch_mail is None:
+            self._scratch_mail = self.application.CreateItem(0)  # olMailItem
+        return self._scratch_mail
+
+    def close(self):
+        mail, self._scratch_mail = self._scratch_mail, None
+        self._folders.clear()
+        if mail is not None:
+            try:
+                mail.Close(1)  # olDiscard
+            except Exception:
+                pass
+
+
+class OutlookConnections:
+    """Per-thread Outlook connections that reconnect after Outlook restarts.
+
+    Call the accessors on the COM thread that will use the handles. A
+    connection idle for ``probe_interval`` seconds is probed before it is
+    handed out again. Failed dispatches are retried ``retries`` times,
+    waiting ``backoff`` seconds and doubling up to ``MAX_BACKOFF``.
+    """
+
+    def __init__(self, dispatch: Callable[[str], Any] = _dispatch,
+                 probe: Callable[[Connection], Any] = _probe,
+                 probe_interval: float = DEFAULT_PROBE_INTERVAL, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.probe_interval = probe_interval
+        self.retries = retries
+        self.backoff = backoff
+        self._dispatch = dispatch
+        self._probe = probe
+        self._clock = clock
+        self._sleep = sleep
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._counts = {"connects": 0, "reuses": 0, "probes": 0, "failed_probes": 0,
+                        "disconnects": 0, "retries": 0, "failed_connects": 0}
+        self._setup_seconds = 0.0
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def on_reset(self, listener: Callable[[], None]):
+        """Call ``listener`` whenever the connections are retired, e.g. to drop objects built on them."""
+        self._listeners.append(listener)
+
+    def get(self) -> Connection:
+        """The calling thread's connection, reconnecting if it is missing or dead."""
+        connection: Optional[Connection] = getattr(self._local, "connection", None)
+        if connection is not None and connection.generation == self._generation:
+            now = self._clock()
+            if now - connection.checked < self.probe_interval or self._alive(connection):
+                connection.checked = now
+                self._count("reuses")
+                return connection
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+        connection = self._local.connection = self._connect()
+        return connection
+
+    def _alive(self, connection: Connection) -> bool:
+        self._count("probes")
+        try:
+            self._probe(connection)
+            return True
+        except Exception as e:
+            self._count("failed_probes")
+            logger.warning(f"Outlook connection probe failed: {e}")
+            return False
+
+    def _connect(self) -> Connection:
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            started = self._clock()
+            try:
+                application = traced(self._dispatch("Outlook.Application"))
+                namespace = application.GetNamespace("MAPI")
+            except Exception as e:
+                self._count("failed_connects")
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Connecting to Outlook failed, retrying in {delay:g}s: {e}")
+                self._sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+                continue
+            finished = self._clock()
+            with self._lock:
+                self._counts["connects"] += 1
+                self._setup_seconds += finished - started
+            return Connection(application, namespace, self._generation, finished)
+
+    def reset(self):
+        """Retire every thread's connection; each reconnects on its next use."""
+        with self._lock:
+            self._generation += 1
+            self._counts["disconnects"] += 1
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Connection reset listener failed: {e}")
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run an idempotent ``fn``; if Outlook went away, reconnect and run it again.
+
+        Only for reads: a write may have taken effect before the error.
+        """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_disconnected(e) or attempt == self.retries:
+                    raise
+                logger.warning(f"Outlook disconnected, reconnecting: {e}")
+                self._count("retries")
+                self.reset()
+                self._sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+
+    def application(self):
+        return self.get().application
+
+    def namespace(self):
+        return self.get().namespace
+
+    def default_folder(self, folder_type: int):
+        return self.get().default_folder(folder_type)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus the setup time spent, and saved by reusing connections."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counts)
+            setup_ms = self._setup_seconds * 1000
+        mean_ms = setup_ms / stats["connects"] if stats["connects"] else 0.0
+        stats["setup_ms"] = round(setup_ms, 3)
+        stats["mean_setup_ms"] = round(mean_ms, 3)
+        stats["saved_setup_ms"] = round(mean_ms * stats["reuses"], 3)
+        return stats
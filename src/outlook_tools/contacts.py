@@ -0,0 +1,195 @@
+"""Contact records and the resolved-contact cache.
+
+Resolving a name costs a ``Recipients.Add`` + ``Resolve()`` +
+``GetExchangeUser()`` round trip, and assistants look up the same handful of
+colleagues over and over. :class:`ContactCache` keeps resolved
+:class:`UserInfo` records (and names that did not resolve) for a while.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 512
+DEFAULT_TTL = 3600.0  # seconds a resolved contact stays cached
+DEFAULT_NEGATIVE_TTL = 300.0  # seconds an unresolved name stays cached
+
+MISSING = object()
+
+
+@dataclass
+class UserInfo:
+    name: str
+    email: Optional[str] = None
+    department: Optional[str] = None
+    job_title: Optional[str] = None
+    company: Optional[str] = None
+    phone: Optional[str] = None
+    location: Optional[str] = None
+    manager: Optional[str] = None
+
+
+def fix_encoding(text: Optional[str]) -> Optional[str]:
+    """Fix encoding issues with Japanese text from Outlook"""
+    if not text:
+        return None
+    try:
+        for encoding in ['shift_jis', 'cp932', 'iso-2022-jp']:
+            try:
+                encoded = text.encode(encoding, errors='ignore')
+                decoded = encoded.decode(encoding, errors='ignore')
+                if decoded and not all('?' in c for c in decoded):
+                    return decoded
+            except Exception:
+                continue
+        return text
+    except Exception as e:
+        logger.warning(f"Error fixing encoding: {e}")
+        return text
+
+
+def user_info_from_exchange(exchange_user) -> UserInfo:
+    """Read the fields we report from an ``ExchangeUser``."""
+    return UserInfo(
+        name=exchange_user.Name,
+        email=exchange_user.PrimarySmtpAddress or None,
+        department=fix_encoding(exchange_user.Department),
+        job_title=fix_encoding(exchange_user.JobTitle),
+        company=fix_encoding(exchange_user.CompanyName),
+        phone=exchange_user.BusinessTelephoneNumber or None,
+        location=fix_encoding(exchange_user.OfficeLocation),
+        manager=fix_encoding(exchange_user.Manager),
+    )
+
+
+def resolve_user_info(mail, name: str) -> Optional[UserInfo]:
+    """Resolve ``name`` through the recipients of a scratch mail item.
+
+    Returns None when Outlook cannot resolve the name and raises LookupError
+    when it resolves to something that is not an Exchange user.
+    """
+    recipient = mail.Recipients.Add(name)
+    try:
+        if not recipient.Resolve():
+            logger.warning(f"Could not resolve user: {name}")
+            return None
+        exchange_user = recipient.AddressEntry.GetExchangeUser()
+        if not exchange_user:
+            logger.warning(f"Could not get Exchange user details for: {name}")
+            raise LookupError(name)
+        return user_info_from_exchange(exchange_user)
+    finally:
+        # Keep the scratch item from accumulating recipients
+        recipient.Delete()
+
+
+def format_user_info(info: UserInfo) -> str:
+    response = [
+        "User Information:",
+        f"Name: {info.name}",
+        f"Email: {info.email}" if info.email else "",
+        f"Department: {info.department}" if info.department else "",
+        f"Job Title: {info.job_title}" if info.job_title else "",
+        f"Company: {info.company}" if info.company else "",
+        f"Phone: {info.phone}" if info.phone else "",
+        f"Location: {info.location}" if info.location else "",
+        f"Manager: {info.manager}" if info.manager else ""
+    ]
+    return "\n".join(line for line in response if line)
+
+
+class ContactCache:
+    """Bounded LRU cache of resolved contacts with per-entry expiry.
+
+    ``None`` values record names that did not resolve (negative caching) and
+    expire after ``negative_ttl``. Keys are case- and whitespace-insensitive.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_TTL,
+                 negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(name: str) -> str:
+        return " ".join(name.split()).casefold()
+
+    def get(self, name: str, default: Any = MISSING) -> Any:
+        """Cached UserInfo, ``None`` for a known-unresolvable name, else ``default``."""
+        key = self._key(name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            if value is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, name: str, info: Optional[UserInfo]):
+        ttl = self.negative_ttl if info is None else self.ttl
+        key = self._key(name)
+        with self._lock:
+            self._entries[key] = (info, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def resolve(self, name: str, resolver: Callable[[str], Optional[UserInfo]]) -> Optional[UserInfo]:
+        """Cached lookup that calls ``resolver`` on a miss and stores its answer."""
+        cached = self.get(name)
+        if cached is not MISSING:
+            return cached
+        info = resolver(name)
+        self.put(name, info)
+        return info
+
+    def invalidate(self, name: Optional[str] = None) -> int:
+        """Drop one name, or every entry when ``name`` is None; returns the count."""
+        with self._lock:
+            if name is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            return 1 if self._entries.pop(self._key(name), None) is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,205 @@
+"""Free/busy intersection for multi-attendee scheduling.
+
+Availability is kept as bitmasks over a fixed grid of ``minutes``-long
+slots: bit ``i`` of an ``int`` covers ``[start + i*minutes, start +
+(i+1)*minutes)``. Python integers are arbitrary precision, so OR-ing the
+busy masks of every attendee, or finding runs of free slots, is a handful of
+whole-window bitwise operations instead of a loop over slots and people.
+"""
+import datetime
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_SLOT_MINUTES = 15
+
+# Recipient.FreeBusy(CompleteFormat=True) and AppointmentItem.BusyStatus
+# share codes: 0 free, 1 tentative, 2 busy, 3 out of office, 4 working elsewhere.
+BUSY_CODES = (2, 3)
+TENTATIVE_CODES = (1,)
+
+_BUSY_TABLE = str.maketrans({str(code): ("1" if code in BUSY_CODES else "0") for code in range(5)})
+_TENTATIVE_TABLE = str.maketrans({str(code): ("1" if code in TENTATIVE_CODES else "0") for code in range(5)})
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(tzinfo=None)
+
+
+def _runs(mask: int, length: int) -> int:
+    """Bits ``i`` of ``mask`` such that bits ``i .. i+length-1`` are all set."""
+    covered = 1
+    while covered < length:
+        step = min(covered, length - covered)
+        mask &= mask >> step
+        covered += step
+    return mask
+
+
+def _touched(mask: int, length: int) -> int:
+    """Bits ``i`` such that any of bits ``i .. i+length-1`` of ``mask`` is set."""
+    covered = 1
+    while covered < length:
+        step = min(covered, length - covered)
+        mask |= mask >> step
+        covered += step
+    return mask
+
+
+def _bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@dataclass
+class Availability:
+    """One attendee's busy and tentative slots on a :class:`SlotGrid`."""
+    name: str
+    busy: int = 0
+    tentative: int = 0
+
+
+@dataclass
+class FreeSlot:
+    start: datetime.datetime
+    end: datetime.datetime
+    tentative: List[str]
+
+
+class SlotGrid:
+    """Fixed-size time slots covering ``[start, end)``."""
+
+    def __init__(self, start: datetime.datetime, end: datetime.datetime,
+                 minutes: int = DEFAULT_SLOT_MINUTES):
+        self.minutes = minutes
+        self.step = datetime.timedelta(minutes=minutes)
+        start = _naive(start)
+        # Round inwards to whole slots so FreeBusy strings (which start at
+        # midnight) line up and no slot sticks out of the requested range.
+        misalignment = (start - start.replace(hour=0, minute=0, second=0, microsecond=0)) % self.step
+        self.start = start + (self.step - misalignment if misalignment else datetime.timedelta(0))
+        self.size = max(0, (_naive(end) - self.start) // self.step)
+        self.full = (1 << self.size) - 1
+
+    def time(self, index: int) -> datetime.datetime:
+        return self.start + index * self.step
+
+    def span(self, start: datetime.datetime, end: datetime.datetime) -> int:
+        """Mask of slots overlapping ``[start, end)``."""
+        first = max(0, (_naive(start) - self.start) // self.step)
+        last = min(self.size, -(-(_naive(end) - self.start) // self.step))
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def working_hours(self, day_start: int = 9, day_end: int = 18,
+                      weekdays: Sequence[int] = (0, 1, 2, 3, 4)) -> int:
+        """Mask of slots between ``day_start`` and ``day_end`` o'clock on ``weekdays``."""
+        mask = 0
+        day = self.start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < self.time(self.size):
+            if day.weekday() in weekdays:
+                mask |= self.span(day + datetime.timedelta(hours=day_start),
+                                  day + datetime.timedelta(hours=day_end))
+            day += datetime.timedelta(days=1)
+        return mask
+
+    def from_codes(self, name: str, codes: str, origin: datetime.datetime,
+                   minutes: Optional[int] = None) -> Availability:
+        """Availability from a ``Recipient.FreeBusy`` string starting at ``origin``.
+
+        Slots the string does not reach are unknown and treated as busy.
+        """
+        minutes = minutes or self.minutes
+        if minutes != self.minutes:
+            raise ValueError("FreeBusy resolution must match the slot grid")
+        offset = (self.start - _naive(origin)) // self.step
+        if offset < 0:
+            raise ValueError("FreeBusy data starts after the search window")
+        codes = codes[offset:offset + self.size]
+        busy = int(codes.translate(_BUSY_TABLE)[::-1] or "0", 2)
+        tentative = int(codes.translate(_TENTATIVE_TABLE)[::-1] or "0", 2)
+        busy |= self.full ^ ((1 << len(codes)) - 1)
+        return Availability(name, busy, tentative)
+
+    def from_intervals(self, name: str,
+                       intervals: Iterable[Tuple[datetime.datetime, datetime.datetime, int]]) -> Availability:
+        """Availability from ``(start, end, busy_status)`` appointments."""
+        availability = Availability(name)
+        for start, end, status in intervals:
+            if status in BUSY_CODES:
+                availability.busy |= self.span(start, end)
+            elif status in TENTATIVE_CODES:
+                availability.tentative |= self.span(start, end)
+        return availability
+
+    def find_slots(self, attendees: Sequence[Availability], duration: datetime.timedelta,
+                   allowed: Optional[int] = None, step_minutes: int = 30,
+                   limit: int = 10) -> List[FreeSlot]:
+        """Non-overlapping slots of ``duration`` where nobody is busy.
+
+        Slots start on ``step_minutes`` boundaries and are ranked by how many
+        attendees are tentative during them, then by start time.
+        """
+        length = -(-duration // self.step)
+        if length <= 0 or length > self.size:
+            return []
+        busy = 0
+        for attendee in attendees:
+            busy |= attendee.busy
+        free = self.full & ~busy
+        if allowed is not None:
+            free &= allowed
+        candidates = _runs(free, length)
+
+        stride = max(1, step_minutes // self.minutes)
+        offset = ((self.start.hour * 60 + self.start.minute) // self.minutes) % stride
+        aligned = 0
+        for index in range((stride - offset) % stride, self.size, stride):
+            aligned |= 1 << index
+        candidates &= aligned
+
+        touched = [(attendee.name, _touched(attendee.tentative, length))
+                   for attendee in attendees if attendee.tentative]
+        clear = candidates
+        for _, mask in touched:
+            clear &= ~mask
+
+        slots: List[FreeSlot] = []
+        taken = 0
+
+        def take(indexes):
+            nonlocal taken
+            for index in indexes:
+                if len(slots) >= limit:
+                    return
+                window = ((1 << length) - 1) << index
+                if taken & window:
+                    continue
+                taken |= window
+                slots.append(FreeSlot(self.time(index), self.time(index + length),
+                                      [name for name, mask in touched if (mask >> index) & 1]))
+
+        # Slots where everyone is definitely free come first, earliest first;
+        # tentative conflicts are only counted when those run out.
+        take(_bits(clear))
+        if len(slots) < limit:
+            take(sorted(_bits(candidates & ~clear),
+                        key=lambda index: (sum((mask >> index) & 1 for _, mask in touched), index)))
+        return slots
+
+
+def format_slots(slots: List[FreeSlot], duration: datetime.timedelta, unavailable: List[str]) -> str:
+    if not slots:
+        lines = ["No free slots found for the specified period."]
+    else:
+        lines = [f"Available slots ({int(duration.total_seconds() // 60)} minutes):"]
+        for rank, slot in enumerate(slots, start=1):
+            line = f"{rank}. {slot.start:%Y-%m-%d %H:%M} - {slot.end:%H:%M}"
+            if slot.tentative:
+                line += f" (tentative: {', '.join(slot.tentative)})"
+            lines.append(line)
+    if unavailable:
+        lines.append(f"No free/busy information for: {', '.join(unavailable)}")
+    return "\n".join(lines)
@@ -0,0 +1,253 @@
+"""Offline Global Address List snapshot with prefix and fuzzy name lookup.
+
+``Recipient.Resolve()`` is slow and only finds near-exact names, so partial
+Japanese surnames often come back as "User not found". A snapshot exports the
+GAL once into a compact gzip'd JSON file and is refreshed in the background.
+:class:`GalIndex` answers lookups from memory: a sorted key array serves
+prefix queries by binary search (a flattened trie), and a character-bigram
+index serves substring and fuzzy queries.
+"""
+import bisect
+import datetime
+import gzip
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import astuple, fields
+from typing import Dict, List, Optional, Set, Tuple
+
+from .contacts import UserInfo, user_info_from_exchange
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+DEFAULT_MAX_AGE = datetime.timedelta(hours=24)
+DEFAULT_EXPORT_CHUNK = 1000
+MIN_FUZZY_SCORE = 0.5
+
+# olExchangeUserAddressEntry, olExchangeRemoteUserAddressEntry
+_USER_ENTRY_TYPES = (0, 5)
+_FIELDS = tuple(field.name for field in fields(UserInfo))
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _normalize(text: str) -> str:
+    return "".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+
+def _bigrams(key: str) -> Set[str]:
+    if len(key) < 2:
+        return {key} if key else set()
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+# -- snapshot file -------------------------------------------------------------
+
+class GalSnapshot:
+    """Exported GAL entries plus the time they were taken."""
+
+    def __init__(self, entries: List[UserInfo], created: Optional[datetime.datetime] = None):
+        self.entries = entries
+        self.created = created or datetime.datetime.now()
+
+    def age(self, now: Optional[datetime.datetime] = None) -> datetime.timedelta:
+        return (now or datetime.datetime.now()) - self.created
+
+    def save(self, path: str):
+        """Write the snapshot atomically as gzip'd JSON rows."""
+        document = {
+            "version": SNAPSHOT_VERSION,
+            "created": self.created.isoformat(timespec="seconds"),
+            "fields": list(_FIELDS),
+            "rows": [list(astuple(entry)) for entry in self.entries],
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as out:
+                out.write(json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "GalSnapshot":
+        """Read a snapshot file (gzip'd or plain JSON)."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:2] == _GZIP_MAGIC:
+            data = gzip.decompress(data)
+        document = json.loads(data.decode("utf-8"))
+        if document.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported GAL snapshot version: {document.get('version')}")
+        names = document["fields"]
+        entries = [UserInfo(**{k: v for k, v in zip(names, row) if k in _FIELDS})
+                   for row in document["rows"]]
+        return cls(entries, datetime.datetime.fromisoformat(document["created"]))
+
+
+class GalExport:
+    """Resumable export of the GAL, ``chunk`` address entries per step.
+
+    Each :meth:`step` is meant to run as its own COM job so other tool calls
+    can run between chunks of a large directory.
+    """
+
+    def __init__(self, namespace, chunk: int = DEFAULT_EXPORT_CHUNK):
+        self.entries_source = namespace.GetGlobalAddressList().AddressEntries
+        self.total = self.entries_source.Count
+        self.chunk = chunk
+        self.position = 0
+        self.entries: List[UserInfo] = []
+
+    @property
+    def done(self) -> bool:
+        return self.position >= self.total
+
+    def step(self) -> bool:
+        """Export the next chunk; returns True once every entry has been read."""
+        end = min(self.position + self.chunk, self.total)
+        for index in range(self.position + 1, end + 1):  # AddressEntries is 1-based
+            try:
+                entry = self.entries_source.Item(index)
+                if entry.AddressEntryUserType not in _USER_ENTRY_TYPES:
+                    continue
+                user = entry.GetExchangeUser()
+                if user:
+                    self.entries.append(user_info_from_exchange(user))
+            except Exception as e:
+                logger.warning(f"Skipping GAL entry {index}: {e}")
+        self.position = end
+        return self.done
+
+    def snapshot(self) -> GalSnapshot:
+        return GalSnapshot(self.entries)
+
+
+# -- in-memory index -----------------------------------------------------------
+
+class GalIndex:
+    """Ranked prefix, substring and fuzzy lookup over GAL entries."""
+
+    def __init__(self, entries: List[UserInfo]):
+        self.entries = entries
+        self._keys: List[Tuple[str, int]] = []
+        self._grams: Dict[str, List[int]] = defaultdict(list)
+        self._full: List[str] = []
+        self._gram_counts: List[int] = []
+        for entry_id, entry in enumerate(entries):
+            full = _normalize(entry.name)
+            self._full.append(full)
+            self._gram_counts.append(len(_bigrams(full)))
+            keys = {full}
+            keys.update(_normalize(part) for part in (entry.name or "").split())
+            if entry.email:
+                keys.add(_normalize(entry.email.split("@")[0]))
+            keys.discard("")
+            self._keys.extend((key, entry_id) for key in keys)
+            for gram in _bigrams(full):
+                self._grams[gram].append(entry_id)
+        self._keys.sort()
+        self._sorted_keys = [key for key, _ in self._keys]
+        self._key_ids = [entry_id for _, entry_id in self._keys]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _prefix(self, query: str) -> Dict[int, str]:
+        lo = bisect.bisect_left(self._sorted_keys, query)
+        hi = bisect.bisect_left(self._sorted_keys, query + "\U0010ffff", lo)
+        matches: Dict[int, str] = {}
+        # Keys are sorted, so an entry's first hit is not always its shortest
+        for key, entry_id in zip(self._sorted_keys[lo:hi], self._key_ids[lo:hi]):
+            current = matches.get(entry_id)
+            if current is None or len(key) < len(current):
+                matches[entry_id] = key
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[UserInfo, float]]:
+        """Best matches for ``query`` with scores in (0, 3]; exact name = 3."""
+        needle = _normalize(query)
+        if not needle:
+            return []
+        scores: Dict[int, float] = {}
+
+        for entry_id, key in self._prefix(needle).items():
+            # Exact keys score 3, prefixes 2..3 by how much of the key matched
+            scores[entry_id] = 3.0 if key == needle else 2.0 + len(needle) / len(key)
+
+        # Substring and fuzzy scores stay below 2, so they cannot displace a
+        # full page of prefix matches.
+        if len(scores) < limit:
+            query_grams = _bigrams(needle)
+            # Dice >= MIN_FUZZY_SCORE needs at least this many shared bigrams
+            min_shared = max(1, int(MIN_FUZZY_SCORE * len(query_grams) / 2))
+            shared = Counter(entry_id for gram in query_grams for entry_id in self._grams.get(gram, ()))
+            for entry_id, count in shared.items():
+                if entry_id in scores or count < min_shared:
+                    continue
+                full = self._full[entry_id]
+                if count == len(query_grams) and needle in full:
+                    scores[entry_id] = 1.0 + len(needle) / len(full)
+                    continue
+                dice = 2.0 * count / (len(query_grams) + self._gram_counts[entry_id])
+                if dice >= MIN_FUZZY_SCORE:
+                    scores[entry_id] = dice
+
+        ranked = heapq.nsmallest(limit, scores.items(),
+                                 key=lambda item: (-item[1], self.entries[item[0]].name or ""))
+        return [(self.entries[entry_id], score) for entry_id, score in ranked]
+
+
+def format_candidates(query: str, matches: List[Tuple[UserInfo, float]]) -> str:
+    lines = [f"Multiple users match '{query}':"]
+    for rank, (info, _) in enumerate(matches, start=1):
+        details = ", ".join(part for part in (info.department, info.job_title) if part)
+        line = f"{rank}. {info.name}"
+        if info.email:
+            line += f" <{info.email}>"
+        if details:
+            line += f" ({details})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class GalDirectory:
+    """Holds the current snapshot and index and swaps them on refresh."""
+
+    def __init__(self, path: str, max_age: datetime.timedelta = DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.snapshot: Optional[GalSnapshot] = None
+        self.index: Optional[GalIndex] = None
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                self._install(GalSnapshot.load(path))
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable GAL snapshot {path}: {e}")
+
+    def _install(self, snapshot: GalSnapshot):
+        index = GalIndex(snapshot.entries)
+        with self._lock:
+            self.snapshot, self.index = snapshot, index
+
+    @property
+    def stale(self) -> bool:
+        snapshot = self.snapshot
+        return snapshot is None or snapshot.age() > self.max_age
+
+    def replace(self, snapshot: GalSnapshot):
+        """Persist a freshly exported snapshot and start serving it."""
+        snapshot.save(self.path)
+        self._install(snapshot)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[UserInfo, float]]:
+        index = self.index
+        return index.search(query, limit) if index is not None else []
@@ -0,0 +1,324 @@
+"""Opt-in local full-text index of Inbox mail.
+
+Messages are stored in SQLite keyed by ``EntryID`` with an FTS5 index over
+subject and body. Japanese text has no spaces between words, so instead of
+word tokens the index stores character bigrams of every alphanumeric run;
+a keyword becomes a phrase of its bigrams, which finds arbitrary substrings.
+Candidates are re-checked in Python, so results equal a live scan.
+
+The index is filled by a resumable crawl ordered by ``LastModificationTime``
+and afterwards only picks up items modified since the stored high-water mark,
+plus ItemAdd/ItemChange/ItemRemove events.
+"""
+import datetime
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .mail_query import OL_MAIL_ITEM_CLASS
+from .table_reader import JET_DATE_FORMAT, OutlookTableBackend
+from .tracing import untraced
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CRAWL_CHUNK = 2000
+DEFAULT_PRUNE_INTERVAL = 600.0  # seconds between EntryID reconciliations
+_STORE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_SEGMENT = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    entry_id TEXT PRIMARY KEY,
+    received TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    body TEXT NOT NULL,
+    modified TEXT NOT NULL,
+    conversation_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS messages_received ON messages(received);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(terms, content='');
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _segments(text: str) -> List[str]:
+    normalized = unicodedata.normalize("NFKC", text or "").lower()
+    return [segment.replace("_", "") for segment in _SEGMENT.findall(normalized)]
+
+
+def ngram_terms(text: str) -> str:
+    """Index terms for ``text``: bigrams of each alphanumeric run."""
+    terms = []
+    for segment in _segments(text):
+        if len(segment) == 1:
+            terms.append(segment)
+        else:
+            terms.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return " ".join(terms)
+
+
+def ngram_query(keyword: str) -> Optional[str]:
+    """FTS5 MATCH expression for ``keyword``, or None if it is too short.
+
+    One-character runs cannot be looked up by bigram; they are dropped here
+    and left to the Python re-check.
+    """
+    phrases = []
+    for segment in _segments(keyword):
+        if len(segment) >= 2:
+            bigrams = " ".join(segment[i:i + 2] for i in range(len(segment) - 1))
+            phrases.append(f'"{bigrams}"')
+    return " AND ".join(phrases) if phrases else None
+
+
+def _to_naive(value: datetime.datetime) -> datetime.datetime:
+    # pywin32 returns wall-clock COM times tagged with a tzinfo
+    return datetime.datetime(value.year, value.month, value.day,
+                             value.hour, value.minute, value.second)
+
+
+@dataclass
+class IndexedMail:
+    entry_id: str
+    received_time: datetime.datetime
+    subject: str
+    sender: str
+    recipients: str
+    body: str
+    conversation_id: str = ""
+
+
+class MailIndex:
+    """SQLite FTS5 index of one mail folder."""
+
+    def __init__(self, path: str, prune_interval: float = DEFAULT_PRUNE_INTERVAL):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(messages)")}
+        if "conversation_id" not in columns:
+            # Indexes from before threads were tracked. Incremental syncs never revisit old rows,
+            # so crawl again from the start; until then searches scan Outlook.
+            self._db.execute("ALTER TABLE messages ADD COLUMN conversation_id TEXT NOT NULL DEFAULT ''")
+            self._db.execute("DELETE FROM meta WHERE key IN ('high_water', 'crawl_complete')")
+            self._db.commit()
+        self._lock = threading.RLock()
+        self._last_prune = 0.0
+        self.folder = None
+        self._events = None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # -- state -------------------------------------------------------------
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def ready(self) -> bool:
+        """True once the initial crawl has completed."""
+        with self._lock:
+            return self._meta("crawl_complete") == "1"
+
+    @property
+    def high_water_mark(self) -> Optional[datetime.datetime]:
+        with self._lock:
+            value = self._meta("high_water")
+        return datetime.datetime.strptime(value, _STORE_FORMAT) if value else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    # -- writes ------------------------------------------------------------
+
+    def _delete(self, entry_id: str) -> bool:
+        row = self._db.execute(
+            "SELECT rowid, subject, body FROM messages WHERE entry_id = ?", (entry_id,)).fetchone()
+        if not row:
+            return False
+        rowid, subject, body = row
+        # Contentless FTS tables need the original terms to delete a row.
+        self._db.execute("INSERT INTO messages_fts (messages_fts, rowid, terms) VALUES ('delete', ?, ?)",
+                         (rowid, ngram_terms(subject + "\n" + body)))
+        self._db.execute("DELETE FROM messages WHERE rowid = ?", (rowid,))
+        return True
+
+    def _upsert(self, mail: IndexedMail, modified: datetime.datetime):
+        self._delete(mail.entry_id)
+        cursor = self._db.execute(
+            "INSERT INTO messages (entry_id, received, subject, sender, recipients, body, modified, conversation_id)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (mail.entry_id, _to_naive(mail.received_time).strftime(_STORE_FORMAT), mail.subject,
+             mail.sender, mail.recipients, mail.body, _to_naive(modified).strftime(_STORE_FORMAT),
+             mail.conversation_id))
+        self._db.execute("INSERT INTO messages_fts (rowid, terms) VALUES (?, ?)",
+                         (cursor.lastrowid, ngram_terms(mail.subject + "\n" + mail.body)))
+
+    @staticmethod
+    def _read_item(item) -> Optional[IndexedMail]:
+        if item.Class != OL_MAIL_ITEM_CLASS:
+            return None
+        return IndexedMail(
+            entry_id=item.EntryID,
+            received_time=item.ReceivedTime,
+            subject=item.Subject or "",
+            sender=item.SenderName or "",
+            recipients=item.To or "",
+            body=item.Body or "",
+            conversation_id=item.ConversationID or "",
+        )
+
+    def add_item(self, item) -> bool:
+        """Index (or re-index) one Outlook item; non-mail items are ignored."""
+        mail = self._read_item(item)
+        if mail is None:
+            return False
+        with self._lock:
+            self._upsert(mail, item.LastModificationTime)
+            self._db.commit()
+        return True
+
+    def remove(self, entry_id: str) -> bool:
+        with self._lock:
+            removed = self._delete(entry_id)
+            self._db.commit()
+        return removed
+
+    def prune(self, folder) -> int:
+        """Drop messages no longer in ``folder`` (ItemRemove carries no item)."""
+        present = {row[0] for row in OutlookTableBackend(folder, None).rows(None, ("EntryID",), 1000)}
+        with self._lock:
+            indexed = [row[0] for row in self._db.execute("SELECT entry_id FROM messages")]
+            removed = [entry_id for entry_id in indexed if entry_id not in present]
+            for entry_id in removed:
+                self._delete(entry_id)
+            self._db.commit()
+        self._last_prune = time.monotonic()
+        return len(removed)
+
+    def sync(self, folder, limit: Optional[int] = DEFAULT_CRAWL_CHUNK) -> bool:
+        """Index items modified since the high-water mark.
+
+        Processes at most ``limit`` items per call so the initial crawl can be
+        spread over several COM jobs; returns True when fully caught up.
+        """
+        high_water = self.high_water_mark
+        items = folder.Items
+        if high_water is not None:
+            # Jet filters have minute precision; items already indexed in the
+            # same minute are simply re-indexed.
+            items = items.Restrict("[LastModificationTime] >= '{}'".format(
+                high_water.replace(second=0).strftime(JET_DATE_FORMAT)))
+        items.Sort("[LastModificationTime]")
+
+        processed = 0
+        complete = True
+        newest = high_water
+        with self._lock:
+            for item in items:
+                try:
+                    modified = _to_naive(item.LastModificationTime)
+                    if high_water is not None and modified < high_water:
+                        continue
+                    # Never stop inside a run of equal timestamps, or the next
+                    # chunk would start from the same mark forever.
+                    if limit is not None and processed >= limit and modified != newest:
+                        complete = False
+                        break
+                    mail = self._read_item(item)
+                    if mail is not None:
+                        self._upsert(mail, modified)
+                    processed += 1
+                    newest = modified if newest is None else max(newest, modified)
+                except Exception as e:
+                    logger.warning(f"Skipping item while indexing mail: {e}")
+
+            if newest is not None:
+                self._set_meta("high_water", newest.strftime(_STORE_FORMAT))
+            if complete:
+                self._set_meta("crawl_complete", "1")
+            self._db.commit()
+
+        if complete and time.monotonic() - self._last_prune > self.prune_interval:
+            self.prune(folder)
+        return complete
+
+    def watch(self, folder):
+        """Follow ``folder`` through its Items events; call on the COM thread."""
+        import win32com.client
+        self.folder = folder
+        self._events = win32com.client.DispatchWithEvents(untraced(folder.Items), MailIndexEvents)
+        self._events.index = self
+        self._events.folder = folder
+
+    # -- reads -------------------------------------------------------------
+
+    def search(self, start: Optional[datetime.datetime], end: Optional[datetime.datetime],
+               keyword: str = "") -> List[IndexedMail]:
+        """Mail received in ``[start, end)`` whose subject or body contains ``keyword``."""
+        clauses, params = [], []
+        match = ngram_query(keyword)
+        if match:
+            sql = ("SELECT m.entry_id, m.received, m.subject, m.sender, m.recipients, m.body, m.conversation_id"
+                   " FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid")
+            clauses.append("messages_fts MATCH ?")
+            params.append(match)
+        else:
+            sql = "SELECT entry_id, received, subject, sender, recipients, body, conversation_id FROM messages m"
+        if start is not None:
+            clauses.append("m.received >= ?")
+            params.append(start.strftime(_STORE_FORMAT))
+        if end is not None:
+            clauses.append("m.received < ?")
+            params.append(end.strftime(_STORE_FORMAT))
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY m.received"
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        needle = keyword.lower()
+        return [
+            IndexedMail(entry_id, datetime.datetime.strptime(received, _STORE_FORMAT),
+                        subject, sender, recipients, body, conversation_id)
+            for entry_id, received, subject, sender, recipients, body, conversation_id in rows
+            if needle in subject.lower() or needle in body.lower()
+        ]
+
+
+class MailIndexEvents:
+    """Event sink for ``DispatchWithEvents(folder.Items, MailIndexEvents)``.
+
+    Set :attr:`index` and :attr:`folder` on the returned object after
+    creating it; events are delivered while the COM thread pumps messages.
+    """
+    index: Optional[MailIndex] = None
+    folder = None
+
+    def OnItemAdd(self, item):
+        if self.index is not None:
+            self.index.add_item(item)
+
+    def OnItemChange(self, item):
+        if self.index is not None:
+            self.index.add_item(item)
+
+    def OnItemRemove(self):
+        if self.index is not None and self.folder is not None:
+            self.index.prune(self.folder)
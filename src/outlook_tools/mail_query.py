@@ -0,0 +1,100 @@
+"""Translate mail searches into DASL filters for ``Folder.GetTable``.
+
+Outlook evaluates DASL (``@SQL=``) filters inside the store, so only the
+matching rows cross the COM boundary. The filter is a superset-safe
+pre-selection: whatever DASL cannot express exactly is re-checked in Python
+by :meth:`MailQuery.matches` on the (much smaller) filtered table.
+"""
+import datetime
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+
+OL_MAIL_ITEM_CLASS = 43  # olMail
+
+DASL_RECEIVED = "urn:schemas:httpmail:datereceived"
+DASL_SUBJECT = "urn:schemas:httpmail:subject"
+DASL_BODY = "urn:schemas:httpmail:textdescription"
+DASL_HAS_ATTACHMENT = "urn:schemas:httpmail:hasattachment"
+
+# DASL compares datetimes in UTC and parses them in this format.
+DASL_DATE_FORMAT = "%m/%d/%Y %I:%M %p"
+
+
+def dasl_literal(value: str) -> str:
+    """Quote a value as a DASL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def dasl_datetime(value: datetime.datetime) -> str:
+    """Format a naive local datetime as a UTC DASL literal."""
+    utc = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dasl_literal(utc.strftime(DASL_DATE_FORMAT))
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    # pywin32 tags local COM times with a tzinfo; compare wall-clock values.
+    return value.replace(tzinfo=None)
+
+
+@dataclass(frozen=True)
+class MailQuery:
+    """A received-time window plus an optional subject/body keyword.
+
+    With ``attachments`` the filter also lets through every mail with
+    attachments, whose text the caller searches for the keyword.
+    """
+    start: Optional[datetime.datetime] = None
+    end: Optional[datetime.datetime] = None
+    keyword: str = ""
+    attachments: bool = False
+
+    @classmethod
+    def for_date(cls, target_date: datetime.date, keyword: str = "", attachments: bool = False) -> "MailQuery":
+        """Query for mail received on ``target_date`` (local time)."""
+        start = datetime.datetime.combine(target_date, datetime.time.min)
+        return cls(start, start + datetime.timedelta(days=1), keyword, attachments)
+
+    def _keyword_clause(self) -> Optional[str]:
+        if not self.keyword:
+            return None
+        if "%" in self.keyword:
+            # LIKE has no escape for its wildcard; leave it to matches().
+            return None
+        value = dasl_literal(f"%{self.keyword}%")
+        attachments = f' OR "{DASL_HAS_ATTACHMENT}" = 1' if self.attachments else ""
+        return f'("{DASL_SUBJECT}" LIKE {value} OR "{DASL_BODY}" LIKE {value}{attachments})'
+
+    def to_dasl(self) -> Optional[str]:
+        """Return the ``@SQL=`` filter, or None when nothing can be pushed down."""
+        clauses = []
+        if self.start is not None:
+            clauses.append(f'"{DASL_RECEIVED}" >= {dasl_datetime(self.start)}')
+        if self.end is not None:
+            clauses.append(f'"{DASL_RECEIVED}" < {dasl_datetime(self.end)}')
+        keyword_clause = self._keyword_clause()
+        if keyword_clause:
+            clauses.append(keyword_clause)
+        if not clauses:
+            return None
+        return "@SQL=" + " AND ".join(clauses)
+
+    def matches(self, received_time: datetime.datetime, subject: str,
+                body: Union[str, Callable[[], str]]) -> bool:
+        """Exact Python check for a row of the table filtered by :meth:`to_dasl`.
+
+        ``body`` may be a callable; it is only called when the keyword is not
+        in the subject, so table rows open their item only when needed.
+        """
+        received = _naive(received_time)
+        if self.start is not None and received < self.start:
+            return False
+        if self.end is not None and received >= self.end:
+            return False
+        if not self.keyword:
+            return True
+        keyword = self.keyword.lower()
+        if keyword in (subject or "").lower():
+            return True
+        if callable(body):
+            body = body()
+        return keyword in (body or "").lower()
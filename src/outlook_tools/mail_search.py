@@ -0,0 +1,269 @@
+"""Mail search across folders, subfolders and stores.
+
+``search_email`` reads the default Inbox unless given a :class:`SearchScope`.
+A scope names other folders by path, optionally with their subfolders, or
+every mail folder of every store (shared mailboxes, archive PSTs). The
+folders are scanned in parallel on the workers of a :class:`ComExecutor`,
+each with its own Outlook connection. Each scan returns at most one page
+of time-ordered matches, and the scans are merged with a k-way merge.
+Once a page's worth of matches is known, folders still waiting to be
+scanned only look before the page's last received time. Bodies are read
+only for the results that are rendered.
+
+Queries with ``attachments`` set also match mail whose attachments contain
+the keyword, searched through an :class:`AttachmentSearch`.
+"""
+import concurrent.futures
+import datetime
+import heapq
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from mcp.server.fastmcp.utilities.logging import get_logger
+
+from .attachments import AttachmentMatch, AttachmentSearch
+from .com_executor import ComExecutor, ComTimeoutError
+from .mail_query import MailQuery
+from .paging import Cursor
+from .table_reader import MailRow, OutlookTableBackend, TableReader
+
+logger = get_logger(__name__)
+
+OL_FOLDER_INBOX = 6  # olFolderInbox
+OL_MAIL_ITEM = 0  # olMailItem, the DefaultItemType of mail folders
+DEFAULT_SEARCH_WORKERS = 4
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    # pywin32 tags local COM times with a tzinfo; compare wall-clock values.
+    return value.replace(tzinfo=None)
+
+
+@dataclass(frozen=True)
+class SearchScope:
+    """Folders to search; the default scope is the Inbox alone.
+
+    ``folders`` are paths below the default mailbox (``Inbox/Projects``) or
+    full Outlook paths naming the store (``\\\\Archive\\Inbox``).
+    ``all_stores`` searches every mail folder of every store and ignores
+    ``folders``.
+    """
+    folders: Tuple[str, ...] = ()
+    all_stores: bool = False
+    include_subfolders: bool = False
+
+    @property
+    def is_default(self) -> bool:
+        return not (self.folders or self.all_stores or self.include_subfolders)
+
+
+class FolderRef(NamedTuple):
+    """A folder by ID, so that any worker apartment can open it."""
+    store_id: str
+    entry_id: str
+    path: str
+
+
+@dataclass
+class MailHit:
+    """A matching mail as plain data (no COM references)."""
+    received_time: datetime.datetime
+    entry_id: str
+    store_id: str
+    folder: str
+    subject: str
+    sender: str
+    conversation_id: str = ""
+    # Set when the keyword was found in an attachment rather than the mail itself
+    attachment: Optional[AttachmentMatch] = None
+    # Namespace loading the body on first use; set on the thread that renders the hit
+    source: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def key(self) -> Tuple[datetime.datetime, str]:
+        return self.received_time, self.entry_id
+
+    @property
+    def body(self) -> str:
+        body = self.__dict__.get("_body")
+        if body is None:
+            body = self._body = self.source.GetItemFromID(self.entry_id, self.store_id).Body or ""
+        return body
+
+
+def _split_path(path: str) -> Tuple[Optional[str], List[str]]:
+    text = path.strip().replace("/", "\\")
+    if text.startswith("\\\\"):
+        parts = [part for part in text[2:].split("\\") if part]
+        return (parts[0], parts[1:]) if parts else (None, [])
+    return None, [part for part in text.split("\\") if part]
+
+
+def open_folder(namespace, path: str):
+    """Open a folder by path; raises LookupError when it does not exist."""
+    store, names = _split_path(path)
+    try:
+        if store is not None:
+            folder = namespace.Folders.Item(store)
+        else:
+            # Relative paths start at the root of the default mailbox
+            folder = namespace.GetDefaultFolder(OL_FOLDER_INBOX).Parent
+        for name in names:
+            folder = folder.Folders.Item(name)
+    except Exception:
+        raise LookupError(f"Folder not found: {path}") from None
+    return folder
+
+
+def _walk(folder, recursive: bool) -> Iterator[Any]:
+    yield folder
+    if recursive:
+        for child in folder.Folders:
+            # Only mail folders below the named ones; calendars, contacts etc. are skipped
+            if child.DefaultItemType == OL_MAIL_ITEM:
+                yield from _walk(child, True)
+
+
+def resolve_scope(namespace, scope: SearchScope) -> List[FolderRef]:
+    """The folders ``scope`` covers, each once."""
+    if scope.all_stores:
+        roots, recursive = [], True
+        for store in namespace.Stores:
+            try:
+                roots.append(store.GetRootFolder())
+            except Exception as e:
+                # Disconnected shared mailboxes and missing PSTs are skipped
+                logger.warning(f"Skipping store {store.DisplayName}: {e}")
+    else:
+        roots = [open_folder(namespace, path) for path in scope.folders]
+        roots = roots or [namespace.GetDefaultFolder(OL_FOLDER_INBOX)]
+        recursive = scope.include_subfolders
+
+    refs = {}
+    for root in roots:
+        for folder in _walk(root, recursive):
+            store_id, entry_id = folder.StoreID, folder.EntryID
+            if (store_id, entry_id) not in refs:
+                refs[store_id, entry_id] = FolderRef(store_id, entry_id, folder.FolderPath)
+    return list(refs.values())
+
+
+def scan_folder(namespace, ref: FolderRef, query: MailQuery, limit: int,
+                cursor: Optional[Cursor] = None,
+                before: Optional[Tuple[datetime.datetime, str]] = None,
+                attachments: Optional[AttachmentSearch] = None) -> List[MailHit]:
+    """Up to ``limit`` matches in one folder after ``cursor`` and before ``before``, oldest first.
+
+    When ``query.attachments`` is set, mail that does not match by subject
+    or body is matched by the text of its attachments through ``attachments``.
+    """
+    if before is not None:
+        # DASL compares to the minute; the exact bound is checked below
+        ceiling = before[0].replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        query = replace(query, end=min(query.end, ceiling) if query.end else ceiling)
+    folder = namespace.GetFolderFromID(ref.entry_id, ref.store_id)
+    reader = TableReader(OutlookTableBackend(folder, namespace))
+    hits: List[MailHit] = []
+    for row in reader.read(MailRow, query.to_dasl(), sort="[ReceivedTime]"):
+        try:
+            if not row.is_mail:
+                continue
+            key = (_naive(row.received_time), row.entry_id)
+            if before is not None and key >= before:
+                break
+            if cursor is not None and not cursor.after(*key):
+                continue
+            match = None
+            if not query.matches(row.received_time, row.subject or "", lambda: row.body):
+                if not (query.attachments and attachments is not None and query.keyword):
+                    continue
+                # Only mail with attachments passes the filter without matching its text
+                item = namespace.GetItemFromID(row.entry_id, ref.store_id)
+                match = attachments.find(item, row.entry_id, query.keyword)
+                if match is None:
+                    continue
+        except Exception as e:
+            logger.warning(f"Error reading mail in {ref.path}: {e}")
+            continue
+        hits.append(MailHit(key[0], row.entry_id, ref.store_id, ref.path, row.subject or "", row.sender or "",
+                            row.conversation_id or "", match))
+        if len(hits) >= limit:
+            break
+    return hits
+
+
+class FolderSearch:
+    """Scans folders in parallel on ``executor`` and merges their matches.
+
+    ``connect`` returns the MAPI namespace of the calling worker thread,
+    e.g. :meth:`OutlookConnections.namespace`, which keeps one per thread
+    and reconnects when Outlook restarts. ``attachments`` searches attachment
+    text for queries that ask for it.
+    """
+
+    def __init__(self, executor: ComExecutor, connect: Callable[[], Any],
+                 attachments: Optional[AttachmentSearch] = None):
+        self.executor = executor
+        self._connect = connect
+        self.attachments = attachments
+        # Scans in flight; the rest wait so they can use a tighter bound
+        self.window = 2 * executor.workers
+
+    def _scan(self, ref: FolderRef, query: MailQuery, limit: int, cursor: Optional[Cursor],
+              before: Optional[Tuple[datetime.datetime, str]]) -> List[MailHit]:
+        return scan_folder(self._connect(), ref, query, limit, cursor, before, self.attachments)
+
+    def search(self, refs: Sequence[FolderRef], query: MailQuery, limit: int,
+               cursor: Optional[Cursor] = None, timeout: Optional[float] = None) -> Iterator[MailHit]:
+        """The first ``limit`` matches over ``refs`` (after ``cursor``) in received-time order.
+
+        ``timeout`` bounds the whole search, not each folder.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending = list(refs)
+        running = set()
+        # Keys of the best ``limit`` matches so far; best[0] is the worst of them
+        best: List[_Descending] = []
+        results: List[List[MailHit]] = []
+        try:
+            while pending or running:
+                while pending and len(running) < self.window:
+                    before = best[0].key if len(best) >= limit else None
+                    ref = pending.pop(0)
+                    running.add(self.executor.submit(self._scan, ref, query, limit, cursor, before))
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, running = concurrent.futures.wait(
+                    running, remaining, return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done or (deadline is not None and time.monotonic() >= deadline and (pending or running)):
+                    raise ComTimeoutError(f"Outlook did not respond within {timeout:g} seconds.")
+                for future in done:
+                    try:
+                        hits = future.result()
+                    except Exception as e:
+                        logger.warning(f"Folder search failed: {e}")
+                        continue
+                    if not hits:
+                        continue
+                    results.append(hits)
+                    for hit in hits:
+                        if len(best) < limit:
+                            heapq.heappush(best, _Descending(hit.key))
+                        elif hit.key < best[0].key:
+                            heapq.heapreplace(best, _Descending(hit.key))
+        finally:
+            for future in running:
+                future.cancel()
+        merged = heapq.merge(*results, key=lambda hit: hit.key)
+        return (hit for _, hit in zip(range(limit), merged))
+
+
+class _Descending:
+    """Inverts ordering, turning ``heapq``'s min-heap into a max-heap."""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
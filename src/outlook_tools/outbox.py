@@ -0,0 +1,250 @@
+"""Persistent outbox: drafts are queued at once and confirmed in the background.
+
+``send_email`` used to block the COM thread, and with it every other tool,
+on the modal confirmation window until a person closed it. Now the tool only
+creates and saves the draft and records its ``EntryID`` under a ticket in
+SQLite. An :class:`OutboxWorker` on a COM thread of its own then opens the
+queued drafts one after another for confirmation, and sends each once its
+window is closed.
+
+Tickets survive restarts: drafts still queued, or open for review when the
+server stopped, are picked up again by the next worker run.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from mcp.server.fastmcp.utilities.logging import get_logger
+
+from .com_executor import ComExecutor
+
+logger = get_logger(__name__)
+
+HELD = "held"  # saved by queue_email, waiting for send_queued_emails
+QUEUED = "queued"  # waiting for the worker
+REVIEWING = "reviewing"  # open in Outlook for confirmation
+SENT = "sent"
+CLOSED = "closed"  # the draft was sent or deleted from the Outlook window itself
+FAILED = "failed"
+
+DEFAULT_BATCH_SIZE = 10
+_STORE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket TEXT PRIMARY KEY,
+    entry_id TEXT NOT NULL,
+    store_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT NOT NULL,
+    created TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tickets_state ON tickets(state, created);
+"""
+_COLUMNS = "ticket, entry_id, store_id, subject, recipients, state, error, created, updated"
+
+
+def default_outbox_path() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.path.join(base, "mcp-outlook-tools", "outbox.db")
+
+
+@dataclass
+class Ticket:
+    ticket: str
+    entry_id: str
+    store_id: str
+    subject: str
+    recipients: str
+    state: str
+    error: str
+    created: datetime.datetime
+    updated: datetime.datetime
+
+    @classmethod
+    def _from_row(cls, row) -> "Ticket":
+        *values, created, updated = row
+        return cls(*values, datetime.datetime.strptime(created, _STORE_FORMAT),
+                   datetime.datetime.strptime(updated, _STORE_FORMAT))
+
+    def describe(self) -> str:
+        text = f"{self.ticket}: {self.state} - {self.subject} (to {self.recipients}, updated {self.updated})"
+        return text + (f" - {self.error}" if self.error else "")
+
+
+class Outbox:
+    """Tickets of queued drafts in a SQLite file, opened on first use."""
+
+    def __init__(self, path: str, clock: Callable[[], datetime.datetime] = datetime.datetime.now):
+        self.path = path
+        self.clock = clock
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _now(self) -> str:
+        return self.clock().strftime(_STORE_FORMAT)
+
+    def add(self, entry_id: str, store_id: str, subject: str, recipients: str, hold: bool = False) -> Ticket:
+        now = self._now()
+        ticket = uuid.uuid4().hex[:12]
+        with self._lock:
+            db = self._connection()
+            with db:
+                db.execute(f"INSERT INTO tickets ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, '', ?, ?)",
+                           (ticket, entry_id, store_id or "", subject, recipients, HELD if hold else QUEUED,
+                            now, now))
+        return self.get(ticket)
+
+    def get(self, ticket: str) -> Optional[Ticket]:
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT {_COLUMNS} FROM tickets WHERE ticket = ?", (ticket,)).fetchone()
+        return Ticket._from_row(row) if row else None
+
+    def recent(self, limit: int = 20) -> List[Ticket]:
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT {_COLUMNS} FROM tickets ORDER BY updated DESC, created DESC LIMIT ?", (limit,)).fetchall()
+        return [Ticket._from_row(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._connection().execute("SELECT state, COUNT(*) FROM tickets GROUP BY state"))
+
+    def _move(self, old_state: str, new_state: str) -> int:
+        with self._lock:
+            db = self._connection()
+            with db:
+                return db.execute("UPDATE tickets SET state = ?, updated = ? WHERE state = ?",
+                                  (new_state, self._now(), old_state)).rowcount
+
+    def release(self) -> int:
+        """Queue every held draft for review."""
+        return self._move(HELD, QUEUED)
+
+    def recover(self) -> int:
+        """Queue again the drafts whose review was cut short by a restart."""
+        return self._move(REVIEWING, QUEUED)
+
+    def claim(self, limit: int = DEFAULT_BATCH_SIZE) -> List[Ticket]:
+        """Mark up to ``limit`` of the oldest queued tickets as under review and return them."""
+        with self._lock:
+            db = self._connection()
+            with db:
+                rows = db.execute(f"SELECT {_COLUMNS} FROM tickets WHERE state = ? ORDER BY created LIMIT ?",
+                                  (QUEUED, limit)).fetchall()
+                db.executemany("UPDATE tickets SET state = ?, updated = ? WHERE ticket = ?",
+                               [(REVIEWING, self._now(), row[0]) for row in rows])
+        tickets = [Ticket._from_row(row) for row in rows]
+        for ticket in tickets:
+            ticket.state = REVIEWING
+        return tickets
+
+    def finish(self, ticket: str, state: str, error: str = ""):
+        with self._lock:
+            db = self._connection()
+            with db:
+                db.execute("UPDATE tickets SET state = ?, error = ?, updated = ? WHERE ticket = ?",
+                           (state, error, self._now(), ticket))
+
+
+class OutboxWorker:
+    """Confirms and sends queued drafts on ``executor``, a COM thread of its own.
+
+    ``connect`` returns the MAPI namespace of that thread. With ``confirm``,
+    each draft is shown modally first, as send_email always did; the wait
+    only blocks this worker. Drafts queued while a batch is under review are
+    picked up by the same run.
+    """
+
+    def __init__(self, outbox: Outbox, executor: ComExecutor, connect: Callable[[], Any],
+                 confirm: bool = True, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.outbox = outbox
+        self.executor = executor
+        self.confirm = confirm
+        self.batch_size = batch_size
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._running = False
+        self._future = None
+        self._recovered = False
+
+    def kick(self):
+        """Start a run unless one is already going; returns the run's future."""
+        with self._lock:
+            if self._running:
+                return self._future
+            if not self._recovered:
+                self._recovered = True
+                recovered = self.outbox.recover()
+                if recovered:
+                    logger.info(f"Re-queued {recovered} draft(s) left under review")
+            self._running = True
+            try:
+                self._future = self.executor.submit(self._drain)
+            except Exception:
+                self._running = False
+                raise
+            return self._future
+
+    def _drain(self) -> int:
+        processed = 0
+        try:
+            while True:
+                with self._lock:
+                    # Claimed under the lock so that a kick() racing the end of a run is not lost
+                    tickets = self.outbox.claim(self.batch_size)
+                    if not tickets:
+                        self._running = False
+                        return processed
+                namespace = self._connect()
+                for ticket in tickets:
+                    self._process(namespace, ticket)
+                    processed += 1
+        except BaseException:
+            with self._lock:
+                self._running = False
+            raise
+
+    def _process(self, namespace, ticket: Ticket):
+        try:
+            draft = namespace.GetItemFromID(ticket.entry_id, ticket.store_id or None)
+        except Exception as e:
+            self.outbox.finish(ticket.ticket, FAILED, f"draft not found: {e}")
+            return
+        try:
+            if self.confirm:
+                # 送信前に確認（ウィンドウを閉じるまで待つのはこのスレッドだけ）
+                draft.Display(True)
+                try:
+                    draft = namespace.GetItemFromID(ticket.entry_id, ticket.store_id or None)
+                except Exception:
+                    # 確認画面から送信または削除された
+                    self.outbox.finish(ticket.ticket, CLOSED, "sent or deleted from the Outlook window")
+                    return
+            draft.Send()
+            self.outbox.finish(ticket.ticket, SENT)
+        except Exception as e:
+            logger.error(f"Failed to send draft {ticket.ticket}: {e}")
+            self.outbox.finish(ticket.ticket, FAILED, str(e))
@@ -0,0 +1,142 @@
+"""Bounded, resumable pages over streamed search results.
+
+Tools render results one at a time from a generator and stop as soon as the
+page is full, either ``limit`` results or ``max_bytes`` of UTF-8 text, so the
+rest of the folder is never enumerated. A full page ends with an opaque
+cursor holding the sort key of its last result. Passing the cursor back
+resumes the scan right after that result; callers push the key down into
+their Outlook filter so earlier items are not read again. Results rendered
+as records instead of text are measured by a ``size`` function, e.g. the
+size of their JSON.
+"""
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional, Tuple, TypeVar
+
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_MAX_BYTES = 32_000
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class CursorError(ValueError):
+    """The cursor is malformed or belongs to a different query."""
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    # pywin32 tags local COM times with a tzinfo; compare wall-clock values.
+    return value.replace(tzinfo=None)
+
+
+def query_scope(*parts) -> str:
+    """Fingerprint of a query, so a cursor cannot resume a different one."""
+    return hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Resume point: results are ordered by ``(key, entry ID)``."""
+    scope: str
+    key: datetime.datetime
+    # Entry IDs already returned at exactly ``key`` (Outlook orders ties arbitrarily)
+    seen: Tuple[str, ...] = ()
+    # Results returned by earlier pages, for numbering
+    offset: int = 0
+
+    def encode(self) -> str:
+        payload = {"s": self.scope, "k": self.key.isoformat(), "e": list(self.seen), "n": self.offset}
+        data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str, scope: str) -> "Cursor":
+        try:
+            data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            payload = json.loads(data)
+            cursor = cls(payload["s"], datetime.datetime.fromisoformat(payload["k"]),
+                         tuple(payload["e"]), int(payload["n"]))
+        except (binascii.Error, ValueError, KeyError, TypeError) as e:
+            raise CursorError(f"Invalid cursor: {token}") from e
+        if cursor.scope != scope:
+            raise CursorError("The cursor belongs to a different search; repeat the original arguments.")
+        return cursor
+
+    @property
+    def resume_from(self) -> datetime.datetime:
+        """Earliest key still to be returned, floored to the minute for Jet/DASL filters."""
+        return self.key.replace(second=0, microsecond=0)
+
+    def after(self, key: datetime.datetime, entry_id: str) -> bool:
+        """Whether the result ``(key, entry_id)`` was not returned yet."""
+        key = _naive(key)
+        return key > self.key or (key == self.key and entry_id not in self.seen)
+
+
+@dataclass
+class Page:
+    entries: List[Any] = field(default_factory=list)
+    # Number of results on earlier pages
+    offset: int = 0
+    # Cursor for the next page, or None when the results are exhausted
+    cursor: Optional[str] = None
+
+    @property
+    def first(self) -> int:
+        return self.offset + 1
+
+    @property
+    def last(self) -> int:
+        return self.offset + len(self.entries)
+
+
+def _clip(text: str, max_bytes: int) -> str:
+    return text.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore")
+
+
+def text_size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def paginate(results: Iterable[T], key: Callable[[T], Tuple[datetime.datetime, str]],
+             render: Callable[[T], R], scope: str, limit: int = DEFAULT_PAGE_SIZE,
+             max_bytes: int = DEFAULT_MAX_BYTES, cursor: Optional[Cursor] = None,
+             size: Callable[[R], int] = text_size) -> Page:
+    """Render ``results`` (ordered by ``key``) until the page is full.
+
+    Results at or before ``cursor`` are skipped without rendering. ``results``
+    is consumed lazily and abandoned once the page is full, so at most one
+    result past the page is produced. A first result larger than the page is
+    clipped if it is text and kept whole otherwise.
+    """
+    limit = max(1, limit)
+    page = Page(offset=cursor.offset if cursor else 0)
+    last_key, seen = (cursor.key, list(cursor.seen)) if cursor else (None, [])
+    total = 0
+    for result in results:
+        result_key, entry_id = key(result)
+        result_key = _naive(result_key)
+        if cursor is not None and not cursor.after(result_key, entry_id):
+            continue
+        if len(page.entries) >= limit:
+            break
+        entry = render(result)
+        entry_size = size(entry)
+        if page.entries and total + entry_size > max_bytes:
+            break
+        if not page.entries and entry_size > max_bytes and isinstance(entry, str):
+            entry = _clip(entry, max_bytes)
+            entry_size = max_bytes
+        page.entries.append(entry)
+        total += entry_size
+        if result_key != last_key:
+            last_key, seen = result_key, []
+        seen.append(entry_id)
+    else:
+        return page
+    page.cursor = Cursor(scope, last_key, tuple(seen), page.last).encode()
+    return page
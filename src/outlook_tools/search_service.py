@@ -1,130 +1,166 @@
+import itertools
 import logging
-from typing import Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 
-import pythoncom
-import win32com.client
 from mcp.server.fastmcp.utilities.logging import get_logger
 
+from .connection import OutlookConnections, is_disconnected
+from .contacts import ContactCache, UserInfo, format_user_info, resolve_user_info
+from .gal_snapshot import format_candidates
+from .mail_query import MailQuery
+from .table_reader import MailRow, OutlookTableBackend, TableReader
+
 logger = get_logger(__name__)
 
-@dataclass
-class UserInfo:
-    name: str
-    email: Optional[str] = None
-    department: Optional[str] = None
-    job_title: Optional[str] = None
-    company: Optional[str] = None
-    phone: Optional[str] = None
-    location: Optional[str] = None
-    manager: Optional[str] = None
-
-def fix_encoding(text: Optional[str]) -> Optional[str]:
-    """Fix encoding issues with Japanese text from Outlook"""
-    if not text:
-        return None
-    try:
-        for encoding in ['shift_jis', 'cp932', 'iso-2022-jp']:
-            try:
-                encoded = text.encode(encoding, errors='ignore')
-                decoded = encoded.decode(encoding, errors='ignore')
-                if decoded and not all('?' in c for c in decoded):
-                    return decoded
-            except Exception:
-                continue
-        return text
-    except Exception as e:
-        logger.warning(f"Error fixing encoding: {e}")
-        return text
+# Candidates listed when a GAL snapshot lookup is ambiguous
+GAL_CANDIDATES = 10
+EXACT_MATCH_SCORE = 3.0
 
 import datetime
 
+
+@dataclass
+class UserLookup:
+    """Outcome of looking up one name: a user, ranked candidates, or an error message."""
+    query: str
+    user: Optional[UserInfo] = None
+    candidates: List[Tuple[UserInfo, float]] = field(default_factory=list)
+    error: str = ""
+
+    def describe(self) -> str:
+        if self.user is not None:
+            return format_user_info(self.user)
+        if self.candidates:
+            return format_candidates(self.query, self.candidates)
+        return self.error
+
+
 class OutlookSearchService:
-    def search_emails(self, target_date: datetime.date, keyword: str):
-        """指定した日付とキーワードにマッチするメールを検索"""
+    def iter_emails(self, target_date: datetime.date, keyword: str):
+        """指定した日付とキーワードにマッチするメールを受信日時順に 1 件ずつ返す"""
+        # この COM スレッドの Outlook 接続を再利用する
+        outlook = self.connections.namespace()
+        
+        # 受信トレイはフォルダ番号6（olFolderInbox）に相当する
+        inbox = self.connections.default_folder(6)
+        query = MailQuery.for_date(target_date, keyword)
+
+        # ローカルインデックスが有効なら Outlook を走査せずに回答する
+        if self.mail_index is not None and self.mail_index.ready:
+            self.mail_index.sync(inbox)
+            for mail in self.mail_index.search(query.start, query.end, keyword):
+                yield {
+                    "subject": mail.subject,
+                    "received_time": mail.received_time,
+                    "sender": mail.sender,
+                    "recipients": [r for r in mail.recipients.split("; ") if r],
+                    "body_preview": mail.body.strip().replace("\r\n", " ")[:200]
+                }
+            return
+
+        # 日付とキーワードは DASL フィルタで Outlook 側に絞り込ませ、
+        # 必要な列だけをテーブルでまとめて取得する（本文は必要な時だけ読む）
+        reader = TableReader(OutlookTableBackend(inbox, outlook))
+        for row in reader.read(MailRow, query.to_dasl(), sort="[ReceivedTime]"):
+            try:
+                # MailItem かどうかのチェック（MessageClass が IPM.Note*）
+                if not row.is_mail:
+                    continue
+                subject = row.subject or ""
+                # 本文は件名にキーワードがない場合だけ読む
+                if not query.matches(row.received_time, subject, lambda: row.body):
+                    continue
+                # 宛先アドレスと本文は返すメールの分だけアイテムを開いて読む
+                recipients = [recipient.Address for recipient in row.item().Recipients]
+                body = row.body
+            except Exception as e:
+                logger.warning(f"メールの処理中にエラーが発生しました: {e}")
+                continue
+            yield {
+                "subject": subject,
+                "received_time": row.received_time,
+                "sender": row.sender,
+                "recipients": recipients,
+                "body_preview": body.strip().replace("\r\n", " ")[:200]
+            }
+
+    def search_emails(self, target_date: datetime.date, keyword: str, limit: Optional[int] = None):
+        """指定した日付とキーワードにマッチするメールを検索（limit 件に達したら走査をやめる）"""
         try:
-            # Outlook アプリケーションの COM オブジェクトを取得
-            outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
-            
-            # 受信トレイはフォルダ番号6（olFolderInbox）に相当する
-            inbox = outlook.GetDefaultFolder(6)
-            messages = inbox.Items
-
-            # Outlook の Items は COM オブジェクトなので、全件を走査する
-            filtered_emails = []
-            for message in messages:
-                try:
-                    # MailItem かどうかのチェック（43 は MailItem の定数）
-                    if message.Class == 43:
-                        received_time = message.ReceivedTime  # datetime.datetime オブジェクト
-                        # 日付部分だけを比較
-                        if received_time.date() == target_date:
-                            # キーワード検索（大文字小文字を無視）
-                            subject = message.Subject or ""
-                            body = message.Body or ""
-                            if keyword.lower() in subject.lower() or keyword.lower() in body.lower():
-                                sender = message.Sender
-                                recipients = [recipient.Address for recipient in message.Recipients]
-                                filtered_emails.append({
-                                    "subject": subject,
-                                    "received_time": received_time,
-                                    "sender": sender,
-                                    "recipients": recipients,
-                                    "body_preview": body.strip().replace("\r\n", " ")[:200]
-                                })
-                except Exception as e:
-                    logger.warning(f"メールの処理中にエラーが発生しました: {e}")
-            return filtered_emails
+            return list(itertools.islice(self.iter_emails(target_date, keyword), limit))
         except Exception as e:
+            if is_disconnected(e):
+                # 再接続して読み直せるよう呼び出し側に伝える
+                raise
             logger.error(f"メール検索中にエラーが発生しました: {e}")
             return []
-    def __init__(self):
-        # Initialize COM
-        pythoncom.CoInitialize()
-        self.outlook = win32com.client.Dispatch("Outlook.Application")
-        self.mail = self.outlook.CreateItem(0)
+    def __init__(self, connections: Optional[OutlookConnections] = None):
+        # Optional MailIndex used by search_emails once its crawl is complete
+        self.mail_index = None
+        self.contact_cache = ContactCache()
+        # Optional GalDirectory answering name lookups from a local snapshot
+        self.gal = None
+        # Per-thread Application/Namespace, reconnected when Outlook restarts
+        self.connections = connections or OutlookConnections()
+        self.connections.get().scratch_mail()
+
+    @property
+    def outlook(self):
+        return self.connections.application()
+
+    @property
+    def mail(self):
+        # Scratch mail whose Recipients resolve names
+        return self.connections.get().scratch_mail()
     
     def cleanup(self):
         """Clean up resources"""
         try:
-            if self.mail:
-                self.mail.Close(1)  # 1: olDiscard
-                self.mail = None
-            if self.outlook:
-                self.outlook = None
-            pythoncom.CoUninitialize()
+            self.connections.get().close()
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
     
-    def search_user(self, name: str) -> str:
+    def resolve_user(self, name: str) -> Optional[UserInfo]:
+        """Resolve ``name`` to a UserInfo, or None if Outlook cannot resolve it.
+
+        Raises LookupError when the name resolves to something that is not an
+        Exchange user. Results are served from ``contact_cache`` when possible.
+        """
+        return self.contact_cache.resolve(name, lambda n: resolve_user_info(self.mail, n))
+
+    def _search_gal(self, name: str) -> Optional[UserLookup]:
+        matches = self.gal.search(name, limit=GAL_CANDIDATES) if self.gal is not None else []
+        if not matches:
+            return None
+        # 完全一致が 1 件に絞れる場合だけ詳細を返し、それ以外は候補一覧を返す
+        exact = [user for user, score in matches if score >= EXACT_MATCH_SCORE]
+        if len(exact) == 1:
+            return UserLookup(name, user=exact[0])
+        return UserLookup(name, candidates=matches)
+
+    def lookup_user(self, name: str) -> UserLookup:
         try:
-            recipient = self.mail.Recipients.Add(name)
-            
-            if not recipient.Resolve():
-                logger.warning(f"Could not resolve user: {name}")
-                return f"User not found: {name}"
-            
-            address_entry = recipient.AddressEntry
-            exchange_user = address_entry.GetExchangeUser()
-            
-            if not exchange_user:
-                logger.warning(f"Could not get Exchange user details for: {name}")
-                return f"Could not retrieve user information: {name}"
-            
-            response = [
-                "User Information:",
-                f"Name: {exchange_user.Name}",
-                f"Email: {exchange_user.PrimarySmtpAddress}" if exchange_user.PrimarySmtpAddress else "",
-                f"Department: {fix_encoding(exchange_user.Department)}" if exchange_user.Department else "",
-                f"Job Title: {fix_encoding(exchange_user.JobTitle)}" if exchange_user.JobTitle else "",
-                f"Company: {fix_encoding(exchange_user.CompanyName)}" if exchange_user.CompanyName else "",
-                f"Phone: {exchange_user.BusinessTelephoneNumber}" if exchange_user.BusinessTelephoneNumber else "",
-                f"Location: {fix_encoding(exchange_user.OfficeLocation)}" if exchange_user.OfficeLocation else "",
-                f"Manager: {fix_encoding(exchange_user.Manager)}" if exchange_user.Manager else ""
-            ]
-            
-            return "\n".join(line for line in response if line)
-            
+            from_gal = self._search_gal(name)
+            if from_gal is not None and (from_gal.user is not None or len(from_gal.candidates) > 1):
+                return from_gal
+            # 部分一致・あいまい一致が 1 件だけなら別人かもしれないので Outlook に解決させる
+            info = self.resolve_user(name)
+            if info is None:
+                return from_gal or UserLookup(name, error=f"User not found: {name}")
+            return UserLookup(name, user=info)
+        except LookupError:
+            return UserLookup(name, error=f"Could not retrieve user information: {name}")
         except Exception as e:
+            if is_disconnected(e):
+                raise
             logger.error(f"Error searching user: {str(e)}", exc_info=True)
-            return f"Error searching Outlook: {str(e)}"
+            return UserLookup(name, error=f"Error searching Outlook: {str(e)}")
+
+    def lookup_users(self, names: List[str]) -> List[UserLookup]:
+        """Look up several names in one COM session, each once."""
+        unique_names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+        return [self.lookup_user(name) for name in unique_names]
+
+    def search_user(self, name: str) -> str:
+        return self.lookup_user(name).describe()
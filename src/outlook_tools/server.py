@@ -1,19 +1,76 @@
-from datetime import datetime
-from dateutil.parser import parse
-from dateutil.relativedelta import relativedelta
+import asyncio
+import itertools
+import os
+import tempfile
+import threading
+import weakref
+from datetime import datetime, timedelta
 import json
+from dataclasses import replace
 from typing import Optional
 
 from mcp.server.fastmcp import FastMCP
 from mcp.server.fastmcp.utilities.logging import get_logger
+from pydantic import AnyUrl
 # 相対インポートから絶対インポートに変更
-from outlook_tools.calendar_service import OutlookCalendarService
-from outlook_tools.search_service import OutlookSearchService
+# Outlook に触れるサービス (win32com) は初回のツール呼び出しまで読み込まない
+from outlook_tools.appointment_batch import format_results, parse_requests
+from outlook_tools.attachments import AttachmentSearch, TextCache, default_cache_path
+from outlook_tools.changes import DEFAULT_CAPACITY, ChangeLog, ChangeTokenError, ChangeWatcher
+from outlook_tools.free_busy import SlotGrid, format_slots
+from outlook_tools.mail_query import MailQuery
+from outlook_tools.table_reader import MailRow, OutlookTableBackend, TableReader
+from outlook_tools.com_executor import ComExecutor, ComExecutorError, LazyComObject, pump_messages
+from outlook_tools.connection import OutlookConnections, is_disconnected
+from outlook_tools.contacts import ContactCache
+from outlook_tools.mail_index import MailIndex
+from outlook_tools.gal_snapshot import GalDirectory, GalExport
+from outlook_tools.tracing import tracer
+from outlook_tools.paging import DEFAULT_MAX_BYTES, DEFAULT_PAGE_SIZE, Cursor, CursorError, paginate, query_scope, text_size
+from outlook_tools.mail_search import DEFAULT_SEARCH_WORKERS, FolderSearch, SearchScope, resolve_scope
+from outlook_tools.outbox import QUEUED, Outbox, OutboxWorker, Ticket, default_outbox_path
+from outlook_tools.threads import Thread, ThreadIndex, collapse, open_item, read_conversation
+from outlook_tools.snapshot import (
+    APPOINTMENT, DELETED, MAIL, Snapshot, SnapshotError, SnapshotExport, SnapshotSummary, SnapshotWriter, compact,
+    query,
+)
+from outlook_tools.structured import (
+    APPOINTMENT_FIELDS, BATCH_RESULT_FIELDS, CHANGE_FIELDS, JSON, MAIL_FIELDS, MESSAGE_FIELDS, SLOT_FIELDS, SNAPSHOT_APPOINTMENT_FIELDS,
+    SNAPSHOT_MAIL_FIELDS, TEXT, THREAD_FIELDS, TICKET_FIELDS, USER_FIELDS, OutputError, Projection, ToolResult,
+    dumps, json_result, json_size, output_format, preview, reply,
+)
+
+OL_FOLDER_DRAFTS = 16  # olFolderDrafts
+# COM timeout for tools that only talk to Outlook (seconds)
+COM_TIMEOUT = 120.0
+# Seconds after startup before OUTLOOK_WARM_UP connects to Outlook
+WARM_UP_DELAY = 1.0
+# Upper bound on the text of one page of search_email / get_calendar results
+MAX_RESPONSE_BYTES = int(os.environ.get("OUTLOOK_MAX_RESPONSE_BYTES", DEFAULT_MAX_BYTES))
+# Output of tools called without output: "text" for people, "json" for structured content
+OUTPUT_FORMAT = os.environ.get("OUTLOOK_OUTPUT", TEXT)
+
+logger = get_logger(__name__)
 
 mcp = FastMCP("Outlook Calendar")
-calendar_service = OutlookCalendarService()
+# Outlook の COM オブジェクトはすべてこの専用スレッド (STA) で生成・使用する
+com = ComExecutor(idle=pump_messages)
+# Application/Namespace はスレッドごとに使い回し、Outlook の再起動後は自動で接続し直す
+connections = OutlookConnections()
+
+def _parse(text: str) -> datetime:
+    from dateutil.parser import parse
+    return parse(text)
+
+def _create_calendar_service():
+    from outlook_tools.calendar_service import OutlookCalendarService
+    return OutlookCalendarService(connections=connections)
+
+# 初回のツール呼び出し時に COM スレッド上で生成する
+calendar_service = LazyComObject(com, _create_calendar_service)
 
-@mcp.tool()
+@mcp.tool(structured_output=False)
+@tracer.timed
 async def add_appointment(
     subject: str,
     start_time: Optional[str] = None,
@@ -21,141 +78,994 @@ async def add_appointment(
     location: str = "",
     description: str = "",
     categories: str = "",
-    busy_status: int = 1
-) -> str:
-    """Add a new appointment to Outlook calendar"""
+    busy_status: int = 1,
+    output: str = ""
+) -> ToolResult:
+    """Add a new appointment to Outlook calendar (output="json" for structured results)"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
     try:
         if not start_time or not end_time:
-            return "I need both start time and end time. Please provide them."
+            return reply(output, "I need both start time and end time. Please provide them.")
 
-        start_dt = parse(start_time) + relativedelta(hours=9)
-        end_dt = parse(end_time) + relativedelta(hours=9)
+        start_dt = _parse(start_time) + timedelta(hours=9)
+        end_dt = _parse(end_time) + timedelta(hours=9)
 
-        if calendar_service.add_appointment(subject, start_dt, end_dt, location, description, categories, busy_status):
-            return f"Successfully added appointment: {subject}"
+        added = await com.run(calendar_service.add_appointment, subject, start_dt, end_dt,
+                              location, description, categories, busy_status, timeout=COM_TIMEOUT)
+        if added:
+            return reply(output, f"Successfully added appointment: {subject}",
+                         {"added": True, "subject": subject, "start": start_dt, "end": end_dt})
         else:
-            return "Failed to add appointment"
+            return reply(output, "Failed to add appointment")
     except ValueError:
-        return "Invalid date/time format. Please provide dates in YYYY-MM-DD HH:MM format"
-
-@mcp.tool()
-async def get_calendar(start_date: str, end_date: str) -> str:
-    """Get calendar items for the specified date range"""
-    try:
-        start_dt = parse(start_date)
-        end_dt = parse(end_date) + relativedelta(days=1)
-        items = calendar_service.get_calendar_items(start_dt, end_dt)
-        
-        if not items:
-            return "No appointments found for the specified period."
-        
-        result = ["Calendar appointments:"]
-        for item in items:
-            result.append("\n---")
-            result.append(f"Subject: {item['subject']}")
-            result.append(f"Start: {item['start']}")
-            result.append(f"End: {item['end']}")
-            result.append(f"Location: {item['location']}")
-            result.append(f"Details: {item['body'][:100]}...")
-            result.append(f"Categories: {item.get('categories', 'N/A')}")
-            result.append(f"Busy Status: {item.get('busy_status', 'N/A')}")
-        
-        return "\n".join(result)
+        return reply(output, "Invalid date/time format. Please provide dates in YYYY-MM-DD HH:MM format")
+    except ComExecutorError as e:
+        return reply(output, str(e))
+
+def _format_appointment(item) -> str:
+    return "\n".join([
+        "\n---",
+        f"Subject: {item['subject']}",
+        f"Start: {item['start']}",
+        f"End: {item['end']}",
+        f"Location: {item['location']}",
+        f"Details: {item['body'][:100]}...",
+        f"Categories: {item.get('categories', 'N/A')}",
+        f"Busy Status: {item.get('busy_status', 'N/A')}",
+    ])
+
+# 1 回の add_appointments で受け付ける予定の上限
+MAX_BATCH_APPOINTMENTS = 200
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def add_appointments(items: list[dict], rollback: bool = False, output: str = "") -> ToolResult:
+    """Add several appointments in one request.
+
+    Each item takes the add_appointment fields: subject, start_time, end_time
+    (YYYY-MM-DD HH:MM), and optionally location, description, categories and
+    busy_status. Nothing is written unless every item is valid; appointments
+    identical to existing ones are skipped and overlaps are reported. With
+    rollback=true, a failure deletes the appointments already added.
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
+    if not items:
+        return reply(output, "No appointments given.")
+    if len(items) > MAX_BATCH_APPOINTMENTS:
+        return reply(output, f"Too many appointments: {len(items)} (at most {MAX_BATCH_APPOINTMENTS} per request).")
+    # add_appointment と同じく、入力時刻に 9 時間を加えて登録する
+    requests, errors = parse_requests(items, lambda text: _parse(text) + timedelta(hours=9))
+    if errors:
+        return reply(output, "No appointments were added. Please fix these items:\n" + "\n".join(f"- {e}" for e in errors),
+                     {"error": "No appointments were added.", "invalid": errors})
+    try:
+        results = await com.run(calendar_service.add_appointments, requests, rollback, timeout=COM_TIMEOUT)
+        return reply(output, format_results(results),
+                     {"results": BATCH_RESULT_FIELDS.project().all(results)} if output == JSON else None)
+    except ComExecutorError as e:
+        return reply(output, str(e))
+
+def _get_calendar(start_dt: datetime, end_dt: datetime, limit: int, cursor: Optional[Cursor], scope: str,
+                  output: str = TEXT, fields: Optional[list[str]] = None) -> ToolResult:
+    # 続きの取得では、カーソルの開始時刻より前の予定を読み直さない
+    items = calendar_service.get_calendar_items(max(start_dt, cursor.resume_from) if cursor else start_dt, end_dt)
+    if output == JSON:
+        # 本文は body_preview を指定した場合だけ読む
+        page = paginate(items, lambda item: (item.start, item.entry_id), APPOINTMENT_FIELDS.project(fields), scope,
+                        limit, MAX_RESPONSE_BYTES, cursor, size=json_size)
+        return json_result({"appointments": page.entries, "first": page.first, "cursor": page.cursor})
+    # 本文は整形するページの分だけ読む
+    page = paginate(items, lambda item: (item.start, item.entry_id), _format_appointment, scope,
+                    limit, MAX_RESPONSE_BYTES, cursor)
+
+    if not page.entries:
+        if cursor:
+            return "No more appointments found for the specified period."
+        return "No appointments found for the specified period."
+
+    if cursor or page.cursor:
+        header = f"Calendar appointments {page.first}-{page.last}:"
+    else:
+        header = "Calendar appointments:"
+    result = [header] + page.entries
+    if page.cursor:
+        result.append(f"\n---\nMore appointments in this period. Call get_calendar again with cursor=\"{page.cursor}\" to continue.")
+    return "\n".join(result)
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def get_calendar(start_date: str, end_date: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str = "",
+                       output: str = "", fields: Optional[list[str]] = None) -> ToolResult:
+    """
+    Get calendar items for the specified date range (pass the returned cursor to get the next page).
+    output="json" returns structured records; fields limits them to some of entry_id, subject, start,
+    end, location, categories, busy_status and body_preview (only listed fields are read from Outlook).
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        APPOINTMENT_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    try:
+        start_dt = _parse(start_date)
+        end_dt = _parse(end_date) + timedelta(days=1)
     except ValueError:
-        return "Invalid date format. Please provide dates in YYYY-MM-DD format"
+        return reply(output, "Invalid date format. Please provide dates in YYYY-MM-DD format")
+    scope = query_scope("get_calendar", start_dt, end_dt)
+    try:
+        resume = Cursor.decode(cursor, scope) if cursor else None
+        # 本文は遅延取得なので、整形まで COM スレッドで行う
+        return await com.run(connections.call, _get_calendar, start_dt, end_dt, limit, resume, scope,
+                             output, fields, timeout=COM_TIMEOUT)
+    except CursorError as e:
+        return reply(output, str(e))
+    except ComExecutorError as e:
+        return reply(output, str(e))
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def get_calendar_cache_stats(output: str = "") -> ToolResult:
+    """Show hit/miss statistics of the calendar range cache"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        stats = await com.run(lambda: calendar_service.get().cache.stats(), timeout=COM_TIMEOUT)
+        return reply(output, json.dumps(stats), stats)
+    except OutputError as e:
+        return str(e)
+    except ComExecutorError as e:
+        return reply(output, str(e))
+
+def _collect_free_busy(attendees: list[str], grid: SlotGrid):
+    # 自分の予定はローカルの予定表、他の参加者は FreeBusy をまとめて取得する
+    own = calendar_service.busy_intervals(grid.start, grid.time(grid.size))
+    free_busy, failed = calendar_service.get_free_busy(attendees, grid.start, grid.minutes) if attendees else ({}, [])
+    return own, free_busy, failed
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def find_free_slots(
+    attendees: list[str],
+    start: str,
+    end: str,
+    duration: int = 30,
+    work_start: int = 9,
+    work_end: int = 18,
+    limit: int = 10,
+    output: str = "",
+    fields: Optional[list[str]] = None
+) -> ToolResult:
+    """
+    Find meeting slots (duration in minutes) when you and all attendees are free.
+    output="json" returns structured slots; fields picks some of start, end and tentative.
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        projection = SLOT_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    try:
+        start_dt = _parse(start)
+        end_dt = _parse(end)
+        if end_dt.time() == datetime.min.time():
+            end_dt += timedelta(days=1)
+        grid = SlotGrid(start_dt, end_dt)
+        own, free_busy, failed = await com.run(connections.call, _collect_free_busy, attendees, grid,
+                                               timeout=COM_TIMEOUT)
+
+        origin = grid.start.replace(hour=0, minute=0)
+        availability = [grid.from_intervals("me", own)]
+        availability.extend(grid.from_codes(name, codes, origin) for name, codes in free_busy.items())
+        slots = grid.find_slots(availability, timedelta(minutes=duration),
+                                allowed=grid.working_hours(work_start, work_end), limit=limit)
+        return reply(output, format_slots(slots, timedelta(minutes=duration), failed),
+                     {"duration": duration, "slots": projection.all(slots), "unavailable": failed})
+    except ValueError:
+        return reply(output, "Invalid date format. Please provide dates in YYYY-MM-DD or YYYY-MM-DD HH:MM format")
+    except ComExecutorError as e:
+        return reply(output, str(e))
+
+# OUTLOOK_MAIL_INDEX に SQLite ファイルのパスを指定するとローカル全文インデックスを使う
+mail_index = MailIndex(os.environ["OUTLOOK_MAIL_INDEX"]) if os.environ.get("OUTLOOK_MAIL_INDEX") else None
+_mail_index_task: Optional[asyncio.Task] = None
+
+def _inbox():
+    # 受信トレイ (olFolderInbox は 6)
+    return connections.default_folder(6)
+
+def _forget_outlook():
+    # 再接続したら、古い接続に結び付いたサービスとイベントを作り直す
+    calendar_service.reset()
+    if mail_index is not None:
+        mail_index.folder = None
+    if change_watcher.watching:
+        # 切断中のイベントは届かないので、読み手に取りこぼしを伝えてから購読し直す
+        change_watcher.stop()
+        change_log.mark_missed()
 
-search_service = OutlookSearchService()
+connections.on_reset(_forget_outlook)
 
-@mcp.tool()
+def _sync_mail_index() -> bool:
+    if mail_index.folder is None:
+        mail_index.watch(_inbox())
+    return mail_index.sync(mail_index.folder)
+
+async def _crawl_mail_index():
+    try:
+        # 初回の全件取り込みはチャンクごとに別ジョブにして、他のツールを間に挟めるようにする
+        while not await com.run(_sync_mail_index):
+            pass
+    except Exception as e:
+        logger.error(f"Mail index crawl failed: {e}")
+
+def _ensure_mail_index():
+    global _mail_index_task
+    if mail_index is None or mail_index.ready:
+        return
+    if _mail_index_task is None or _mail_index_task.done():
+        _mail_index_task = asyncio.get_running_loop().create_task(_crawl_mail_index())
+
+def _save_draft(to: str, cc: str, subject: str, body: str):
+    # メールオブジェクトの作成
+    mail = connections.application().CreateItem(0)  # 0: メールアイテム
+    mail.To = to
+    mail.CC = cc
+    mail.Subject = subject
+    mail.BodyFormat = 1
+    mail.Body = body
+    # 下書きとして保存し、EntryID で後から開けるようにする
+    mail.Save()
+    drafts = connections.default_folder(OL_FOLDER_DRAFTS)
+    return mail.EntryID, drafts.StoreID
+
+# 送信待ちのメールは SQLite に記録し、再起動後も送信を続ける（OUTLOOK_OUTBOX でパスを変更）
+outbox = Outbox(os.environ.get("OUTLOOK_OUTBOX") or default_outbox_path())
+# 確認ダイアログ (Display(True)) はこの専用スレッドだけを止める
+outbox_pool = ComExecutor(idle=pump_messages, name="outlook-outbox")
+outbox_worker = OutboxWorker(outbox, outbox_pool, connections.namespace)
+
+async def _queue_draft(to: str, cc: str, subject: str, body: str, hold: bool) -> Ticket:
+    entry_id, store_id = await com.run(_save_draft, to, cc, subject, body, timeout=COM_TIMEOUT)
+    ticket = outbox.add(entry_id, store_id, subject, "; ".join(filter(None, (to, cc))), hold=hold)
+    if not hold:
+        outbox_worker.kick()
+    return ticket
+
+@mcp.tool(structured_output=False)
+@tracer.timed
 async def send_email(
     to: str,
     cc: str,
     subject: str,
-    body: str
-) -> str:
-    """Send an email with the specified details and display it before sending"""
-    import win32com.client
+    body: str,
+    output: str = ""
+) -> ToolResult:
+    """Send an email with the specified details and display it before sending.
 
+    Returns at once with a ticket: the email is saved as a draft, shown in Outlook for confirmation
+    in the background and sent when the window is closed. Use get_send_status to follow it."""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
     try:
-        # Outlookアプリケーションをインスタンス化
-        outlook = win32com.client.Dispatch("Outlook.Application")
+        ticket = await _queue_draft(to, cc, subject, body, hold=False)
+    except Exception as e:
+        return reply(output, f"Failed to send email: {str(e)}")
+    return reply(output, f"Email queued for confirmation (ticket {ticket.ticket}). Outlook shows it for review and "
+                         f"sends it when the window is closed; use get_send_status to follow it.",
+                 TICKET_FIELDS.project()(ticket))
 
-        # メールオブジェクトの作成
-        mail = outlook.CreateItem(0)  # 0: メールアイテム
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def queue_email(
+    to: str,
+    cc: str,
+    subject: str,
+    body: str,
+    output: str = ""
+) -> ToolResult:
+    """Save an email as a draft and hold it until send_queued_emails reviews and sends all held emails together"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
+    try:
+        ticket = await _queue_draft(to, cc, subject, body, hold=True)
+    except Exception as e:
+        return reply(output, f"Failed to queue email: {str(e)}")
+    return reply(output, f"Email saved as a draft and held (ticket {ticket.ticket}). "
+                         f"Call send_queued_emails to review and send it.",
+                 TICKET_FIELDS.project()(ticket))
 
-        mail.to = to
-        mail.cc = cc
-        mail.subject = subject
-        mail.bodyFormat = 1
-        mail.body = body
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def send_queued_emails(output: str = "") -> ToolResult:
+    """Show every email held by queue_email for confirmation in Outlook, one after another, and send them"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
+    released = outbox.release()
+    if released:
+        outbox_worker.kick()
+    return reply(output, f"{released} held email(s) queued for confirmation. Use get_send_status to follow them.",
+                 {"released": released})
 
-        # 送信前に確認（Outlookが起動）
-        mail.display(True)
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def get_send_status(ticket: str = "", output: str = "", fields: Optional[list[str]] = None) -> ToolResult:
+    """Report the state of an email queued by send_email or queue_email; without a ticket, list recent ones.
 
-        # メール送信
-        mail.Send()
+    States: held, queued, reviewing (open in Outlook), sent, closed (sent or deleted from the Outlook window), failed.
+    output="json" returns ticket records; fields picks some of ticket, subject, recipients, state, error,
+    created and updated."""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        projection = TICKET_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    if outbox.counts().get(QUEUED):
+        # 前回の起動で残った送信待ちを再開する
+        outbox_worker.kick()
+    if ticket:
+        found = outbox.get(ticket.strip())
+        if found is None:
+            return reply(output, f"Unknown ticket: {ticket}")
+        return reply(output, found.describe(), {"tickets": [projection(found)]})
+    tickets = outbox.recent()
+    if not tickets:
+        return reply(output, "No queued emails.", {"tickets": []})
+    return reply(output, "\n".join(found.describe() for found in tickets), {"tickets": projection.all(tickets)})
 
-        return "Email sent successfully."
-    except Exception as e:
-        return f"Failed to send email: {str(e)}"
+# OUTLOOK_GAL_SNAPSHOT にファイルパスを指定すると、グローバルアドレス一覧のスナップショットで
+# 前方一致・あいまい検索を行う（OUTLOOK_GAL_MAX_AGE_HOURS ごとにバックグラウンドで更新）
+gal_directory = (
+    GalDirectory(os.environ["OUTLOOK_GAL_SNAPSHOT"],
+                 timedelta(hours=float(os.environ.get("OUTLOOK_GAL_MAX_AGE_HOURS", "24"))))
+    if os.environ.get("OUTLOOK_GAL_SNAPSHOT") else None
+)
+_gal_task: Optional[asyncio.Task] = None
+GAL_CHECK_INTERVAL = 3600.0
+
+def _start_gal_export() -> GalExport:
+    return GalExport(connections.namespace())
+
+async def _refresh_gal_periodically():
+    while True:
+        if gal_directory.stale:
+            try:
+                export = await com.run(_start_gal_export)
+                # チャンクごとに別ジョブにして、他のツールを間に挟めるようにする
+                while not await com.run(export.step):
+                    pass
+                await asyncio.to_thread(gal_directory.replace, export.snapshot())
+                logger.info(f"GAL snapshot refreshed: {len(export.entries)} entries")
+            except Exception as e:
+                logger.error(f"GAL snapshot refresh failed: {e}")
+        await asyncio.sleep(GAL_CHECK_INTERVAL)
+
+def _ensure_gal_refresh():
+    global _gal_task
+    if gal_directory is not None and (_gal_task is None or _gal_task.done()):
+        _gal_task = asyncio.get_running_loop().create_task(_refresh_gal_periodically())
+
+# OUTLOOK_SNAPSHOT を指定すると、メールと予定のメタデータをファイルに書き出して Outlook なしで集計できる
+SNAPSHOT_PATH = os.environ.get("OUTLOOK_SNAPSHOT")
+# 書き出す予定の範囲 (今日から過去・未来の日数)
+SNAPSHOT_PAST_DAYS = 365
+SNAPSHOT_FUTURE_DAYS = 180
+# この回数の書き出しが追記されたら、古い行を除いてファイルを書き直す
+SNAPSHOT_COMPACT_EXPORTS = 20
+_snapshot_lock = asyncio.Lock()
+# ファイルを書き換える間は読み取り側にマップさせない (Windows ではマップ中のファイルを縮められない)
+_snapshot_file_lock = threading.Lock()
+
+def _snapshot_summary() -> SnapshotSummary:
+    with _snapshot_file_lock, Snapshot(SNAPSHOT_PATH) as snapshot:
+        return snapshot.summary()
+
+def _compact_snapshot():
+    with _snapshot_file_lock:
+        compact(SNAPSHOT_PATH)
+
+def _start_snapshot_export(all_stores: bool, known: Optional[SnapshotSummary]) -> SnapshotExport:
+    namespace = connections.namespace()
+    if all_stores:
+        folders = [namespace.GetFolderFromID(ref.entry_id, ref.store_id)
+                   for ref in resolve_scope(namespace, SearchScope(all_stores=True))]
+    else:
+        folders = [_inbox()]
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    window = (today - timedelta(days=SNAPSHOT_PAST_DAYS), today + timedelta(days=SNAPSHOT_FUTURE_DAYS))
+    writer = SnapshotWriter(SNAPSHOT_PATH, lock=_snapshot_file_lock)
+    return SnapshotExport(writer, namespace, [(folder, folder.FolderPath) for folder in folders],
+                          connections.default_folder(9), window, since=known.mark if known else None, known=known)
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def export_snapshot(all_stores: bool = False, compact: bool = False, output: str = "") -> ToolResult:
+    """
+    Export mail and calendar metadata to the OUTLOOK_SNAPSHOT file for query_snapshot.
+    Later exports append only what changed since the previous one.
+    all_stores exports the mail of every store instead of the Inbox alone.
+    compact then rewrites the file without superseded and deleted rows; this also happens
+    by itself every 20 exports.
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
+    if not SNAPSHOT_PATH:
+        return reply(output, "Set OUTLOOK_SNAPSHOT to the snapshot file path to use snapshots.")
+    async with _snapshot_lock:
+        try:
+            # 書き出し中にファイルをマップしたままにしないよう、必要な情報だけ写して閉じる
+            known = await asyncio.to_thread(_snapshot_summary) if os.path.exists(SNAPSHOT_PATH) else None
+            export = await com.run(_start_snapshot_export, all_stores, known, timeout=COM_TIMEOUT)
+            # バッチごとに別ジョブにして、他のツールを間に挟めるようにする
+            while not await com.run(export.step, timeout=COM_TIMEOUT):
+                pass
+            compacted = compact or export.export >= SNAPSHOT_COMPACT_EXPORTS
+            if compacted:
+                await asyncio.to_thread(_compact_snapshot)
+        except (ComExecutorError, SnapshotError) as e:
+            return reply(output, f"Error exporting snapshot: {str(e)}")
+    counts = export.exported
+    done = " and compacted it." if compacted else "."
+    return reply(output, f"Exported {counts[MAIL]} mail(s), {counts[APPOINTMENT]} appointment(s) and "
+                         f"{counts[DELETED]} deletion(s) to {SNAPSHOT_PATH}{done}",
+                 {"mails": counts[MAIL], "appointments": counts[APPOINTMENT], "deletions": counts[DELETED],
+                  "compacted": compacted, "path": SNAPSHOT_PATH})
+
+def _query_snapshot(kind: int, start: datetime, end: datetime, keyword: str, person: str, group_by: str,
+                    limit: int, output: str = TEXT, fields: Optional[list[str]] = None) -> ToolResult:
+    with _snapshot_file_lock, Snapshot(SNAPSHOT_PATH) as snapshot:
+        if output == JSON:
+            payload = {"updated": snapshot.updated}
+            if group_by:
+                groups = snapshot.aggregate(kind, group_by, start, end, keyword, person)
+                payload["groups"] = [{"group": key, "count": count, "hours": hours}
+                                     for key, count, hours in groups[:limit]]
+                payload["more"] = max(0, len(groups) - limit)
+            else:
+                schema = SNAPSHOT_APPOINTMENT_FIELDS if kind == APPOINTMENT else SNAPSHOT_MAIL_FIELDS
+                records = snapshot.records(kind, start, end, keyword, person)
+                payload["records"] = schema.project(fields).all(records[:limit])
+                payload["more"] = max(0, len(records) - limit)
+            return json_result(payload)
+        updated = f"Snapshot updated {snapshot.updated:%Y-%m-%d %H:%M}" if snapshot.updated else "Snapshot is empty"
+        return f"{updated}:\n" + query(snapshot, kind, start, end, keyword, person, group_by, limit)
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def query_snapshot(
+    kind: str,
+    start_date: str,
+    end_date: str,
+    keyword: str = "",
+    person: str = "",
+    group_by: str = "",
+    limit: int = 50,
+    output: str = "",
+    fields: Optional[list[str]] = None
+) -> ToolResult:
+    """
+    Query the exported snapshot without Outlook. kind is "calendar" or "mail";
+    dates are YYYY-MM-DD (end inclusive). keyword matches the subject, person the
+    sender/recipients or organizer/attendees. group_by counts the matches per group instead:
+    day, week, month, weekday, subject, plus location, category, organizer, attendee and
+    busy_status for calendar or sender, recipient and folder for mail.
+    output="json" returns records (limited to fields, if given) or groups.
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        if kind == "calendar":
+            SNAPSHOT_APPOINTMENT_FIELDS.project(fields)
+        elif kind == "mail":
+            SNAPSHOT_MAIL_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    if not SNAPSHOT_PATH or not os.path.exists(SNAPSHOT_PATH):
+        return reply(output, "No snapshot yet. Set OUTLOOK_SNAPSHOT and run export_snapshot first.")
+    if kind not in ("calendar", "mail"):
+        return reply(output, 'kind must be "calendar" or "mail".')
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        return reply(output, "Invalid date format. Please use YYYY-MM-DD.")
+    try:
+        return await asyncio.to_thread(_query_snapshot, APPOINTMENT if kind == "calendar" else MAIL, start, end,
+                                       keyword, person, group_by, limit, output, fields)
+    except SnapshotError as e:
+        return reply(output, str(e))
+
+# 解決済み連絡先のキャッシュは Outlook に接続しなくても参照できるようにサービスの外に置く
+contact_cache = ContactCache()
+
+def _create_search_service():
+    from outlook_tools.search_service import OutlookSearchService
+    service = OutlookSearchService(connections=connections)
+    service.mail_index = mail_index
+    service.contact_cache = contact_cache
+    service.gal = gal_directory
+    return service
+
+search_service = LazyComObject(com, _create_search_service)
+
+def _lookup_json(lookup, projection: Projection) -> dict:
+    # 連絡先はキャッシュに丸ごと保存されるので、解決した後で射影する
+    record = {"query": lookup.query}
+    if lookup.user is not None:
+        record["user"] = projection(lookup.user)
+    if lookup.candidates:
+        record["candidates"] = [{**projection(user), "score": round(score, 3)} for user, score in lookup.candidates]
+    if lookup.error:
+        record["error"] = lookup.error
+    return record
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def search_contact(name: str, output: str = "", fields: Optional[list[str]] = None) -> ToolResult:
+    """
+    Search for a contact in Outlook by name.
+    output="json" returns the user (or candidates) as a record; fields picks some of its attributes,
+    e.g. ["name", "email"].
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        projection = USER_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    _ensure_gal_refresh()
+    try:
+        lookup = await com.run(connections.call, search_service.lookup_user, name, timeout=COM_TIMEOUT)
+    except ComExecutorError as e:
+        return reply(output, f"Error searching Outlook: {str(e)}")
+    return reply(output, lookup.describe(), _lookup_json(lookup, projection) if output == JSON else None)
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def search_contacts(names: list[str], output: str = "", fields: Optional[list[str]] = None) -> ToolResult:
+    """Search for several contacts in Outlook by name in one request (output and fields as in search_contact)"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        projection = USER_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    _ensure_gal_refresh()
+    try:
+        lookups = await com.run(connections.call, search_service.lookup_users, names, timeout=COM_TIMEOUT)
+    except ComExecutorError as e:
+        return reply(output, f"Error searching Outlook: {str(e)}")
+    if not lookups:
+        return reply(output, "No names given.", {"results": []})
+    return reply(output, "\n\n".join(lookup.describe() for lookup in lookups),
+                 {"results": [_lookup_json(lookup, projection) for lookup in lookups]} if output == JSON else None)
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def get_contact_cache_stats(output: str = "") -> ToolResult:
+    """Show hit/miss statistics of the resolved-contact cache"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
+    stats = contact_cache.stats()
+    return reply(output, json.dumps(stats), stats)
 
-@mcp.tool()
-async def search_contact(name: str) -> str:
-    """Search for a contact in Outlook by name"""
-    return search_service.search_user(name)
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def clear_contact_cache(name: str = "", output: str = "") -> ToolResult:
+    """Forget a cached contact (or every cached contact when no name is given)"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
+    removed = contact_cache.invalidate(name or None)
+    return reply(output, f"Removed {removed} cached contact(s).", {"removed": removed})
+
+# 複数フォルダ・ストアの検索は、それぞれ Outlook に接続した複数の COM スレッドで並列に走査する
+search_pool = ComExecutor(workers=int(os.environ.get("OUTLOOK_SEARCH_WORKERS", DEFAULT_SEARCH_WORKERS)),
+                          name="outlook-search")
+# 添付ファイルのテキストは別プロセスで抽出し、ディスク上にキャッシュする（OUTLOOK_ATTACHMENT_CACHE でパスを変更）
+attachment_search = AttachmentSearch(
+    TextCache(os.environ.get("OUTLOOK_ATTACHMENT_CACHE") or default_cache_path(),
+              int(float(os.environ.get("OUTLOOK_ATTACHMENT_CACHE_MB", "200")) * 1024 * 1024)),
+    max_size=int(float(os.environ.get("OUTLOOK_ATTACHMENT_MAX_MB", "20")) * 1024 * 1024))
+folder_search = FolderSearch(search_pool, connections.namespace, attachment_search)
+
+def _matching_emails(query: MailQuery, scope: SearchScope, limit: int, cursor: Optional[Cursor]):
+    """Matching mail in received-time order, produced lazily."""
+    # 添付ファイルの検索はインデックスを使わず、フォルダ検索の経路で行う
+    if not scope.is_default or query.attachments:
+        outlook = connections.namespace()
+        refs = resolve_scope(outlook, scope)
+        # 各フォルダはページに必要な件数で走査を打ち切り、受信日時順にマージする
+        for hit in folder_search.search(refs, query, limit + 1, cursor, timeout=COM_TIMEOUT):
+            hit.source = outlook
+            yield hit
+        return
+
+    if mail_index is not None and mail_index.ready:
+        # イベントで取りこぼした更新だけを取り込み、インデックスから回答する
+        _sync_mail_index()
+        yield from mail_index.search(query.start, query.end, query.keyword)
+        return
+
+    # Outlook の COM オブジェクトを取得
+    outlook = connections.namespace()
+    # 受信トレイ (olFolderInbox は 6)
+    inbox = _inbox()
+    # 必要な列だけをテーブルでまとめて取得し、本文は必要になった時だけ読む
+    reader = TableReader(OutlookTableBackend(inbox, outlook))
+    for row in reader.read(MailRow, query.to_dasl(), sort="[ReceivedTime]"):
+        try:
+            # MailItem かどうかの確認（MessageClass が IPM.Note*）
+            if row.is_mail and query.matches(row.received_time, row.subject or "", lambda: row.body):
+                yield row
+        except Exception:
+            # 本文を取得できないアイテム等の例外は無視する
+            continue
+
+def _format_email(number: int, email) -> str:
+    folder = getattr(email, "folder", None)
+    attachment = getattr(email, "attachment", None)
+    return "\n".join([
+        "-----",
+        f"Email {number}:",
+        *([f"Folder: {folder}"] if folder else []),
+        f"Sender: {email.sender}",
+        f"Subject: {email.subject}",
+        f"Received: {email.received_time}",
+        *([f"Attachment: {attachment.file_name}", f"Attachment Match: {attachment.excerpt}"] if attachment else []),
+        f"Body Preview: {preview(email.body)}",
+    ])
+
+# collapse_threads でまとめる、1 日あたりの一致メールの上限
+MAX_THREAD_MESSAGES = 1000
+# まとめたスレッドを get_thread で開けるように、会話 ID ごとに最新メールの場所を覚えておく
+thread_index = ThreadIndex()
+
+def _format_thread(number: int, thread: Thread) -> str:
+    thread_index.add(thread)
+    latest = thread.latest
+    return "\n".join([
+        "-----",
+        f"Thread {number}:",
+        f"Thread ID: {thread.thread_id}",
+        f"Messages: {thread.count}",
+        f"Participants: {', '.join(thread.participants)}",
+        f"Latest Subject: {latest.subject}",
+        f"Latest Received: {latest.received_time}",
+        f"Body Preview: {preview(latest.body)}",
+    ])
+
+def _thread_record(projection: Projection):
+    def render(thread: Thread) -> dict:
+        thread_index.add(thread)
+        return projection(thread)
+    return render
+
+def _search_email(target_date, keyword: str, limit: int, cursor: Optional[Cursor], scope: str,
+                  search_scope: SearchScope = SearchScope(), collapse_threads: bool = False,
+                  include_attachments: bool = False, output: str = TEXT,
+                  fields: Optional[list[str]] = None) -> ToolResult:
+    try:
+        # 日付とキーワードを DASL フィルタにして Outlook 側で絞り込む
+        query = MailQuery.for_date(target_date, keyword, attachments=include_attachments)
+        numbers = iter(range((cursor.offset if cursor else 0) + 1, 1 << 62))
+        # JSON では指定したフィールドだけを読む（body_preview を外せば、本文はキーワードの確認にだけ使う）
+        size = json_size if output == JSON else text_size
+        if collapse_threads:
+            # 会話ごとの件数を数えるため、その日の一致メールを読み切ってからまとめる
+            emails = itertools.islice(_matching_emails(query, search_scope, MAX_THREAD_MESSAGES, None),
+                                      MAX_THREAD_MESSAGES)
+            render = (_thread_record(THREAD_FIELDS.project(fields)) if output == JSON
+                      else lambda thread: _format_thread(next(numbers), thread))
+            page = paginate(collapse(emails), lambda thread: thread.key, render, scope,
+                            limit, MAX_RESPONSE_BYTES, cursor, size=size)
+            noun = "thread"
+        else:
+            if cursor:
+                # 続きの取得では、前のページの最後の受信日時から走査を再開する
+                query = replace(query, start=max(query.start, cursor.resume_from))
+            emails = _matching_emails(query, search_scope, limit, cursor)
+            render = (MAIL_FIELDS.project(fields) if output == JSON
+                      else lambda email: _format_email(next(numbers), email))
+            page = paginate(emails, lambda email: (email.received_time, email.entry_id), render, scope,
+                            limit, MAX_RESPONSE_BYTES, cursor, size=size)
+            noun = "email"
+
+        if output == JSON:
+            return json_result({f"{noun}s": page.entries, "first": page.first, "cursor": page.cursor})
+        if not page.entries:
+            if cursor:
+                return f"No more {noun}s found on {target_date} with keyword '{keyword}'."
+            return f"No emails found on {target_date} with keyword '{keyword}'."
+
+        if cursor or page.cursor:
+            header = f"{noun.capitalize()}s {page.first}-{page.last} on {target_date} with keyword '{keyword}':"
+        else:
+            header = f"Found {len(page.entries)} {noun}(s) on {target_date} with keyword '{keyword}':"
+        result_lines = [header] + page.entries
+        if page.cursor:
+            result_lines.append(f"-----\nMore {noun}s match. Call search_email again with cursor=\"{page.cursor}\" to continue.")
+        return "\n".join(result_lines)
+    except LookupError as e:
+        return reply(output, str(e))
+    except Exception as e:
+        if is_disconnected(e):
+            # connections.call で接続し直して再実行する
+            raise
+        return reply(output, f"Error occurred during email search: {str(e)}")
 
-@mcp.tool()
-async def search_email(date: str, keyword: str) -> str:
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def search_email(
+    date: str,
+    keyword: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str = "",
+    folders: Optional[list[str]] = None,
+    include_subfolders: bool = False,
+    all_stores: bool = False,
+    collapse_threads: bool = False,
+    include_attachments: bool = False,
+    output: str = "",
+    fields: Optional[list[str]] = None
+) -> ToolResult:
     """
     指定した日付 (YYYY-MM-DD形式) に受信し、
     件名または本文にキーワードが含まれる Outlook のメールを検索するツールです。
+    結果は limit 件ずつ返し、続きは返された cursor を指定して取得します。
+    既定は受信トレイのみです。folders (例: "Inbox/Projects", "\\\\Archive\\Inbox")、
+    include_subfolders、all_stores (すべてのストアの全メールフォルダ) で検索範囲を広げられます。
+    collapse_threads を指定すると、同じ会話のメールを 1 件にまとめて件数・参加者・最新メールを返します。
+    会話全体は返された Thread ID を get_thread に渡して取得します。
+    include_attachments を指定すると、添付ファイル (PDF, Word, Excel, PowerPoint, テキスト) の本文も検索します。
+    output="json" で構造化した結果を返し、fields で返すフィールドを絞り込めます
+    (メール: entry_id, received_time, subject, sender, to, folder, conversation_id, attachment, body_preview。
+    スレッド: thread_id, count, participants, latest_entry_id, latest_subject, latest_received, body_preview)。
+    body_preview を含めなければ、本文は件名にないキーワードを確認する場合だけ読みます。
     """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        (THREAD_FIELDS if collapse_threads else MAIL_FIELDS).project(fields)
+    except OutputError as e:
+        return str(e)
     try:
         # 入力された文字列を日付オブジェクトに変換
         target_date = datetime.strptime(date, "%Y-%m-%d").date()
     except ValueError:
-        return "Invalid date format. Please use YYYY-MM-DD."
+        return reply(output, "Invalid date format. Please use YYYY-MM-DD.")
 
+    search_scope = SearchScope(tuple(folders or ()), all_stores, include_subfolders)
+    scope = query_scope("search_email", target_date, keyword, search_scope, collapse_threads, include_attachments)
     try:
-        # Outlook の COM オブジェクトを取得
-        import win32com.client
-        outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
-        # 受信トレイ (olFolderInbox は 6)
-        inbox = outlook.GetDefaultFolder(6)
-        messages = inbox.Items
+        resume = Cursor.decode(cursor, scope) if cursor else None
+    except CursorError as e:
+        return reply(output, str(e))
 
-        filtered_emails = []
-        for message in messages:
-            try:
-                # MailItem かどうかの確認（43 は MailItem の定数）
-                if message.Class == 43:
-                    received_time = message.ReceivedTime  # datetime.datetime オブジェクト
-                    if received_time.date() == target_date:
-                        subject = message.Subject or ""
-                        body = message.Body or ""
-                        if keyword.lower() in subject.lower() or keyword.lower() in body.lower():
-                            filtered_emails.append(message)
-            except Exception:
-                # メール以外のアイテム等の例外は無視する
-                continue
-
-        if not filtered_emails:
-            return f"No emails found on {target_date} with keyword '{keyword}'."
+    _ensure_mail_index()
+    try:
+        return await com.run(connections.call, _search_email, target_date, keyword, limit, resume, scope,
+                             search_scope, collapse_threads, include_attachments, output, fields,
+                             timeout=COM_TIMEOUT)
+    except ComExecutorError as e:
+        return reply(output, f"Error occurred during email search: {str(e)}")
 
-        result_lines = [f"Found {len(filtered_emails)} email(s) on {target_date} with keyword '{keyword}':"]
-        for idx, email in enumerate(filtered_emails, start=1):
-            result_lines.append("-----")
-            result_lines.append(f"Email {idx}:")
-            result_lines.append(f"Sender: {email.Sender}")
-            result_lines.append(f"Subject: {email.Subject}")
-            result_lines.append(f"Received: {email.ReceivedTime}")
-            body_text = email.Body.strip() if email.Body else ""
-            # 先頭200文字まで表示
-            preview = body_text.replace("\r\n", " ")[:200] + ("..." if len(body_text) > 200 else "")
-            result_lines.append(f"Body Preview: {preview}")
-        return "\n".join(result_lines)
+def _latest_body(conversation, location) -> str:
+    item = conversation.item
+    if item.EntryID != conversation.latest.entry_id:
+        item = open_item(connections.namespace(), conversation.latest.entry_id, location[1])
+    return item.Body or ""
+
+def _get_thread(thread_id: str, output: str = TEXT, fields: Optional[list[str]] = None) -> ToolResult:
+    location = thread_index.locate(thread_id)
+    if location is None:
+        return reply(output, f"Unknown thread: {thread_id}. Search with collapse_threads=true first.")
+    try:
+        # 会話全体を 1 回のテーブル読み取りで取得する
+        conversation = read_conversation(connections.namespace(), *location)
+    except Exception as e:
+        if is_disconnected(e):
+            raise
+        return reply(output, f"Error reading the thread: {str(e)}")
+    messages = conversation.messages
+    latest = conversation.latest
+    if output == JSON:
+        payload = {"thread_id": thread_id, "messages": MESSAGE_FIELDS.project(fields).all(messages)}
+        if fields is None:
+            # フィールドを絞り込んだ場合は最新メールの本文を読まない
+            try:
+                payload["latest"] = {"entry_id": latest.entry_id, "sender": latest.sender,
+                                     "body_preview": preview(_latest_body(conversation, location))}
+            except Exception as e:
+                if is_disconnected(e):
+                    raise
+                logger.warning(f"Could not read the latest message of thread {thread_id}: {e}")
+        return json_result(payload)
+    lines = [f"Thread {thread_id}: {len(messages)} message(s)"]
+    for message in messages:
+        received = f"{message.received_time:%Y-%m-%d %H:%M}" if message.received_time else "(not sent)"
+        lines.append(f"{'  ' * message.depth}- {received} {message.sender}: {message.subject}")
+    try:
+        # 本文は最新のメールだけ読む
+        lines.append(f"-----\nLatest message from {latest.sender}:\n{preview(_latest_body(conversation, location))}")
     except Exception as e:
-        return f"Error occurred during email search: {str(e)}"
+        logger.warning(f"Could not read the latest message of thread {thread_id}: {e}")
+    return "\n".join(lines)
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def get_thread(thread_id: str, output: str = "", fields: Optional[list[str]] = None) -> ToolResult:
+    """
+    Show every message of a conversation, as a reply tree, with a preview of the latest one.
+    thread_id is a Thread ID returned by search_email with collapse_threads.
+    output="json" returns the messages as records; fields limits them to some of their attributes
+    and skips the latest message's body.
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        MESSAGE_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    try:
+        return await com.run(connections.call, _get_thread, thread_id, output, fields, timeout=COM_TIMEOUT)
+    except ComExecutorError as e:
+        return reply(output, f"Error reading the thread: {str(e)}")
+
+# 新着メールと受信トレイ・予定表の変更をイベントで受け取り、まとめてリングバッファに溜める
+# （get_changes で差分を返し、notify を指定したセッションに changes://outlook の更新を通知する）
+change_log = ChangeLog(int(os.environ.get("OUTLOOK_CHANGE_BUFFER", DEFAULT_CAPACITY)))
+change_watcher = ChangeWatcher(change_log)
+CHANGES_URI = "changes://outlook"
+# get_changes を notify=true で呼んだセッション
+# （FastMCP は resources.subscribe を広告しないため、resources/subscribe は使わない）
+_change_subscribers = weakref.WeakSet()
+_change_task: Optional[asyncio.Task] = None
+
+def _watch_changes():
+    if not change_watcher.watching:
+        change_watcher.watch(connections.application(), _inbox(), connections.default_folder(9))
+
+async def _publish_changes():
+    while True:
+        await asyncio.sleep(change_log.debounce)
+        if not change_log.flush():
+            continue
+        for session in list(_change_subscribers):
+            try:
+                await session.send_resource_updated(AnyUrl(CHANGES_URI))
+            except Exception as e:
+                logger.info(f"Dropping a change subscriber: {e}")
+                _change_subscribers.discard(session)
+
+async def _ensure_change_watch():
+    global _change_task
+    if not change_watcher.watching:
+        await com.run(_watch_changes, timeout=COM_TIMEOUT)
+    if _change_task is None or _change_task.done():
+        _change_task = asyncio.get_running_loop().create_task(_publish_changes())
+
+def _set_notifications(enabled: bool):
+    try:
+        session = mcp.get_context().session
+    except (LookupError, ValueError):
+        # ツールを MCP の要求の外から呼んだ場合
+        return
+    if enabled:
+        _change_subscribers.add(session)
+    else:
+        _change_subscribers.discard(session)
+
+@mcp.tool(structured_output=False)
+@tracer.timed
+async def get_changes(since_token: str = "", limit: int = 100, notify: Optional[bool] = None,
+                      output: str = "", fields: Optional[list[str]] = None) -> ToolResult:
+    """
+    Report new mail and Inbox/calendar changes since since_token, instead of polling
+    search_email or get_calendar. The first call starts watching Outlook and returns a token;
+    pass the returned token to the next call. If changes were missed (too many, or Outlook
+    restarted), rescan once. notify=true also sends this session a resources/updated
+    notification for changes://outlook whenever changes arrive, until a call with notify=false.
+    output="json" returns change records; fields picks some of seq, kind, action, entry_id,
+    subject, time, folder and at.
+    """
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+        projection = CHANGE_FIELDS.project(fields)
+    except OutputError as e:
+        return str(e)
+    if notify is not None:
+        _set_notifications(notify)
+    started = not change_watcher.watching
+    try:
+        await _ensure_change_watch()
+    except ComExecutorError as e:
+        return reply(output, f"Error watching Outlook: {str(e)}")
+    if started and not since_token:
+        token = change_log.token
+        return reply(output, f"Watching Outlook for changes from now on. Next token: {token}",
+                     {"changes": [], "token": token, "missed": False, "more": False})
+    change_log.flush()
+    try:
+        batch = change_log.since(since_token, limit)
+    except ChangeTokenError as e:
+        return reply(output, str(e))
+    if output == JSON:
+        return json_result({"changes": projection.all(batch.changes), "token": batch.token,
+                            "missed": batch.missed, "more": batch.more})
+    lines = []
+    if batch.missed:
+        lines.append("Some changes were missed (too many changes, or Outlook reconnected); "
+                     "rescan with search_email/get_calendar once.")
+    if batch.changes:
+        lines.append(f"{len(batch.changes)} change(s):")
+        lines.extend(f"- {change.describe()}" for change in batch.changes)
+    else:
+        lines.append("No changes.")
+    if batch.more:
+        lines.append("More changes are buffered; call get_changes again with the next token.")
+    lines.append(f"Next token: {batch.token}")
+    return "\n".join(lines)
+
+@mcp.resource(CHANGES_URI)
+def recent_changes() -> str:
+    """Recently buffered new mail and calendar changes (get_changes with notify=true sends update notifications)"""
+    batch = change_log.since()
+    return dumps({"changes": CHANGE_FIELDS.project().all(batch.changes), "token": batch.token})
+
+def _server_stats() -> dict:
+    stats = tracer.stats()
+    stats["com_queue"] = com.pending
+    stats["outbox_queue"] = outbox_pool.pending
+    stats["contact_cache"] = contact_cache.stats()
+    stats["connections"] = connections.stats()
+    stats["attachments"] = attachment_search.stats()
+    stats["changes"] = change_log.stats()
+    if calendar_service.created:
+        stats["calendar_cache"] = calendar_service.get().cache.stats()
+    return stats
+
+@mcp.tool(structured_output=False)
+async def get_server_stats(reset: bool = False, dump_trace: bool = False, output: str = "") -> ToolResult:
+    """Show per-tool latency histograms and COM call statistics (set OUTLOOK_TRACE=1 to trace COM calls)"""
+    try:
+        output = output_format(output, OUTPUT_FORMAT)
+    except OutputError as e:
+        return str(e)
+    stats = _server_stats()
+    if dump_trace:
+        # chrome://tracing や Perfetto で開ける形式で書き出す
+        path = os.environ.get("OUTLOOK_TRACE_FILE") or os.path.join(tempfile.gettempdir(), "outlook-tools-trace.json")
+        stats["trace_file"] = await asyncio.to_thread(tracer.dump_trace, path)
+    if reset:
+        tracer.reset()
+    return reply(output, json.dumps(stats, ensure_ascii=False), stats)
+
+@mcp.resource("stats://server")
+def server_stats() -> str:
+    """Per-tool latency histograms and COM call statistics"""
+    return json.dumps(_server_stats(), ensure_ascii=False)
+
+def _warm_up():
+    # 起動直後のハンドシェイクを邪魔しないよう、少し待ってから COM スレッドで接続する
+    for service in (calendar_service, search_service):
+        service.warm_up()
 
 if __name__ == "__main__":
+    # OUTLOOK_WARM_UP=1 で、最初のツール呼び出しを待たずに Outlook へ接続しておく
+    if os.environ.get("OUTLOOK_WARM_UP") == "1":
+        threading.Timer(WARM_UP_DELAY, _warm_up).start()
+    # 前回の起動で確認・送信が終わらなかったメールを再開する
+    if os.path.exists(outbox.path):
+        threading.Timer(WARM_UP_DELAY, outbox_worker.kick).start()
     mcp.run()
@@ -0,0 +1,801 @@
+"""Append-only columnar snapshot of mail and calendar metadata.
+
+Analytics questions ("how many meetings with team X last quarter") should
+not have to walk live Outlook. :class:`SnapshotExport` streams metadata out
+of Outlook in table batches and appends every batch to the snapshot file as
+a self-contained segment of columns. Later exports append only what changed
+since the previous one (by ``LastModificationTime``), plus tombstones for
+deleted items. A row is superseded by any later export holding its
+EntryID, so a changed recurring series replaces all its occurrences at once.
+
+The read side needs nothing but the file, so it also runs on Linux.
+:class:`Snapshot` memory-maps the file and scans whole columns at a time.
+Rows are sorted by time within each segment, so a date range costs two
+binary searches over an int64 column. Keywords are found with
+``bytes.find`` over a column's UTF-8 bytes instead of by decoding each row.
+
+File layout (little-endian): the 8-byte magic, then the segments. A
+segment is a 40-byte header followed by a payload:
+
+- The header holds ``SEG1``, the kind, the row count, the creation time, the
+  export's high-water ``LastModificationTime``, the payload length and the
+  number of the export that wrote the segment.
+- The payload opens with one (offset, length) pair per column of the
+  kind's schema.
+- Integer columns are int64 arrays. String columns are ``rows + 1`` int64
+  offsets followed by the UTF-8 bytes.
+- Every block starts on an 8-byte boundary.
+
+Times are seconds since 1970-01-01 in local wall-clock time. A truncated
+last segment, left by an interrupted append, is ignored; the next append
+first rewrites the file without it. The file is never truncated in place,
+because that fails while a reader has it mapped on Windows.
+"""
+import argparse
+import array
+import bisect
+import contextlib
+import datetime
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import astuple, dataclass, field
+from operator import attrgetter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .table_reader import JET_DATE_FORMAT, OutlookTableBackend
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OLSNAP01"
+DEFAULT_EXPORT_BATCH = 1000
+
+MAIL = 1
+APPOINTMENT = 2
+DELETED = 3
+
+_SEGMENT = struct.Struct("<4sB3xIqqQI")
+_SEGMENT_MAGIC = b"SEG1"
+_BLOCK = struct.Struct("<QQ")
+_EPOCH = datetime.datetime(1970, 1, 1)
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+# Column types: "time" and "int" are stored as int64, "text" as offsets + UTF-8
+SCHEMAS: Dict[int, Tuple[Tuple[str, str], ...]] = {
+    MAIL: (("entry_id", "text"), ("received_time", "time"), ("subject", "text"), ("sender", "text"),
+           ("to", "text"), ("folder", "text")),
+    APPOINTMENT: (("entry_id", "text"), ("start", "time"), ("end", "time"), ("subject", "text"),
+                  ("location", "text"), ("categories", "text"), ("busy_status", "int"),
+                  ("organizer", "text"), ("attendees", "text")),
+    DELETED: (("entry_id", "text"), ("kind", "int")),
+}
+# Rows of each data kind are sorted by their second column
+_TIME_COLUMN = {MAIL: "received_time", APPOINTMENT: "start"}
+# Columns a ``person`` filter searches
+_PERSON_COLUMNS = {MAIL: ("sender", "to"), APPOINTMENT: ("organizer", "attendees")}
+
+_MAIL_COLUMNS = ("EntryID", "ReceivedTime", "Subject", "SenderName", "To", "MessageClass", "LastModificationTime")
+_APPOINTMENT_COLUMNS = ("EntryID", "Start", "End", "Subject", "Location", "Categories", "BusyStatus",
+                        "Organizer", "RequiredAttendees", "LastModificationTime")
+
+
+class SnapshotError(ValueError):
+    """The file is not a snapshot, or the query is invalid."""
+
+
+@dataclass(frozen=True)
+class SnapshotMail:
+    entry_id: str
+    received_time: datetime.datetime
+    subject: str
+    sender: str
+    to: str
+    folder: str
+
+
+@dataclass(frozen=True)
+class SnapshotAppointment:
+    entry_id: str
+    start: datetime.datetime
+    end: datetime.datetime
+    subject: str
+    location: str
+    categories: str
+    busy_status: int
+    organizer: str
+    attendees: str
+
+
+_RECORDS = {MAIL: SnapshotMail, APPOINTMENT: SnapshotAppointment}
+
+
+def _seconds(value: Optional[datetime.datetime]) -> int:
+    if value is None:
+        return 0
+    return int((value.replace(tzinfo=None) - _EPOCH).total_seconds())
+
+
+def _time(seconds: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(seconds=seconds)
+
+
+# -- writing -------------------------------------------------------------------
+
+def _int_block(values) -> bytes:
+    data = array.array("q", values)
+    if not _LITTLE_ENDIAN:
+        data.byteswap()
+    return data.tobytes()
+
+
+def _text_block(values) -> bytes:
+    offsets, chunks, position = [0], [], 0
+    for value in values:
+        encoded = str(value or "").encode("utf-8")
+        chunks.append(encoded)
+        position += len(encoded)
+        offsets.append(position)
+    return _int_block(offsets) + b"".join(chunks)
+
+
+def encode_segment(kind: int, rows: Sequence[Sequence[Any]], created: int = 0, mark: int = 0,
+                   export: int = 0) -> bytes:
+    """One segment of ``rows``, given as tuples in the order of ``SCHEMAS[kind]``."""
+    schema = SCHEMAS[kind]
+    if kind in _TIME_COLUMN:
+        rows = sorted(rows, key=lambda row: (_seconds(row[1]), row[0]))
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    directory, body = [], []
+    offset = _BLOCK.size * len(schema)
+    for (name, type_), values in zip(schema, columns):
+        if type_ == "text":
+            block = _text_block(values)
+        elif type_ == "time":
+            block = _int_block(_seconds(value) for value in values)
+        else:
+            block = _int_block(int(value or 0) for value in values)
+        directory.append(_BLOCK.pack(offset, len(block)))
+        block += b"\0" * (-len(block) % 8)
+        body.append(block)
+        offset += len(block)
+    payload = b"".join(directory) + b"".join(body)
+    return _SEGMENT.pack(_SEGMENT_MAGIC, kind, len(rows), created, mark, len(payload), export) + payload
+
+
+def _segment_headers(read, size: int) -> Iterator[Tuple[int, tuple]]:
+    """(offset, header) of every complete segment; ``read(offset, length)`` returns bytes."""
+    if size and read(0, len(MAGIC)) != MAGIC:
+        raise SnapshotError("Not a mailbox snapshot file")
+    position = len(MAGIC)
+    while position + _SEGMENT.size <= size:
+        header = _SEGMENT.unpack(read(position, _SEGMENT.size))
+        if header[0] != _SEGMENT_MAGIC or position + _SEGMENT.size + header[5] > size:
+            break
+        yield position, header
+        position += _SEGMENT.size + header[5]
+
+
+def _valid_end(f) -> Tuple[int, int]:
+    """Offset just after the last complete segment of the open file ``f``, and its export number."""
+    size = os.fstat(f.fileno()).st_size
+
+    def read(offset, length):
+        f.seek(offset)
+        return f.read(length)
+
+    end, export = len(MAGIC), 0
+    for offset, header in _segment_headers(read, size):
+        end, export = offset + _SEGMENT.size + header[5], header[6]
+    return end, export
+
+
+class SnapshotWriter:
+    """Appends segments to a snapshot file, creating it on first use."""
+
+    def __init__(self, path: str, clock=time.time, lock=None):
+        self.path = path
+        self.clock = clock
+        # Held while the file changes; share it with readers that must not
+        # map the file meanwhile
+        self.lock = lock if lock is not None else contextlib.nullcontext()
+
+    def next_export(self) -> int:
+        """Number for a new export; rows of later exports supersede those of earlier ones."""
+        if not os.path.exists(self.path):
+            return 1
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 1
+            return _valid_end(f)[1] + 1
+
+    def append(self, kind: int, rows: Sequence[Sequence[Any]],
+               mark: Optional[datetime.datetime] = None, export: Optional[int] = None) -> int:
+        """Append ``rows`` as one segment; returns the number of rows written.
+
+        Segments of one ``export`` (see :meth:`next_export`) form a single
+        version of the data; without one, the segment is an export of its
+        own. An empty segment is still written when it carries a ``mark``.
+        """
+        if not rows and mark is None:
+            return 0
+        if export is None:
+            export = self.next_export()
+        segment = encode_segment(kind, rows, int(self.clock()), _seconds(mark), export)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.lock:
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    end = _valid_end(f)[0] if size else 0
+                if end < size:
+                    # A torn segment from an interrupted append is dropped
+                    with open(self.path, "rb") as f:
+                        _replace(self.path, [f.read(end)])
+            with open(self.path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                f.write(segment)
+                f.flush()
+                os.fsync(f.fileno())
+        return len(rows)
+
+
+def _replace(path: str, parts: Sequence[bytes]):
+    """Write ``parts`` to a new file and move it over ``path`` in one step."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(b"".join(parts))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def compact(path: str):
+    """Rewrite the snapshot with only its live rows, atomically.
+
+    Superseded rows and tombstones are dropped; the export mark is kept, so
+    the next export still only appends changes.
+    """
+    with Snapshot(path) as snapshot:
+        parts = [MAGIC]
+        created, mark = int(time.time()), _seconds(snapshot.mark)
+        for kind in (MAIL, APPOINTMENT):
+            rows = [astuple(record) for record in snapshot.records(kind)]
+            if rows:
+                parts.append(encode_segment(kind, rows, created, mark, 1))
+        if len(parts) == 1 and mark:
+            parts.append(encode_segment(DELETED, [], created, mark, 1))
+    _replace(path, parts)
+
+
+@dataclass
+class SnapshotSummary:
+    """What an export needs to know of an existing snapshot.
+
+    Copied out of the file, so the :class:`Snapshot` can be closed before
+    the export writes to it.
+    """
+    mark: Optional[datetime.datetime] = None
+    # Greatest appointment start
+    latest_appointment: Optional[datetime.datetime] = None
+    # Live mail EntryIDs per folder path
+    mails: Dict[str, set] = field(default_factory=dict)
+    appointments: set = field(default_factory=set)
+
+    def entry_ids(self, kind: int, folder: Optional[str] = None) -> set:
+        if kind == APPOINTMENT:
+            return self.appointments
+        if folder is not None:
+            return self.mails.get(folder, set())
+        return set().union(*self.mails.values())
+
+
+# -- export from Outlook -------------------------------------------------------
+
+class SnapshotExport:
+    """Resumable export of mail and calendar metadata, ``batch`` rows per step.
+
+    Like :class:`GalExport`, each :meth:`step` is meant to run as its own
+    COM job. ``mail_folders`` are ``(folder, path)`` pairs; appointments
+    are exported for the ``window`` (start, end). With ``since``, only
+    items modified after it are exported, and items of an existing
+    snapshot that no longer exist in Outlook get tombstones. Against a
+    ``known`` snapshot (see :meth:`Snapshot.summary`), folders it does not
+    hold yet are exported in full, as are appointments beyond its latest
+    one, so that a moving window fills in.
+    """
+
+    def __init__(self, writer: SnapshotWriter, namespace, mail_folders: Sequence[Tuple[Any, str]], calendar,
+                 window: Tuple[datetime.datetime, datetime.datetime],
+                 since: Optional[datetime.datetime] = None, batch: int = DEFAULT_EXPORT_BATCH,
+                 known: Optional[SnapshotSummary] = None):
+        self.writer = writer
+        self.namespace = namespace
+        self.mail_folders = list(mail_folders)
+        self.calendar = calendar
+        self.window = window
+        self.since = since
+        self.batch = batch
+        self.known = known
+        self.mark = since
+        self.exported = {MAIL: 0, APPOINTMENT: 0, DELETED: 0}
+        self.export = writer.next_export()
+        self._known_folders = set(known.mails) if known is not None else None
+        self._boundary = known.latest_appointment if known is not None else None
+        self._rows = self._all_rows()
+        self.done = False
+
+    def _changed(self, modified) -> bool:
+        return isinstance(modified, datetime.datetime) and modified.replace(tzinfo=None) > self.since
+
+    def _track(self, modified):
+        if isinstance(modified, datetime.datetime):
+            modified = modified.replace(tzinfo=None)
+            if self.mark is None or modified > self.mark:
+                self.mark = modified
+
+    def _mail_rows(self, folder, path: str) -> Iterator[Tuple[int, tuple]]:
+        restriction = None
+        if self.since is not None and (self._known_folders is None or path in self._known_folders):
+            restriction = f"[LastModificationTime] > '{self.since.strftime(JET_DATE_FORMAT)}'"
+        backend = OutlookTableBackend(folder, self.namespace)
+        for values in backend.rows(restriction, _MAIL_COLUMNS, self.batch, "[ReceivedTime]"):
+            entry_id, received, subject, sender, to, message_class, modified = values
+            self._track(modified)
+            # Same items as Class == 43 (olMail)
+            if received is None or not (message_class or "").startswith("IPM.Note"):
+                continue
+            yield MAIL, (entry_id, received, subject, sender, to, path)
+
+    def _appointment_rows(self) -> Iterator[Tuple[int, tuple]]:
+        start, end = self.window
+        restriction = "[Start] < '{}' AND [End] > '{}'".format(
+            end.strftime(JET_DATE_FORMAT), start.strftime(JET_DATE_FORMAT))
+        single = restriction
+        if self.since is not None:
+            changed = f"[LastModificationTime] > '{self.since.strftime(JET_DATE_FORMAT)}'"
+            if self._boundary is not None:
+                changed = f"({changed} OR [Start] > '{self._boundary.strftime(JET_DATE_FORMAT)}')"
+            single = f"{restriction} AND {changed}"
+        # Single appointments from one batched table read; Tables do not
+        # expand recurring series, so occurrences still go through Items.
+        backend = OutlookTableBackend(self.calendar, self.namespace)
+        for values in backend.rows(single + " AND [IsRecurring] = False", _APPOINTMENT_COLUMNS, self.batch):
+            self._track(values[-1])
+            yield APPOINTMENT, tuple(values[:-1])
+        items = self.calendar.Items
+        items.IncludeRecurrences = True
+        items.Sort("[Start]")
+        occurrences = items.Restrict(restriction + " AND [IsRecurring] = True")
+        if self.since is None:
+            for occurrence in occurrences:
+                values = [getattr(occurrence, column, None) for column in _APPOINTMENT_COLUMNS]
+                self._track(values[-1])
+                yield APPOINTMENT, tuple(values[:-1])
+            return
+        # A series is exported whole or not at all, since its rows replace
+        # every earlier occurrence of its EntryID
+        series: Dict[str, List[tuple]] = {}
+        wanted = set()
+        for occurrence in occurrences:
+            values = [getattr(occurrence, column, None) for column in _APPOINTMENT_COLUMNS]
+            series.setdefault(values[0], []).append(tuple(values[:-1]))
+            if self._changed(values[-1]) or (self._boundary is not None
+                                                   and values[1].replace(tzinfo=None) > self._boundary):
+                self._track(values[-1])
+                wanted.add(values[0])
+        for entry_id in wanted:
+            for row in series[entry_id]:
+                yield APPOINTMENT, row
+
+    def _deleted_rows(self) -> Iterator[Tuple[int, tuple]]:
+        if self.known is None:
+            return
+        sources = [(folder, MAIL, path) for folder, path in self.mail_folders]
+        sources.append((self.calendar, APPOINTMENT, None))
+        for folder, kind, path in sources:
+            current = {values[0] for values in
+                       OutlookTableBackend(folder, self.namespace).rows(None, ("EntryID",), self.batch)}
+            for entry_id in self.known.entry_ids(kind, folder=path):
+                if entry_id not in current:
+                    yield DELETED, (entry_id, kind)
+
+    def _all_rows(self) -> Iterator[Tuple[int, tuple]]:
+        for folder, path in self.mail_folders:
+            yield from self._mail_rows(folder, path)
+        yield from self._appointment_rows()
+        yield from self._deleted_rows()
+
+    def step(self) -> bool:
+        """Export up to ``batch`` rows; returns True once everything has been exported."""
+        pending: Dict[int, List[tuple]] = {}
+        for count, (kind, row) in enumerate(self._rows, start=1):
+            pending.setdefault(kind, []).append(row)
+            if count >= self.batch:
+                break
+        else:
+            self.done = True
+        # Rows arrive in received-time order, not modification order, so the
+        # high-water mark is only recorded once the export is complete
+        mark = self.mark if self.done else None
+        for kind, rows in pending.items():
+            self.exported[kind] += self.writer.append(kind, rows, mark, self.export)
+        if self.done and not pending and mark is not None:
+            self.writer.append(DELETED, [], mark, self.export)
+        return self.done
+
+
+# -- reading -------------------------------------------------------------------
+
+class _Text:
+    """String column: int64 offsets plus UTF-8 bytes, decoded on demand."""
+    __slots__ = ("offsets", "data", "_folded")
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self._folded = None
+
+    def raw(self, row: int) -> bytes:
+        return bytes(self.data[self.offsets[row]:self.offsets[row + 1]])
+
+    def __getitem__(self, row: int) -> str:
+        return self.raw(row).decode("utf-8")
+
+    def rows_containing(self, needle: bytes, lo: int, hi: int) -> List[int]:
+        """Rows in ``[lo, hi)`` whose text contains ``needle`` (ASCII case-insensitively)."""
+        if self._folded is None:
+            # bytes.lower only folds ASCII, so UTF-8 sequences stay intact
+            self._folded = bytes(self.data).lower()
+        folded, offsets = self._folded, self.offsets
+        stop = offsets[hi]
+        found = []
+        position = folded.find(needle, offsets[lo], stop)
+        while position != -1:
+            row = bisect.bisect_right(offsets, position, lo, hi + 1) - 1
+            if position + len(needle) <= offsets[row + 1]:
+                found.append(row)
+                position = folded.find(needle, offsets[row + 1], stop)
+            else:
+                # Straddles two rows: a match of neither
+                position = folded.find(needle, position + 1, stop)
+        return found
+
+
+class _Segment:
+    __slots__ = ("kind", "rows", "created", "mark", "export", "columns", "live")
+
+    def __init__(self, kind: int, rows: int, created: int, mark: int, export: int, columns: Dict[str, Any]):
+        self.kind = kind
+        self.rows = rows
+        self.created = created
+        self.mark = mark
+        self.export = export
+        self.columns = columns
+        self.live = bytearray(b"\x01") * rows
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file.
+
+    Rows superseded by a later export, or deleted by a tombstone, are
+    hidden. Use as a context manager, or call :meth:`close`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._views: List[memoryview] = []
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._buffer = self._view(memoryview(self._map)) if self._map is not None else memoryview(b"")
+        self.size = size
+        self.segments = [self._segment(offset, header) for offset, header in
+                         _segment_headers(lambda offset, length: bytes(self._buffer[offset:offset + length]), size)
+                         if header[1] in SCHEMAS]
+        self._hide_superseded()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _view(self, view: memoryview) -> memoryview:
+        self._views.append(view)
+        return view
+
+    def _ints(self, start: int, length: int):
+        block = self._view(self._buffer[start:start + length])
+        if _LITTLE_ENDIAN:
+            return self._view(block.cast("q"))
+        values = array.array("q", block)
+        values.byteswap()
+        return values
+
+    def _segment(self, offset: int, header: tuple) -> _Segment:
+        _, kind, rows, created, mark, _, export = header
+        payload = offset + _SEGMENT.size
+        columns = {}
+        for index, (name, type_) in enumerate(SCHEMAS[kind]):
+            start, length = _BLOCK.unpack_from(self._buffer, payload + index * _BLOCK.size)
+            start += payload
+            if type_ == "text":
+                index_size = 8 * (rows + 1)
+                columns[name] = _Text(self._ints(start, index_size),
+                                      self._view(self._buffer[start + index_size:start + length]))
+            else:
+                columns[name] = self._ints(start, length)
+        return _Segment(kind, rows, created, mark, export, columns)
+
+    def _hide_superseded(self):
+        hidden = {MAIL: set(), APPOINTMENT: set()}
+        # EntryIDs of the export being walked; occurrences of one series
+        # share an EntryID and may be spread over several of its segments
+        current: Dict[int, set] = {MAIL: set(), APPOINTMENT: set()}
+        export = None
+        for segment in reversed(self.segments):
+            if segment.export != export:
+                for kind, own in current.items():
+                    hidden[kind] |= own
+                    own.clear()
+                export = segment.export
+            entry_ids = segment.columns["entry_id"]
+            if segment.kind == DELETED:
+                kinds = segment.columns["kind"]
+                for row in range(segment.rows):
+                    hidden.setdefault(kinds[row], set()).add(entry_ids.raw(row))
+                continue
+            seen, own, live = hidden[segment.kind], current[segment.kind], segment.live
+            for row in range(segment.rows):
+                entry_id = entry_ids.raw(row)
+                if entry_id in seen:
+                    live[row] = 0
+                else:
+                    own.add(entry_id)
+
+    @property
+    def mark(self) -> Optional[datetime.datetime]:
+        """High-water ``LastModificationTime`` of the exports so far."""
+        marks = [segment.mark for segment in self.segments if segment.mark]
+        return _time(max(marks)) if marks else None
+
+    @property
+    def updated(self) -> Optional[datetime.datetime]:
+        if not self.segments:
+            return None
+        return datetime.datetime.fromtimestamp(max(segment.created for segment in self.segments))
+
+    def count(self, kind: int) -> int:
+        return sum(sum(segment.live) for segment in self.segments if segment.kind == kind)
+
+    def entry_ids(self, kind: int, folder: Optional[str] = None) -> set:
+        """Live EntryIDs of ``kind`` (mail of ``folder`` only, if given)."""
+        result = set()
+        for segment in self.segments:
+            if segment.kind != kind:
+                continue
+            entry_ids, folders, live = segment.columns["entry_id"], segment.columns.get("folder"), segment.live
+            for row in range(segment.rows):
+                if live[row] and (folder is None or folders[row] == folder):
+                    result.add(entry_ids[row])
+        return result
+
+    def folders(self) -> set:
+        """Folder paths the live mail rows come from."""
+        result = set()
+        for segment in self.segments:
+            if segment.kind == MAIL:
+                folders, live = segment.columns["folder"], segment.live
+                result.update(folders[row] for row in range(segment.rows) if live[row])
+        return result
+
+    def summary(self) -> SnapshotSummary:
+        """Mark, latest appointment and live EntryIDs, for an export that appends to this file."""
+        mails: Dict[str, set] = {}
+        for segment in self.segments:
+            if segment.kind == MAIL:
+                entry_ids, folders, live = segment.columns["entry_id"], segment.columns["folder"], segment.live
+                for row in range(segment.rows):
+                    if live[row]:
+                        mails.setdefault(folders[row], set()).add(entry_ids[row])
+        return SnapshotSummary(self.mark, self.latest(APPOINTMENT), mails, self.entry_ids(APPOINTMENT))
+
+    def latest(self, kind: int) -> Optional[datetime.datetime]:
+        """Greatest received time or start of any row of ``kind``."""
+        ends = [segment.columns[_TIME_COLUMN[kind]][segment.rows - 1]
+                for segment in self.segments if segment.kind == kind and segment.rows]
+        return _time(max(ends)) if ends else None
+
+    def _select(self, kind: int, start: Optional[datetime.datetime], end: Optional[datetime.datetime],
+                keyword: str = "", person: str = "") -> Iterator[Tuple[_Segment, List[int]]]:
+        begin = _seconds(start) if start else -(1 << 62)
+        stop = _seconds(end) if end else 1 << 62
+        needles = [text.strip().encode("utf-8").lower() for text in (keyword, person)]
+        for segment in self.segments:
+            if segment.kind != kind:
+                continue
+            times = segment.columns[_TIME_COLUMN[kind]]
+            lo = bisect.bisect_left(times, begin)
+            hi = bisect.bisect_left(times, stop, lo)
+            if lo >= hi:
+                continue
+            rows = range(lo, hi)
+            if needles[0]:
+                rows = segment.columns["subject"].rows_containing(needles[0], lo, hi)
+            if needles[1]:
+                matching = set()
+                for column in _PERSON_COLUMNS[kind]:
+                    matching.update(segment.columns[column].rows_containing(needles[1], lo, hi))
+                rows = [row for row in rows if row in matching]
+            live = segment.live
+            if kind == APPOINTMENT:
+                # Same as get_calendar: appointments lying entirely inside the range
+                ends = segment.columns["end"]
+                rows = [row for row in rows if live[row] and ends[row] <= stop]
+            else:
+                rows = [row for row in rows if live[row]]
+            if rows:
+                yield segment, rows
+
+    def _record(self, segment: _Segment, row: int):
+        values = []
+        for name, type_ in SCHEMAS[segment.kind]:
+            value = segment.columns[name][row]
+            values.append(_time(value) if type_ == "time" else value)
+        return _RECORDS[segment.kind](*values)
+
+    def records(self, kind: int, start: Optional[datetime.datetime] = None,
+                end: Optional[datetime.datetime] = None, keyword: str = "", person: str = "") -> list:
+        """Matching live records in time order."""
+        found = [self._record(segment, row) for segment, rows in self._select(kind, start, end, keyword, person)
+                 for row in rows]
+        found.sort(key=attrgetter(_TIME_COLUMN[kind], "entry_id"))
+        return found
+
+    def appointments(self, start: datetime.datetime, end: datetime.datetime, keyword: str = "",
+                     attendee: str = "") -> List[SnapshotAppointment]:
+        """What get_calendar would return, optionally narrowed by subject keyword and organizer/attendee."""
+        return self.records(APPOINTMENT, start, end, keyword, attendee)
+
+    def mails(self, start: datetime.datetime, end: datetime.datetime, keyword: str = "",
+              person: str = "") -> List[SnapshotMail]:
+        """Mail received in ``[start, end)`` whose subject contains ``keyword`` (bodies are not exported)."""
+        return self.records(MAIL, start, end, keyword, person)
+
+    def aggregate(self, kind: int, by: str, start: Optional[datetime.datetime] = None,
+                  end: Optional[datetime.datetime] = None, keyword: str = "",
+                  person: str = "") -> List[Tuple[str, int, float]]:
+        """(group, count, hours) per value of ``by``, most frequent first.
+
+        Hours are the summed durations of appointments, 0 for mail.
+        """
+        group = _grouping(kind, by)
+        totals: Dict[str, List[float]] = {}
+        for segment, rows in self._select(kind, start, end, keyword, person):
+            starts = segment.columns[_TIME_COLUMN[kind]]
+            ends = segment.columns.get("end")
+            for row in rows:
+                hours = (ends[row] - starts[row]) / 3600 if ends is not None else 0.0
+                for key in group(segment, row):
+                    total = totals.setdefault(key, [0, 0.0])
+                    total[0] += 1
+                    total[1] += hours
+        ranked = sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(key, int(count), round(hours, 2)) for key, (count, hours) in ranked]
+
+
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_TIME_GROUPS = {
+    "day": lambda moment: f"{moment:%Y-%m-%d}",
+    "week": lambda moment: f"{moment:%G-W%V}",
+    "month": lambda moment: f"{moment:%Y-%m}",
+    "weekday": lambda moment: _WEEKDAYS[moment.weekday()],
+}
+# group name -> (column, separator of multi-valued columns)
+_TEXT_GROUPS = {
+    MAIL: {"sender": ("sender", None), "recipient": ("to", ";"), "folder": ("folder", None),
+           "subject": ("subject", None)},
+    APPOINTMENT: {"subject": ("subject", None), "location": ("location", None), "category": ("categories", ","),
+                  "organizer": ("organizer", None), "attendee": ("attendees", ";"),
+                  "busy_status": ("busy_status", None)},
+}
+
+
+def group_names(kind: int) -> List[str]:
+    return list(_TIME_GROUPS) + list(_TEXT_GROUPS[kind])
+
+
+def _grouping(kind: int, by: str):
+    if by in _TIME_GROUPS:
+        label, column = _TIME_GROUPS[by], _TIME_COLUMN[kind]
+        return lambda segment, row: (label(_time(segment.columns[column][row])),)
+    if by not in _TEXT_GROUPS.get(kind, {}):
+        raise SnapshotError(f"Cannot group by '{by}'; choose one of: {', '.join(group_names(kind))}")
+    column, separator = _TEXT_GROUPS[kind][by]
+
+    def keys(segment, row):
+        value = str(segment.columns[column][row])
+        if separator is None:
+            return (value.strip() or "(none)",)
+        parts = [part.strip() for part in value.split(separator) if part.strip()]
+        return parts or ("(none)",)
+    return keys
+
+
+# -- formatting and command line -------------------------------------------------
+
+def format_records(records: Sequence[Any], limit: int) -> str:
+    if not records:
+        return "No matching records."
+    lines = []
+    for record in records[:limit]:
+        if isinstance(record, SnapshotAppointment):
+            lines.append(f"{record.start:%Y-%m-%d %H:%M}-{record.end:%H:%M} {record.subject}"
+                         + (f" @ {record.location}" if record.location else ""))
+        else:
+            lines.append(f"{record.received_time:%Y-%m-%d %H:%M} {record.sender}: {record.subject}"
+                         + (f" [{record.folder}]" if record.folder else ""))
+    if len(records) > limit:
+        lines.append(f"... and {len(records) - limit} more")
+    return "\n".join(lines)
+
+
+def format_groups(by: str, groups: Sequence[Tuple[str, int, float]], kind: int, limit: int) -> str:
+    lines = [f"{'count':>6}  {'hours':>8}  {by}" if kind == APPOINTMENT else f"{'count':>6}  {by}"]
+    for key, count, hours in groups[:limit]:
+        lines.append(f"{count:>6}  {hours:>8.2f}  {key}" if kind == APPOINTMENT else f"{count:>6}  {key}")
+    if len(groups) > limit:
+        lines.append(f"... and {len(groups) - limit} more groups")
+    return "\n".join(lines)
+
+
+def query(snapshot: Snapshot, kind: int, start: datetime.datetime, end: datetime.datetime, keyword: str = "",
+          person: str = "", group_by: str = "", limit: int = 50) -> str:
+    """Matching records, or their aggregation by ``group_by``, as text."""
+    if group_by:
+        groups = snapshot.aggregate(kind, group_by, start, end, keyword, person)
+        return format_groups(group_by, groups, kind, limit)
+    return format_records(snapshot.records(kind, start, end, keyword, person), limit)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query a mailbox snapshot without Outlook.")
+    parser.add_argument("path")
+    parser.add_argument("kind", choices=("calendar", "mail"))
+    parser.add_argument("start", help="YYYY-MM-DD")
+    parser.add_argument("end", help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--keyword", default="", help="text in the subject")
+    parser.add_argument("--person", default="", help="sender/recipient or organizer/attendee")
+    parser.add_argument("--group-by", default="", help="aggregate instead of listing")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    kind = APPOINTMENT if args.kind == "calendar" else MAIL
+    start = datetime.datetime.strptime(args.start, "%Y-%m-%d")
+    end = datetime.datetime.strptime(args.end, "%Y-%m-%d") + datetime.timedelta(days=1)
+    with Snapshot(args.path) as snapshot:
+        try:
+            print(query(snapshot, kind, start, end, args.keyword, args.person, args.group_by, args.limit))
+        except SnapshotError as e:
+            parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
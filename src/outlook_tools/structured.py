@@ -0,0 +1,230 @@
+"""Compact JSON output for the tools.
+
+Tools answer with text meant to be read by people. With ``output="json"``
+(or ``OUTLOOK_OUTPUT=json`` for every call) they return the same results
+as typed JSON instead, once as ``structuredContent`` and once as a compact
+text block for clients that only read text.
+
+Each kind of record has a :class:`Schema` mapping field names to getters,
+and ``fields`` projects records onto some of them. Only the getters of the
+projected fields run, so a field that costs a COM read per item, such as a
+body preview, is never fetched when it is projected out.
+
+:func:`to_json` is the one serializer behind every tool: datetimes become
+ISO 8601 wall-clock text, and dataclasses (``UserInfo``, tickets, slots)
+become objects without their unset fields.
+"""
+import dataclasses
+import datetime
+import json
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from mcp.types import CallToolResult, TextContent
+
+from .changes import Change
+from .contacts import UserInfo
+from .free_busy import FreeSlot
+from .outbox import Ticket
+from .snapshot import SnapshotAppointment, SnapshotMail
+from .threads import ConversationMessage
+
+TEXT = "text"
+JSON = "json"
+FORMATS = (TEXT, JSON)
+
+# What a tool returns: text, or structured content in JSON mode
+ToolResult = Union[str, CallToolResult]
+PREVIEW_CHARS = 200
+
+
+class OutputError(ValueError):
+    """Unknown output format or field name."""
+
+
+def output_format(value: str, default: str = TEXT) -> str:
+    """The format asked for, ``default`` when none was given."""
+    value = (value or default).strip().lower()
+    if value not in FORMATS:
+        raise OutputError(f"Unknown output format: {value}. Use one of: {', '.join(FORMATS)}.")
+    return value
+
+
+def _datetime(value: datetime.datetime) -> str:
+    # pywin32 tags local COM times with a tzinfo; report wall-clock values like the text output.
+    return value.replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+# Field names of each dataclass serialized so far
+_DATACLASS_FIELDS: Dict[type, Tuple[str, ...]] = {}
+
+
+def _dataclass_fields(kind: type) -> Tuple[str, ...]:
+    names = _DATACLASS_FIELDS.get(kind)
+    if names is None:
+        names = _DATACLASS_FIELDS[kind] = tuple(field.name for field in dataclasses.fields(kind))
+    return names
+
+
+def to_json(value: Any) -> Any:
+    """``value`` as plain JSON types."""
+    kind = type(value)
+    if value is None or kind is str or kind is int or kind is float or kind is bool:
+        return value
+    if kind is dict:
+        return {str(key): to_json(item) for key, item in value.items()}
+    if kind is list or kind is tuple:
+        return [to_json(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        return _datetime(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        record = {}
+        for name in _dataclass_fields(kind):
+            item = getattr(value, name)
+            if item is not None:
+                record[name] = to_json(item)
+        return record
+    if isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+def preview(body: str, length: int = PREVIEW_CHARS) -> str:
+    """The start of a body on one line."""
+    text = (body or "").strip()
+    return text.replace("\r\n", " ")[:length] + ("..." if len(text) > length else "")
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON text of ``value``."""
+    return json.dumps(to_json(value), ensure_ascii=False, separators=(",", ":"))
+
+
+def json_size(record: Any) -> int:
+    """UTF-8 size of ``record`` as JSON, for paging by bytes."""
+    return len(dumps(record).encode("utf-8"))
+
+
+def json_result(payload: Dict[str, Any]) -> CallToolResult:
+    """Tool result carrying ``payload`` as structured content and as compact text."""
+    data = to_json(payload)
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return CallToolResult(content=[TextContent(type="text", text=text)], structuredContent=data)
+
+
+def reply(output: str, text: str, payload: Optional[Dict[str, Any]] = None) -> ToolResult:
+    """``text`` in text mode; in JSON mode ``payload``, or ``text`` as an error when there is none."""
+    if output != JSON:
+        return text
+    return json_result(payload if payload is not None else {"error": text})
+
+
+class Projection:
+    """Turns records into dicts of the projected fields; see :meth:`Schema.project`."""
+
+    def __init__(self, getters: Sequence[Tuple[str, Callable[[Any], Any]]]):
+        self._getters = tuple(getters)
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(name for name, _ in self._getters)
+
+    def __contains__(self, name: str) -> bool:
+        return any(field == name for field, _ in self._getters)
+
+    def __call__(self, record: Any) -> Dict[str, Any]:
+        projected = {}
+        for name, getter in self._getters:
+            value = getter(record)
+            if value is not None:
+                projected[name] = to_json(value)
+        return projected
+
+    def all(self, records: Iterable[Any]) -> List[Dict[str, Any]]:
+        return [self(record) for record in records]
+
+
+class Schema:
+    """The fields of one kind of record, in output order, each read by a getter."""
+
+    def __init__(self, getters: Dict[str, Callable[[Any], Any]]):
+        self.getters = dict(getters)
+
+    @classmethod
+    def of(cls, record_type: type, *exclude: str, **extra: Callable[[Any], Any]) -> "Schema":
+        """Schema of a dataclass's fields (less ``exclude``), plus ``extra`` computed ones."""
+        getters: Dict[str, Callable[[Any], Any]] = {
+            name: attrgetter(name) for name in _dataclass_fields(record_type) if name not in exclude}
+        getters.update(extra)
+        return cls(getters)
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(self.getters)
+
+    def project(self, fields: Optional[Sequence[str]] = None) -> Projection:
+        """Projection onto ``fields`` (all fields when none are given)."""
+        names = [name.strip() for name in fields or () if name.strip()] or list(self.getters)
+        unknown = [name for name in names if name not in self.getters]
+        if unknown:
+            raise OutputError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(self.getters)}.")
+        return Projection([(name, self.getters[name]) for name in dict.fromkeys(names)])
+
+
+# -- record schemas --------------------------------------------------------------
+# Getters reading bodies cost a COM call per record; the rest come from table rows.
+
+APPOINTMENT_FIELDS = Schema({
+    "entry_id": attrgetter("entry_id"),
+    "subject": attrgetter("subject"),
+    "start": attrgetter("start"),
+    "end": attrgetter("end"),
+    "location": attrgetter("location"),
+    "categories": attrgetter("categories"),
+    "busy_status": attrgetter("busy_status"),
+    "body_preview": lambda item: preview(item.body),
+})
+
+# Mail rows of the Inbox table, mail index entries and folder search hits
+MAIL_FIELDS = Schema({
+    "entry_id": attrgetter("entry_id"),
+    "received_time": attrgetter("received_time"),
+    "subject": attrgetter("subject"),
+    "sender": attrgetter("sender"),
+    "to": lambda mail: getattr(mail, "to", None) or getattr(mail, "recipients", None),
+    "folder": lambda mail: getattr(mail, "folder", None),
+    "conversation_id": lambda mail: getattr(mail, "conversation_id", None) or None,
+    "attachment": lambda mail: getattr(mail, "attachment", None),
+    "body_preview": lambda mail: preview(mail.body),
+})
+
+THREAD_FIELDS = Schema({
+    "thread_id": attrgetter("thread_id"),
+    "count": attrgetter("count"),
+    "participants": attrgetter("participants"),
+    "latest_entry_id": lambda thread: thread.latest.entry_id,
+    "latest_subject": lambda thread: thread.latest.subject,
+    "latest_received": lambda thread: thread.latest.received_time,
+    "body_preview": lambda thread: preview(thread.latest.body),
+})
+
+MESSAGE_FIELDS = Schema.of(ConversationMessage)
+USER_FIELDS = Schema.of(UserInfo)
+SLOT_FIELDS = Schema.of(FreeSlot)
+TICKET_FIELDS = Schema.of(Ticket, "entry_id", "store_id")
+SNAPSHOT_APPOINTMENT_FIELDS = Schema.of(SnapshotAppointment)
+SNAPSHOT_MAIL_FIELDS = Schema.of(SnapshotMail)
+CHANGE_FIELDS = Schema.of(Change)
+
+BATCH_RESULT_FIELDS = Schema({
+    "number": lambda result: result.request.number,
+    "status": attrgetter("status"),
+    "subject": lambda result: result.request.subject,
+    "start": lambda result: result.request.start,
+    "end": lambda result: result.request.end,
+    "entry_id": attrgetter("entry_id"),
+    "error": lambda result: result.error or None,
+    "conflicts": attrgetter("conflicts"),
+})
@@ -0,0 +1,154 @@
+"""Batched column reads through ``Folder.GetTable``.
+
+Reading ``item.Subject``, ``item.Start``, ... on every item costs one
+cross-process COM call per property. A Table returns the requested columns
+for a whole batch of rows per ``GetArray`` call instead. ``Body`` cannot be a
+table column, so rows load it on demand, only when it is actually rendered.
+"""
+from typing import Any, Iterator, Optional, Protocol, Sequence, Tuple
+
+OL_USER_ITEMS = 0  # olUserItems
+DEFAULT_BATCH_SIZE = 250
+# Datetime literals in Jet ([Property] > '...') table and Restrict filters
+JET_DATE_FORMAT = "%m/%d/%Y %I:%M %p"
+
+
+class TableBackend(Protocol):
+    """Source of table rows; Outlook in production, fakes in tests."""
+
+    def rows(self, filter: Optional[str], columns: Sequence[str],
+             batch_size: int, sort: Optional[str] = None) -> Iterator[Sequence[Any]]:
+        """Yield one value sequence per row, in ``columns`` order (sorted by ``sort`` if given)."""
+        ...
+
+    def item(self, entry_id: str) -> Any:
+        """Return the full item for ``entry_id``."""
+        ...
+
+    def body(self, entry_id: str) -> str:
+        """Return the body text of the item ``entry_id``."""
+        ...
+
+
+def read_table(table, columns: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Sequence[Any]]:
+    """Rows of an Outlook ``Table`` with exactly ``columns``, ``batch_size`` per ``GetArray`` call."""
+    table_columns = table.Columns
+    table_columns.RemoveAll()
+    for column in columns:
+        table_columns.Add(column)
+    while not table.EndOfTable:
+        batch = table.GetArray(batch_size)
+        if not batch:
+            break
+        yield from batch
+
+
+class OutlookTableBackend:
+    """TableBackend reading a live Outlook folder."""
+
+    def __init__(self, folder, namespace):
+        self.folder = folder
+        self.namespace = namespace
+
+    def rows(self, filter: Optional[str], columns: Sequence[str],
+             batch_size: int = DEFAULT_BATCH_SIZE, sort: Optional[str] = None) -> Iterator[Sequence[Any]]:
+        table = self.folder.GetTable(filter or "", OL_USER_ITEMS)
+        if sort:
+            # Ascending; a stable order is what lets a scan resume after a key
+            table.Sort(sort, False)
+        yield from read_table(table, columns, batch_size)
+
+    def item(self, entry_id: str):
+        return self.namespace.GetItemFromID(entry_id, self.folder.StoreID)
+
+    def body(self, entry_id: str) -> str:
+        return self.item(entry_id).Body or ""
+
+
+class _ItemSource:
+    """Adapter letting a row built from a live item load its own body."""
+    __slots__ = ("_item",)
+
+    def __init__(self, item):
+        self._item = item
+
+    def item(self, entry_id: str):
+        return self._item
+
+    def body(self, entry_id: str) -> str:
+        return self._item.Body or ""
+
+
+class TableRow:
+    """Compact row record; subclasses list their table columns and slots."""
+    __slots__ = ("_source", "_body", "entry_id")
+    COLUMNS: Tuple[str, ...] = ("EntryID",)
+    FIELDS: Tuple[str, ...] = ("entry_id",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Slot names line up with COLUMNS, so values can be assigned by position.
+        cls.FIELDS = TableRow.FIELDS + tuple(cls.__slots__)
+
+    def __init__(self, source, values: Sequence[Any]):
+        self._source = source
+        self._body = None
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_item(cls, item) -> "TableRow":
+        """Build a row from a live item (for paths a Table cannot serve)."""
+        return cls(_ItemSource(item), [getattr(item, column) for column in cls.COLUMNS])
+
+    @property
+    def body(self) -> str:
+        if self._body is None:
+            self._body = self._source.body(self.entry_id)
+        return self._body
+
+    def item(self):
+        """Return the full Outlook item behind this row."""
+        return self._source.item(self.entry_id)
+
+
+class AppointmentRow(TableRow):
+    """Calendar row; ``row["start"]`` keeps the dict-style formatted view."""
+    __slots__ = ("subject", "start", "end", "location", "categories", "busy_status")
+    COLUMNS = ("EntryID", "Subject", "Start", "End", "Location", "Categories", "BusyStatus")
+
+    def __getitem__(self, key: str):
+        if key in ("start", "end"):
+            return getattr(self, key).strftime("%Y-%m-%d %H:%M")
+        if key in self.FIELDS or key == "body":
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class MailRow(TableRow):
+    """Mail listing row."""
+    __slots__ = ("subject", "received_time", "sender", "to", "message_class", "conversation_id")
+    COLUMNS = ("EntryID", "Subject", "ReceivedTime", "SenderName", "To", "MessageClass", "ConversationID")
+
+    @property
+    def is_mail(self) -> bool:
+        # Same items as Class == 43 (olMail)
+        return (self.message_class or "").startswith("IPM.Note")
+
+
+class TableReader:
+    """Reads typed rows from a TableBackend."""
+
+    def __init__(self, backend: TableBackend, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.backend = backend
+        self.batch_size = batch_size
+
+    def read(self, row_type, filter: Optional[str] = None, sort: Optional[str] = None) -> Iterator[TableRow]:
+        for values in self.backend.rows(filter, row_type.COLUMNS, self.batch_size, sort):
+            yield row_type(self.backend, values)
@@ -0,0 +1,167 @@
+"""Conversation threads over mail search results.
+
+Long reply chains make ``search_email`` return one near-identical hit per
+message, each with its own body read. :func:`collapse` groups the hits by
+``ConversationID`` into :class:`Thread` summaries instead: one entry per
+conversation with its message count and participants, where only the
+latest message's body is read for the preview.
+
+Every collapsed thread is remembered in a :class:`ThreadIndex`, so that
+``get_thread`` can reopen the conversation from its ID. :func:`read_conversation`
+then reads all of its messages, across folders, with one
+``GetConversation().GetTable()`` query instead of one COM call per
+message and property.
+"""
+import datetime
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .table_reader import DEFAULT_BATCH_SIZE, read_table
+
+DEFAULT_MAX_THREADS = 5000
+# Bytes of a ConversationIndex header, and of each reply level after it
+_INDEX_HEADER = 22
+_INDEX_LEVEL = 5
+
+CONVERSATION_COLUMNS = ("EntryID", "Subject", "ReceivedTime", "SenderName", "To", "ConversationIndex")
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    # pywin32 tags local COM times with a tzinfo; compare wall-clock values.
+    return value.replace(tzinfo=None)
+
+
+def thread_id(hit) -> str:
+    """Conversation a hit belongs to; mail of stores without conversations is a thread of its own."""
+    return getattr(hit, "conversation_id", "") or hit.entry_id
+
+
+@dataclass
+class Thread:
+    """Search hits of one conversation, oldest first."""
+    thread_id: str
+    messages: List[Any] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.messages)
+
+    @property
+    def latest(self):
+        return self.messages[-1]
+
+    @property
+    def key(self) -> Tuple[datetime.datetime, str]:
+        """Sort key: threads are ordered by their latest message."""
+        return _naive(self.latest.received_time), self.thread_id
+
+    @property
+    def participants(self) -> List[str]:
+        """Senders, most recent first."""
+        senders: Dict[str, None] = {}
+        for message in reversed(self.messages):
+            if message.sender:
+                senders.setdefault(message.sender)
+        return list(senders)
+
+
+def collapse(hits: Iterable[Any]) -> List[Thread]:
+    """Group ``hits`` (in received-time order) into threads ordered by their latest message."""
+    threads: Dict[str, Thread] = {}
+    for hit in hits:
+        key = thread_id(hit)
+        thread = threads.get(key)
+        if thread is None:
+            thread = threads[key] = Thread(key)
+        thread.messages.append(hit)
+    return sorted(threads.values(), key=lambda thread: thread.key)
+
+
+class ThreadIndex:
+    """Where to find the conversations seen in search results, by thread ID.
+
+    Keeps the EntryID and StoreID of each thread's latest message, for the
+    ``max_threads`` most recently seen threads.
+    """
+
+    def __init__(self, max_threads: int = DEFAULT_MAX_THREADS):
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._threads)
+
+    def add(self, thread: Thread):
+        latest = thread.latest
+        with self._lock:
+            self._threads[thread.thread_id] = (latest.entry_id, getattr(latest, "store_id", "") or "")
+            self._threads.move_to_end(thread.thread_id)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def locate(self, thread_id: str) -> Optional[Tuple[str, str]]:
+        """(EntryID, StoreID) of a message of the thread, or None if it has not been seen."""
+        with self._lock:
+            return self._threads.get(thread_id)
+
+
+def conversation_depth(index: Any) -> int:
+    """Reply depth encoded in a ConversationIndex (hex text or bytes)."""
+    if isinstance(index, (bytes, bytearray)):
+        size = len(index)
+    else:
+        size = len(index or "") // 2
+    return max(0, (size - _INDEX_HEADER) // _INDEX_LEVEL)
+
+
+@dataclass
+class ConversationMessage:
+    entry_id: str
+    subject: str
+    received_time: Optional[datetime.datetime]
+    sender: str
+    to: str
+    depth: int
+
+
+@dataclass
+class Conversation:
+    """All messages of a conversation in reply-tree order, plus the item it was opened from."""
+    item: Any
+    messages: List[ConversationMessage]
+
+    @property
+    def latest(self) -> ConversationMessage:
+        dated = [message for message in self.messages if message.received_time is not None]
+        return max(dated, key=lambda message: _naive(message.received_time)) if dated else self.messages[-1]
+
+
+def _order(index: Any) -> str:
+    return index.hex().upper() if isinstance(index, (bytes, bytearray)) else (index or "")
+
+
+def open_item(namespace, entry_id: str, store_id: str = ""):
+    """The item ``entry_id``; mail found through a folder table carries no StoreID."""
+    return namespace.GetItemFromID(entry_id, store_id) if store_id else namespace.GetItemFromID(entry_id)
+
+
+def read_conversation(namespace, entry_id: str, store_id: str = "",
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> Conversation:
+    """The conversation of the mail ``entry_id``, read as one table."""
+    item = open_item(namespace, entry_id, store_id)
+    conversation = item.GetConversation()
+    if conversation is None:
+        # Stores without conversation support (e.g. some PSTs and IMAP accounts)
+        rows = [[getattr(item, column, None) for column in CONVERSATION_COLUMNS]]
+    else:
+        rows = list(read_table(conversation.GetTable(), CONVERSATION_COLUMNS, batch_size))
+    # ConversationIndex values sort into reply-tree order, each reply after its parent
+    rows.sort(key=lambda values: _order(values[5]))
+    messages = [ConversationMessage(entry_id, subject or "", received, sender or "", to or "",
+                                    conversation_depth(index))
+                for entry_id, subject, received, sender, to, index in rows]
+    return Conversation(item, messages)
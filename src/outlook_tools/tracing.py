@@ -0,0 +1,246 @@
+"""Per-tool latency histograms and optional COM call tracing.
+
+Every MCP tool is timed into a log-bucketed histogram; that costs two clock
+reads per call and is always on. When COM tracing is enabled,
+:func:`traced` wraps Outlook objects in a :class:`ComProxy` that counts and
+times each property get, method call and enumeration step, and the spans
+can be dumped as a Chrome trace (``chrome://tracing`` / Perfetto). When it
+is disabled, :func:`traced` returns the object itself, so nothing is added
+to the COM path.
+"""
+import bisect
+import collections
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import types
+from typing import Any, Callable, Deque, Dict, List
+
+# Upper bounds (ms) of the latency histogram buckets; the last is open-ended
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+DEFAULT_MAX_TRACE_EVENTS = 100_000
+
+_PLAIN = (str, bytes, int, float, bool, type(None), datetime.datetime, datetime.date,
+          tuple, list, dict)
+_METHODS = (types.MethodType, types.FunctionType, types.BuiltinFunctionType, types.BuiltinMethodType)
+
+
+class LatencyHistogram:
+    """Counts of durations per bucket plus exact count, total and max."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float, error: bool = False):
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.errors += error
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction (max for the last)."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                return float(HISTOGRAM_BOUNDS_MS[index]) if index < len(HISTOGRAM_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": {label: count for label, count in zip(labels, self.buckets) if count},
+        }
+
+
+class Tracer:
+    """Collects tool timings and, when ``com_enabled``, COM operation stats."""
+
+    def __init__(self, com_enabled: bool = False, max_events: int = DEFAULT_MAX_TRACE_EVENTS,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.com_enabled = com_enabled
+        self.clock = clock
+        self._origin = clock()
+        self._lock = threading.Lock()
+        self.tools: Dict[str, LatencyHistogram] = collections.defaultdict(LatencyHistogram)
+        # "get Body" -> [count, total seconds]
+        self.com: Dict[str, List[float]] = collections.defaultdict(lambda: [0, 0.0])
+        self.events: Deque[dict] = collections.deque(maxlen=max_events)
+
+    def reset(self):
+        with self._lock:
+            self.tools.clear()
+            self.com.clear()
+            self.events.clear()
+
+    def _event(self, name: str, category: str, started: float, elapsed: float):
+        self.events.append({
+            "name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": round((started - self._origin) * 1e6, 1), "dur": round(elapsed * 1e6, 1),
+        })
+
+    def record_com(self, operation: str, started: float, elapsed: float):
+        with self._lock:
+            entry = self.com[operation]
+            entry[0] += 1
+            entry[1] += elapsed
+            self._event(operation, "com", started, elapsed)
+
+    def record_tool(self, name: str, started: float, elapsed: float, error: bool = False):
+        with self._lock:
+            self.tools[name].add(elapsed * 1000, error)
+            self._event(name, "tool", started, elapsed)
+
+    def timed(self, fn: Callable) -> Callable:
+        """Decorator timing an ``async`` tool into its histogram."""
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = self.clock()
+            error = True
+            try:
+                result = await fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                self.record_tool(fn.__name__, started, self.clock() - started, error)
+        return wrapper
+
+    def stats(self, top: int = 30) -> Dict[str, Any]:
+        with self._lock:
+            tools = {name: histogram.summary() for name, histogram in sorted(self.tools.items())}
+            operations = sorted(self.com.items(), key=lambda item: item[1][1], reverse=True)
+            totals: Dict[str, int] = collections.Counter()
+            for operation, (count, _) in operations:
+                totals[operation.split(" ", 1)[0]] += count
+            return {
+                "tools": tools,
+                "com": {
+                    "enabled": self.com_enabled,
+                    "totals": dict(totals),
+                    "operations": [
+                        {"operation": operation, "count": count, "total_ms": round(total * 1000, 3),
+                         "mean_us": round(total / count * 1e6, 1)}
+                        for operation, (count, total) in operations[:top]
+                    ],
+                },
+                "trace_events": len(self.events),
+            }
+
+    def dump_trace(self, path: str) -> str:
+        """Write the recorded spans as a Chrome trace file."""
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+tracer = Tracer(com_enabled=os.environ.get("OUTLOOK_TRACE") == "1")
+
+
+class ComProxy:
+    """Times every attribute get, method call and iteration step of a COM object."""
+    __slots__ = ("_obj", "_name", "_tracer")
+
+    def __init__(self, obj: Any, name: str, tracer: Tracer):
+        object.__setattr__(self, "_obj", obj)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_tracer", tracer)
+
+    def _wrap(self, value: Any, name: str) -> Any:
+        if isinstance(value, _PLAIN) or isinstance(value, ComProxy):
+            return value
+        return ComProxy(value, name, self._tracer)
+
+    def __getattr__(self, name: str) -> Any:
+        tracer = self._tracer
+        started = tracer.clock()
+        value = getattr(self._obj, name)
+        if isinstance(value, _METHODS):
+            return _TracedMethod(self, value, name)
+        tracer.record_com(f"get {name}", started, tracer.clock() - started)
+        return self._wrap(value, name)
+
+    def __setattr__(self, name: str, value: Any):
+        tracer = self._tracer
+        started = tracer.clock()
+        setattr(self._obj, name, untraced(value))
+        tracer.record_com(f"set {name}", started, tracer.clock() - started)
+
+    def __iter__(self):
+        tracer = self._tracer
+        operation = f"iter {self._name}"
+        iterator = iter(self._obj)
+        while True:
+            started = tracer.clock()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            tracer.record_com(operation, started, tracer.clock() - started)
+            yield self._wrap(value, self._name)
+
+    def __len__(self) -> int:
+        return len(self._obj)
+
+    def __bool__(self) -> bool:
+        return bool(self._obj)
+
+    def __getitem__(self, key):
+        return self._wrap(self._obj[key], self._name)
+
+    def __call__(self, *args, **kwargs):
+        return _TracedMethod(self, self._obj, self._name)(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<traced {self._obj!r}>"
+
+
+class _TracedMethod:
+    __slots__ = ("_owner", "_method", "_name")
+
+    def __init__(self, owner: ComProxy, method: Callable, name: str):
+        self._owner = owner
+        self._method = method
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        tracer = self._owner._tracer
+        args = tuple(untraced(arg) for arg in args)
+        kwargs = {key: untraced(value) for key, value in kwargs.items()}
+        started = tracer.clock()
+        try:
+            result = self._method(*args, **kwargs)
+        finally:
+            tracer.record_com(f"call {self._name}", started, tracer.clock() - started)
+        return self._owner._wrap(result, self._name)
+
+
+def traced(obj: Any, name: str = "Application", tracer: Tracer = tracer) -> Any:
+    """``obj`` wrapped in a :class:`ComProxy` when COM tracing is on, else ``obj``."""
+    if not tracer.com_enabled or obj is None:
+        return obj
+    return ComProxy(obj, name, tracer)
+
+
+def untraced(obj: Any) -> Any:
+    """The real COM object behind a proxy (for DispatchWithEvents and COM arguments)."""
+    return object.__getattribute__(obj, "_obj") if isinstance(obj, ComProxy) else obj
@@ -0,0 +1,193 @@
+"""Benchmarks of the Outlook services and MCP tools on the fake object model.
+
+Run directly for a report::
+
+    python test/bench_outlook.py --mails 50000 --appointments 20000 --latency 0.00005
+
+Every scenario reports latency percentiles and the COM calls and property
+reads it made per run. ``test_benchmarks.py`` runs the same scenarios at a
+small size and gates the COM counts.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from fake_outlook import ComStats, add_archives, installed, make_outlook  # noqa: E402
+
+CALENDAR_WEEK = (datetime.datetime(2025, 1, 13), datetime.datetime(2025, 1, 20))
+SEARCH_DATE = datetime.date(2025, 1, 2)
+SEARCH_KEYWORD = "会議"
+CONTACT_NAME = "山田 太郎"
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+@dataclass
+class BenchResult:
+    name: str
+    runs: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    mean_ms: float
+    com_calls: float
+    com_reads: float
+    samples: List[float] = field(repr=False, default_factory=list)
+
+    def row(self) -> str:
+        return (f"{self.name:<32} {self.runs:>5} {self.p50_ms:>9.2f} {self.p90_ms:>9.2f} "
+                f"{self.p99_ms:>9.2f} {self.com_calls:>9.1f} {self.com_reads:>10.1f}")
+
+
+def measure(name: str, fn: Callable[[], object], stats: ComStats, runs: int = 20,
+            setup: Optional[Callable[[], None]] = None) -> BenchResult:
+    """Time ``fn`` ``runs`` times; COM counts are averaged per run."""
+    samples, calls, reads = [], 0, 0
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        stats.reset()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+        calls += stats.calls
+        reads += stats.reads
+    return BenchResult(name, runs,
+                       percentile(samples, 0.5) * 1000, percentile(samples, 0.9) * 1000,
+                       percentile(samples, 0.99) * 1000, sum(samples) / runs * 1000,
+                       calls / runs, reads / runs, samples)
+
+
+def service_benchmarks(application, runs: int) -> List[BenchResult]:
+    from outlook_tools.calendar_service import OutlookCalendarService
+    from outlook_tools.search_service import OutlookSearchService
+
+    stats = application.stats
+    calendar = OutlookCalendarService()
+    search = OutlookSearchService()
+    added = iter(range(10 ** 9))
+
+    def add_appointment():
+        start = datetime.datetime(2025, 3, 3, 9) + datetime.timedelta(minutes=30 * next(added))
+        return calendar.add_appointment("ベンチマーク", start, start + datetime.timedelta(minutes=30))
+
+    results = [
+        measure("get_calendar_items (cold)", lambda: calendar.get_calendar_items(*CALENDAR_WEEK),
+                stats, runs, setup=calendar.cache.clear),
+        measure("get_calendar_items (cached)", lambda: calendar.get_calendar_items(*CALENDAR_WEEK),
+                stats, runs),
+        measure("search_emails", lambda: search.search_emails(SEARCH_DATE, SEARCH_KEYWORD), stats, runs),
+        measure("search_emails (limit 20)", lambda: search.search_emails(SEARCH_DATE, SEARCH_KEYWORD, limit=20),
+                stats, runs),
+        measure("search_user (cold)", lambda: search.search_user(CONTACT_NAME), stats, runs,
+                setup=search.contact_cache.invalidate),
+        measure("search_user (cached)", lambda: search.search_user(CONTACT_NAME), stats, runs),
+        measure("add_appointment", add_appointment, stats, runs),
+    ]
+    search.cleanup()
+    return results
+
+
+def scope_benchmarks(application, runs: int, workers=(1, 4)) -> List[BenchResult]:
+    """A search over every store, scanned by worker pools of different sizes."""
+    from outlook_tools.com_executor import ComExecutor
+    from outlook_tools.mail_query import MailQuery
+    from outlook_tools.mail_search import FolderSearch, SearchScope, resolve_scope
+
+    namespace = application.namespace
+    query = MailQuery.for_date(SEARCH_DATE, SEARCH_KEYWORD)
+    refs = resolve_scope(namespace, SearchScope(all_stores=True))
+    results = []
+    for count in workers:
+        executor = ComExecutor(workers=count)
+        search = FolderSearch(executor, lambda: namespace)
+        try:
+            # One page of 20 plus the match showing that more exist
+            results.append(measure(f"search all stores (workers={count})",
+                                   lambda: list(search.search(refs, query, 21)), application.stats, runs))
+        finally:
+            executor.shutdown()
+    return results
+
+
+def tool_benchmarks(application, runs: int) -> List[BenchResult]:
+    """End-to-end MCP tool coroutines, including the hop to the COM thread."""
+    import outlook_tools.server as server
+
+    stats = application.stats
+    added = iter(range(10 ** 9))
+
+    def add_appointment():
+        start = datetime.datetime(2025, 4, 7, 0) + datetime.timedelta(minutes=30 * next(added))
+        end = start + datetime.timedelta(minutes=30)
+        return asyncio.run(server.add_appointment("ベンチマーク", f"{start:%Y-%m-%d %H:%M}", f"{end:%Y-%m-%d %H:%M}"))
+
+    try:
+        return [
+            measure("tool get_calendar", lambda: asyncio.run(server.get_calendar("2025-01-13", "2025-01-19")),
+                    stats, runs),
+            measure("tool search_email", lambda: asyncio.run(
+                server.search_email(f"{SEARCH_DATE:%Y-%m-%d}", SEARCH_KEYWORD)), stats, runs),
+            measure("tool search_contact (cold)", lambda: asyncio.run(server.search_contact(CONTACT_NAME)),
+                    stats, runs, setup=server.contact_cache.invalidate),
+            measure("tool add_appointment", add_appointment, stats, runs),
+        ]
+    finally:
+        # The server module owns a COM thread bound to this fake; start afresh next time
+        server.com.shutdown()
+        sys.modules.pop("outlook_tools.server", None)
+
+
+def run_benchmarks(mails: int = 10000, appointments: int = 5000, users: int = 500, latency: float = 0.0,
+                   runs: int = 20, seed: int = 0, tools: bool = True, archives: int = 2) -> List[BenchResult]:
+    application = make_outlook(mails, appointments, users, seed, stats=ComStats(latency))
+    # Archive stores of 8 folders, each a tenth of the Inbox's size
+    add_archives(application.namespace, archives, 8, mails // 10, seed)
+    with installed(application):
+        results = service_benchmarks(application, runs)
+        if archives:
+            results.extend(scope_benchmarks(application, runs))
+        if tools:
+            results.extend(tool_benchmarks(application, runs))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mails", type=int, default=10000)
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every COM read/call")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--archives", type=int, default=2, help="archive stores searched by the scope scenarios")
+    parser.add_argument("--no-tools", action="store_true", help="skip the MCP tool wrappers")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results = run_benchmarks(args.mails, args.appointments, args.users, args.latency,
+                             args.runs, args.seed, not args.no_tools, args.archives)
+    print(f"{'scenario':<32} {'runs':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'calls':>9} {'reads':>10}")
+    for result in results:
+        print(result.row())
+    print(f"total {time.perf_counter() - started:.1f}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in asdict(r).items() if k != "samples"} for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1122 @@
+"""In-process stand-ins for the Outlook object model.
+
+The fakes evaluate the same ``Restrict`` filter strings Outlook would (the
+DASL ``@SQL=`` subset and Jet ``[Property]`` syntax this project generates)
+and count every property read, so tests can check both the generated filters
+and how many items a code path actually touched.
+
+:class:`FakeApplication` ties folders, a directory of Exchange users and
+scratch items together, and :func:`installed` puts it behind stand-in
+``win32com.client`` / ``pythoncom`` modules so the real services run against
+it. ``ComStats`` can add per-property latency to model a live Outlook.
+"""
+import bisect
+import collections
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+import types
+
+DASL_PROPERTIES = {
+    "urn:schemas:httpmail:datereceived": "ReceivedTime",
+    "urn:schemas:httpmail:subject": "Subject",
+    "urn:schemas:httpmail:textdescription": "Body",
+    "urn:schemas:httpmail:hasattachment": "HasAttachment",
+}
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<prop>"[^"]*"|\[[^\]]*\])
+      | (?P<str>'(?:[^']|'')*')
+      | (?P<op>>=|<=|<>|=|<|>)
+      | (?P<paren>[()])
+      | (?P<word>[A-Za-z_]+)
+      | (?P<num>-?\d+)
+    )""", re.VERBOSE)
+
+_DATE_FORMATS = ("%m/%d/%Y %I:%M %p", "%m/%d/%Y %H:%M", "%Y-%m-%d %H:%M")
+
+
+class ComStats:
+    """Counts property reads and method calls on fake COM objects.
+
+    Every counted read or call waits ``latency`` seconds, or the entry for
+    its name in ``property_latency``, to model cross-process COM round trips.
+    """
+
+    def __init__(self, latency=0.0, property_latency=None):
+        self.reads = 0
+        self.calls = 0
+        # Search workers share one fake model across threads
+        self._lock = threading.Lock()
+        self.touched = set()
+        # Reads per property name, e.g. ``read_counts["Body"]``
+        self.read_counts = collections.Counter()
+        self.latency = latency
+        self.property_latency = dict(property_latency or {})
+
+    def _wait(self, name):
+        delay = self.property_latency.get(name, self.latency)
+        if delay:
+            time.sleep(delay)
+
+    def record(self, obj, name=None):
+        with self._lock:
+            self.reads += 1
+            self.touched.add(id(obj))
+            if name is not None:
+                self.read_counts[name] += 1
+        self._wait(name)
+
+    def call(self, name=None):
+        with self._lock:
+            self.calls += 1
+        self._wait(name)
+
+    def reset(self):
+        self.reads = 0
+        self.calls = 0
+        self.touched.clear()
+        self.read_counts.clear()
+
+
+class Clock:
+    """Manual monotonic clock for code taking a ``clock`` callable; set :attr:`now`."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeComObject:
+    """Attribute bag that records every read of a capitalised property."""
+
+    def __init__(self, stats=None, **props):
+        object.__setattr__(self, "_stats", stats or ComStats())
+        object.__setattr__(self, "_props", dict(props))
+
+    def __getattr__(self, name):
+        props = object.__getattribute__(self, "_props")
+        if name in props:
+            object.__getattribute__(self, "_stats").record(self, name)
+            return props[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        object.__getattribute__(self, "_props")[name] = value
+
+    def peek(self, name, default=None):
+        """Read a property without counting it (for use by the fakes)."""
+        return object.__getattribute__(self, "_props").get(name, default)
+
+
+class FakeExchangeUser(FakeComObject):
+    def __init__(self, name, email, department="", job_title="", company="", phone="",
+                 location="", manager="", stats=None):
+        super().__init__(stats, Name=name, PrimarySmtpAddress=email, Department=department,
+                         JobTitle=job_title, CompanyName=company, BusinessTelephoneNumber=phone,
+                         OfficeLocation=location, Manager=manager, Alias=email.split("@")[0])
+
+
+class FakeAddressEntry(FakeComObject):
+    def __init__(self, user, stats=None):
+        super().__init__(stats, Name=user.peek("Name"), Address=user.peek("PrimarySmtpAddress"),
+                         AddressEntryUserType=0)
+        object.__setattr__(self, "_user", user)
+
+    def GetExchangeUser(self):
+        self._stats.call("GetExchangeUser")
+        return self._user
+
+
+class FakeRecipient(FakeComObject):
+    """Recipient that resolves against a :class:`FakeDirectory`."""
+
+    def __init__(self, address, stats=None, directory=None, parent=None):
+        super().__init__(stats, Address=address, Name=address, Resolved=directory is None)
+        object.__setattr__(self, "_directory", directory)
+        object.__setattr__(self, "_parent", parent)
+
+    def Resolve(self):
+        self._stats.call("Resolve")
+        user = self._directory.resolve(self.peek("Name")) if self._directory is not None else None
+        if user is not None:
+            self._props.update(Resolved=True, Name=user.peek("Name"),
+                               Address=user.peek("PrimarySmtpAddress"),
+                               AddressEntry=FakeAddressEntry(user, self._stats))
+        return user is not None
+
+    def Delete(self):
+        self._stats.call("Delete")
+        if self._parent is not None:
+            self._parent.remove(self)
+
+    def FreeBusy(self, start, minutes, complete_format=False):
+        self._stats.call("FreeBusy")
+        return self._directory.free_busy(self.peek("Address"), start, minutes)
+
+
+class FakeRecipients(list):
+    """``Recipients`` collection of a mail or meeting item."""
+
+    def __init__(self, addresses=(), stats=None, directory=None):
+        self.stats = stats or ComStats()
+        self.directory = directory
+        super().__init__(FakeRecipient(address, self.stats) for address in addresses)
+
+    @property
+    def Count(self):
+        return len(self)
+
+    def Item(self, index):
+        return self[index - 1]
+
+    def Add(self, name):
+        self.stats.call("Add")
+        recipient = FakeRecipient(name, self.stats, self.directory, self)
+        self.append(recipient)
+        return recipient
+
+    def ResolveAll(self):
+        self.stats.call("ResolveAll")
+        return all([recipient.Resolve() for recipient in self if not recipient.peek("Resolved")])
+
+
+class FakeOutlookItem(FakeComObject):
+    """Mail or appointment item; ``Save`` files it into the folder it was added to."""
+
+    def _folder(self):
+        return self.__dict__.get("_folder_ref")
+
+    def Save(self):
+        self._stats.call("Save")
+        folder = self._folder()
+        if folder is not None:
+            if folder.contains(self):
+                folder.change(self)
+            else:
+                folder.add(self)
+
+    def Send(self):
+        self._stats.call("Send")
+        self._props["Sent"] = True
+
+    def Display(self, modal=False):
+        self._stats.call("Display")
+
+    def Close(self, save_mode=0):
+        self._stats.call("Close")
+
+    def Delete(self):
+        self._stats.call("Delete")
+        folder = self._folder()
+        if folder is not None and folder.contains(self):
+            folder.remove(self)
+
+    @property
+    def Recipients(self):
+        self._stats.record(self, "Recipients")
+        recipients = self._props.get("Recipients")
+        if recipients is None:
+            recipients = FakeRecipients(self.__dict__.get("_addresses", ()), self._stats,
+                                        self.__dict__.get("_directory"))
+            self._props["Recipients"] = recipients
+        return recipients
+
+
+class FakeAttachment(FakeComObject):
+    """Attached file (olByValue unless ``type`` says otherwise) whose content is ``data``."""
+
+    def __init__(self, file_name, data, stats=None, type=1):
+        super().__init__(stats, FileName=file_name, DisplayName=file_name, Size=len(data), Type=type)
+        object.__setattr__(self, "_data", data)
+
+    def SaveAsFile(self, path):
+        self._stats.call("SaveAsFile")
+        with open(path, "wb") as f:
+            f.write(self._data)
+
+
+class FakeAttachments(FakeComObject):
+    def __init__(self, attachments, stats=None):
+        super().__init__(stats, Count=len(attachments))
+        object.__setattr__(self, "_attachments", list(attachments))
+
+    def Item(self, index):
+        self._stats.call("Item")
+        return self._attachments[index - 1]
+
+    def __iter__(self):
+        return iter(self._attachments)
+
+
+class FakeMailItem(FakeOutlookItem):
+    """Mail item; each starts a conversation of its own unless given a ConversationID.
+
+    ``attachments`` are (file name, bytes) pairs.
+    """
+
+    def __init__(self, subject, body, received_time, sender="sender@example.com",
+                 recipients=(), entry_id=None, stats=None, attachments=(), **extra):
+        entry_id = entry_id or f"mail-{id(self):x}"
+        attachments = [FakeAttachment(name, data, stats) for name, data in attachments]
+        super().__init__(
+            stats,
+            Class=43,
+            Subject=subject,
+            Body=body,
+            ReceivedTime=received_time,
+            Sender=sender,
+            SenderName=sender,
+            To="; ".join(recipients),
+            EntryID=entry_id,
+            Attachments=FakeAttachments(attachments, stats),
+            HasAttachment=bool(attachments),
+            **{"LastModificationTime": received_time, "ConversationID": f"conv-{entry_id}",
+               "ConversationIndex": conversation_index(entry_id), "ConversationTopic": subject, **extra},
+        )
+        # Recipient objects are only built when Recipients is read
+        object.__setattr__(self, "_addresses", tuple(recipients))
+
+    def GetConversation(self):
+        self._stats.call("GetConversation")
+        folder = self._folder()
+        if folder is None:
+            return None
+        root = folder
+        while root.Parent is not None:
+            root = root.Parent
+        return FakeConversation(root, self.peek("ConversationID"), self._stats)
+
+    def Send(self):
+        super().Send()
+        # A sent mail leaves the Drafts folder
+        folder = self._folder()
+        if folder is not None and folder.contains(self):
+            folder.remove(self)
+
+
+def conversation_index(seed, depth=0):
+    """Hex ConversationIndex: a 22-byte header plus 5 bytes per reply level."""
+    header = hashlib.md5(str(seed).encode("utf-8")).hexdigest().upper()[:16].ljust(44, "0")
+    return header + "".join(format(level + 1, "010X") for level in range(depth))
+
+
+def make_thread(topic, count, start, senders=("a@example.com", "b@example.com"), seed="thread", stats=None,
+                interval=datetime.timedelta(hours=1)):
+    """``count`` mails of one conversation, each replying to the one before."""
+    items = []
+    for n in range(count):
+        items.append(FakeMailItem(topic if n == 0 else f"RE: {topic}", f"{topic} のメール {n}", start + interval * n,
+                                  sender=senders[n % len(senders)], entry_id=f"{seed}-{n:03d}", stats=stats,
+                                  ConversationID=f"conv-{seed}", ConversationTopic=topic,
+                                  ConversationIndex=conversation_index(seed, n)))
+    return items
+
+
+class FakeAppointmentItem(FakeOutlookItem):
+    def __init__(self, subject, start, end, location="", body="", categories="",
+                 busy_status=2, entry_id=None, occurrences=(), stats=None, **extra):
+        super().__init__(
+            stats,
+            Class=26,
+            Subject=subject,
+            Start=start,
+            End=end,
+            Location=location,
+            Body=body,
+            Categories=categories,
+            BusyStatus=busy_status,
+            IsRecurring=extra.pop("IsRecurring", bool(occurrences)),
+            EntryID=entry_id or f"appt-{id(self):x}",
+            **extra,
+        )
+        # Expanded instances returned when Items.IncludeRecurrences is set.
+        object.__setattr__(self, "_occurrences", [
+            FakeAppointmentItem(subject, s, e, location, body, categories, busy_status,
+                                entry_id=self.peek("EntryID"), stats=stats, IsRecurring=True)
+            for s, e in occurrences
+        ])
+
+    @property
+    def occurrences(self):
+        return object.__getattribute__(self, "_occurrences")
+
+    def GetRecurrencePattern(self):
+        self._stats.call("GetRecurrencePattern")
+        starts = [o.peek("Start") for o in self.occurrences] or [self.peek("Start")]
+        return FakeComObject(self._stats, PatternStartDate=min(starts).replace(hour=0, minute=0),
+                             PatternEndDate=max(starts).replace(hour=0, minute=0), NoEndDate=False)
+
+
+_JA_SUBJECTS = ["週次定例", "議事録", "見積書の件", "出張申請", "採用面接の日程調整", "障害報告",
+                "リリース判定会議", "予算レビュー", "ご確認のお願い", "打ち合わせのお礼"]
+_JA_PHRASES = ["お疲れ様です。", "よろしくお願いいたします。", "添付の資料をご確認ください。",
+               "東京本社の会議室を予約しました。", "来週の進捗報告について共有します。",
+               "大阪支店との調整が完了しました。", "顧客からの問い合わせに回答済みです。",
+               "Please review the attached budget.", "Action items are listed below."]
+_SENDERS = ["山田 太郎", "佐藤 花子", "鈴木 一郎", "高橋 美咲", "Alice Smith", "Bob Jones"]
+
+
+def make_mailbox(count, seed=0, start=datetime.datetime(2025, 1, 1, 8, 0), stats=None):
+    """Generate ``count`` mail items with Japanese subjects and bodies.
+
+    Items arrive every 7 minutes from ``start``; the output is deterministic
+    for a given ``seed``.
+    """
+    rng = random.Random(seed)
+    items = []
+    for n in range(count):
+        received = start + datetime.timedelta(minutes=7 * n)
+        subject = f"{rng.choice(_JA_SUBJECTS)} #{n}"
+        body = "\r\n".join(rng.choice(_JA_PHRASES) for _ in range(rng.randint(2, 6)))
+        sender = rng.choice(_SENDERS)
+        recipients = rng.sample(["team@example.com", "boss@example.com", "hr@example.com"], 2)
+        items.append(FakeMailItem(subject, body, received, sender=sender, recipients=recipients,
+                                  entry_id=f"mail-{seed}-{n:07d}", stats=stats))
+    return items
+
+
+def _parse_literal(raw):
+    text = raw[1:-1].replace("''", "'")
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return text
+
+
+class _FilterParser:
+    """Recursive-descent parser for the Restrict filter subset we generate."""
+
+    def __init__(self, text):
+        self.dasl = text.startswith("@SQL=")
+        if self.dasl:
+            text = text[len("@SQL="):]
+        self.tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if not match or match.end() == pos:
+                raise ValueError(f"Cannot parse filter near: {text[pos:]!r}")
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind)))
+            pos = match.end()
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _take(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self._or()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Trailing tokens in filter: {self.tokens[self.pos:]}")
+        return node
+
+    def _or(self):
+        node = self._and()
+        while self._peek()[1] and self._peek()[1].upper() == "OR":
+            self._take()
+            left, right = node, self._and()
+            node = lambda item, l=left, r=right: l(item) or r(item)
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self._peek()[1] and self._peek()[1].upper() == "AND":
+            self._take()
+            left, right = node, self._not()
+            node = lambda item, l=left, r=right: l(item) and r(item)
+        return node
+
+    def _not(self):
+        if self._peek()[1] and self._peek()[1].upper() == "NOT":
+            self._take()
+            inner = self._not()
+            return lambda item: not inner(item)
+        if self._peek() == ("paren", "("):
+            self._take()
+            node = self._or()
+            if self._take() != ("paren", ")"):
+                raise ValueError("Unbalanced parentheses in filter")
+            return node
+        return self._comparison()
+
+    def _comparison(self):
+        kind, prop = self._take()
+        if kind != "prop":
+            raise ValueError(f"Expected property, got {prop!r}")
+        name = prop[1:-1]
+        dasl = prop.startswith('"')
+        attr = DASL_PROPERTIES.get(name, name) if dasl else name
+        op_kind, op = self._take()
+        if op_kind == "word":
+            op = op.lower()
+        kind, raw = self._take()
+        if kind == "str":
+            value = _parse_literal(raw)
+        elif kind == "num":
+            value = int(raw)
+        elif kind == "word" and raw.lower() in ("true", "false"):
+            value = raw.lower() == "true"
+        else:
+            raise ValueError(f"Expected literal, got {raw!r}")
+        return _compare(attr, op, value, utc=dasl)
+
+
+def _compare(attr, op, value, utc):
+    if op == "like":
+        pattern = re.compile(
+            "^" + ".*".join(re.escape(part) for part in value.split("%")) + "$",
+            re.IGNORECASE | re.DOTALL)
+        return lambda item: bool(pattern.match(str(item.peek(attr) or "")))
+
+    def read(item):
+        current = item.peek(attr)
+        if isinstance(current, datetime.datetime):
+            current = current.replace(tzinfo=None)
+            if utc:
+                current = current.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        elif isinstance(current, str) and isinstance(value, str):
+            current = current.lower()
+        return current
+
+    expected = value.lower() if isinstance(value, str) else value
+    ops = {
+        "=": lambda a: a == expected, "<>": lambda a: a != expected,
+        "<": lambda a: a < expected, "<=": lambda a: a <= expected,
+        ">": lambda a: a > expected, ">=": lambda a: a >= expected,
+    }
+    check = ops[op]
+    return lambda item: read(item) is not None and check(read(item))
+
+
+def compile_filter(text):
+    """Compile a Restrict filter string into a predicate over fake items."""
+    return _FilterParser(text).parse()
+
+
+class FakeItems:
+    """Minimal ``Items`` collection supporting Restrict, Sort and iteration."""
+
+    def __init__(self, items=(), stats=None, folder=None):
+        self._items = list(items)
+        self.stats = stats or ComStats()
+        self.filters = []
+        self.IncludeRecurrences = False
+        # Folder receiving Add()ed items and events of DispatchWithEvents sinks
+        self.folder = folder
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def Count(self):
+        return len(self._items)
+
+    def _expanded(self):
+        for item in self._items:
+            if self.IncludeRecurrences and getattr(item, "occurrences", None):
+                yield from item.occurrences
+            else:
+                yield item
+
+    def Restrict(self, filter_text):
+        self.stats.call("Restrict")
+        self.filters.append(filter_text)
+        predicate = compile_filter(filter_text)
+        restricted = FakeItems([item for item in self._expanded() if predicate(item)], self.stats)
+        restricted.filters = self.filters
+        return restricted
+
+    def Add(self, *args):
+        self.stats.call("Add")
+        item = FakeAppointmentItem("", None, None, stats=self.stats)
+        if self.folder is not None:
+            # Filed into the folder (and ItemAdd raised) on the first Save()
+            object.__setattr__(item, "_folder_ref", self.folder)
+        else:
+            self._items.append(item)
+        return item
+
+    def Sort(self, key, descending=False):
+        attr = key.strip("[]")
+        self._items.sort(key=lambda item: item.peek(attr), reverse=descending)
+
+
+class FakeColumns:
+    def __init__(self):
+        self.names = []
+
+    def RemoveAll(self):
+        self.names = []
+
+    def Add(self, name):
+        self.names.append(name)
+
+
+class FakeTable:
+    """``Table`` returned by ``Folder.GetTable``; one call per GetArray batch."""
+
+    def __init__(self, rows, stats):
+        self._rows = rows
+        self._pos = 0
+        self.stats = stats
+        self.Columns = FakeColumns()
+
+    def Sort(self, key, descending=False):
+        self._rows = sorted(self._rows, key=lambda item: item.peek(key.strip("[]")), reverse=descending)
+
+    @property
+    def EndOfTable(self):
+        return self._pos >= len(self._rows)
+
+    def GetArray(self, max_rows):
+        self.stats.call("GetArray")
+        batch = self._rows[self._pos:self._pos + max_rows]
+        self._pos += len(batch)
+        return tuple(tuple(self._value(item, name) for name in self.Columns.names) for item in batch)
+
+    @staticmethod
+    def _value(item, name):
+        if name == "MessageClass":
+            return {43: "IPM.Note", 26: "IPM.Appointment"}.get(item.peek("Class"), "IPM")
+        if name == "SenderName":
+            return item.peek("Sender")
+        return item.peek(name)
+
+
+class FakeConversation:
+    """``Conversation`` of one ConversationID across the folders of a store."""
+
+    def __init__(self, root, conversation_id, stats):
+        self.root = root
+        self.conversation_id = conversation_id
+        self.stats = stats
+
+    def GetTable(self):
+        self.stats.call("GetTable")
+        items = [item for folder in self.root.walk() for item in folder._items._items
+                 if item.peek("ConversationID") == self.conversation_id]
+        return FakeTable(items, self.stats)
+
+
+class FakeFolders:
+    """``Folder.Folders`` / ``Namespace.Folders``: subfolders by name."""
+
+    def __init__(self, folders, stats):
+        self._folders = folders
+        self.stats = stats
+
+    def __iter__(self):
+        return iter(list(self._folders))
+
+    def __len__(self):
+        return len(self._folders)
+
+    @property
+    def Count(self):
+        return len(self._folders)
+
+    def Item(self, name):
+        self.stats.call("Item")
+        for folder in self._folders:
+            if folder.Name == name:
+                return folder
+        raise KeyError(name)
+
+
+class FakeFolder:
+    """Folder with an Items collection, subfolders and GetTable support.
+
+    :meth:`add`, :meth:`change` and :meth:`remove` simulate changes made in
+    Outlook and raise the matching events on sinks connected through
+    ``DispatchWithEvents(folder.Items, ...)``.
+    """
+
+    def __init__(self, items=(), stats=None, store_id="store-1", name="Folder", default_item_type=0):
+        self.stats = stats or ComStats()
+        self._items = FakeItems(items, self.stats)
+        self._by_id = {}
+        for item in self._items._items:
+            self._file(item)
+        self.StoreID = store_id
+        self.Name = name
+        self.DefaultItemType = default_item_type  # 0: olMailItem, 1: olAppointmentItem
+        self.EntryID = f"folder-{id(self):x}"
+        self.Parent = None
+        self._children = []
+        self.tables = []
+        self.sinks = []
+
+    @property
+    def Folders(self):
+        return FakeFolders(self._children, self.stats)
+
+    @property
+    def FolderPath(self):
+        names, folder = [], self
+        while folder is not None:
+            names.append(folder.Name)
+            folder = folder.Parent
+        return "\\\\" + "\\".join(reversed(names))
+
+    def add_folder(self, folder):
+        """Attach ``folder`` (and its subtree) as a subfolder in this store."""
+        folder.Parent = self
+        self._children.append(folder)
+        for descendant in folder.walk():
+            descendant.StoreID = self.StoreID
+        return folder
+
+    def walk(self):
+        """This folder and all folders below it."""
+        yield self
+        for child in self._children:
+            yield from child.walk()
+
+    def _file(self, item):
+        object.__setattr__(item, "_folder_ref", self)
+        self._by_id[item.peek("EntryID")] = item
+
+    @property
+    def Items(self):
+        # Outlook hands out a fresh Items object on every access.
+        items = FakeItems(self._items._items, self.stats, folder=self)
+        items.filters = self._items.filters
+        return items
+
+    def _fire(self, event, *args):
+        for sink in list(self.sinks):
+            handler = getattr(sink, event, None)
+            if handler is not None:
+                handler(*args)
+
+    def contains(self, item):
+        return self._by_id.get(item.peek("EntryID")) is item
+
+    def item(self, entry_id):
+        return self._by_id.get(entry_id)
+
+    def add(self, item):
+        """Simulate an item arriving in the folder."""
+        self._items._items.append(item)
+        self._file(item)
+        self._fire("OnItemAdd", item)
+
+    def change(self, item):
+        """Simulate an item being modified."""
+        self._fire("OnItemChange", item)
+
+    def remove(self, item):
+        """Simulate an item being deleted from the folder."""
+        self._items._items.remove(item)
+        self._by_id.pop(item.peek("EntryID"), None)
+        self._fire("OnItemRemove")
+
+    def GetTable(self, filter_text="", table_contents=0):
+        self.stats.call("GetTable")
+        self.tables.append(filter_text)
+        items = self._items._items
+        if filter_text:
+            predicate = compile_filter(filter_text)
+            items = [item for item in items if predicate(item)]
+        return FakeTable(items, self.stats)
+
+
+class FakeDirectory:
+    """Exchange users that recipients resolve against, plus their free/busy."""
+
+    def __init__(self, users=(), stats=None):
+        self.stats = stats or ComStats()
+        self.users = list(users)
+        self._exact = {}
+        keys = []
+        for user in self.users:
+            for key in (user.peek("Name"), user.peek("PrimarySmtpAddress"), user.peek("Alias")):
+                key = self._key(key)
+                self._exact.setdefault(key, user)
+                keys.append((key, id(user), user))
+        keys.sort(key=lambda entry: entry[:2])
+        self._keys = [key for key, _, _ in keys]
+        self._key_users = [user for _, _, user in keys]
+        # address -> list of (start, end, FreeBusy code)
+        self.busy = {}
+
+    @staticmethod
+    def _key(text):
+        return " ".join((text or "").split()).casefold()
+
+    def resolve(self, name):
+        """Exact name/address/alias match, else a unique prefix match (like Outlook)."""
+        key = self._key(name)
+        if not key:
+            return None
+        if key in self._exact:
+            return self._exact[key]
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_left(self._keys, key + "\U0010ffff", lo)
+        candidates = {id(user): user for user in self._key_users[lo:hi]}
+        return next(iter(candidates.values())) if len(candidates) == 1 else None
+
+    def free_busy(self, address, start, minutes, days=30):
+        origin = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        codes = ["0"] * (days * 24 * 60 // minutes)
+        for busy_start, busy_end, code in self.busy.get(address, ()):
+            first = max(0, int((busy_start - origin) / datetime.timedelta(minutes=minutes)))
+            last = min(len(codes), -int(-(busy_end - origin) // datetime.timedelta(minutes=minutes)))
+            for index in range(first, last):
+                codes[index] = str(code)
+        return "".join(codes)
+
+    def address_list(self):
+        entries = [FakeAddressEntry(user, self.stats) for user in self.users]
+        stats = self.stats
+
+        class AddressEntries:
+            Count = len(entries)
+
+            @staticmethod
+            def Item(index):
+                stats.call("Item")
+                return entries[index - 1]
+
+        return FakeComObject(self.stats, AddressEntries=AddressEntries())
+
+
+class FakeStore:
+    def __init__(self, root):
+        self.root = root
+        self.DisplayName = root.Name
+        self.StoreID = root.StoreID
+
+    def GetRootFolder(self):
+        return self.root
+
+
+class FakeNamespace:
+    """MAPI namespace resolving EntryIDs against a set of fake folders.
+
+    The default folders are filed under the root of a default store, and
+    :meth:`add_store` attaches further stores (shared mailboxes, PSTs).
+    """
+
+    def __init__(self, folders=None, stats=None, directory=None):
+        self.stats = stats or ComStats()
+        self.folders = dict(folders or {})
+        self.directory = directory
+        self.stores = []
+        # Set by FakeApplication.restart until the next GetNamespace
+        self.disconnected = False
+        root = FakeFolder(stats=self.stats, name="Mailbox")
+        for folder in self.folders.values():
+            if folder.Parent is None:
+                root.add_folder(folder)
+        self.add_store(root)
+
+    def add_store(self, root):
+        self.stores.append(FakeStore(root))
+        return root
+
+    @property
+    def Stores(self):
+        return list(self.stores)
+
+    @property
+    def Folders(self):
+        return FakeFolders([store.root for store in self.stores], self.stats)
+
+    def GetFolderFromID(self, entry_id, store_id=None):
+        self.stats.call("GetFolderFromID")
+        for store in self.stores:
+            for folder in store.root.walk():
+                if folder.EntryID == entry_id:
+                    return folder
+        raise KeyError(entry_id)
+
+    def _check_connected(self):
+        if self.disconnected:
+            raise FakeComError(RPC_E_DISCONNECTED, "The object invoked has disconnected from its clients.")
+
+    @property
+    def CurrentProfileName(self):
+        self.stats.record(self, "CurrentProfileName")
+        self._check_connected()
+        return "Outlook"
+
+    def GetDefaultFolder(self, folder_type):
+        self.stats.call("GetDefaultFolder")
+        self._check_connected()
+        return self.folders[folder_type]
+
+    def GetItemFromID(self, entry_id, store_id=None):
+        self.stats.call("GetItemFromID")
+        for folder in self.folders.values():
+            item = folder.item(entry_id)
+            if item is not None:
+                return item
+        for store in self.stores:
+            for folder in store.root.walk():
+                item = folder.item(entry_id)
+                if item is not None:
+                    return item
+        raise KeyError(entry_id)
+
+    def GetGlobalAddressList(self):
+        self.stats.call("GetGlobalAddressList")
+        return self.directory.address_list()
+
+
+class FakeApplication:
+    """``Outlook.Application`` over fake folders and a fake directory.
+
+    :meth:`deliver` simulates mail arriving, raising ``NewMailEx`` on sinks
+    connected through ``DispatchWithEvents(application, ...)``.
+    """
+
+    def __init__(self, namespace, stats=None):
+        self.stats = stats or namespace.stats
+        self.namespace = namespace
+        self.sinks = []
+
+    def deliver(self, *items):
+        """Simulate mail arriving in the Inbox: ItemAdd per item, then one NewMailEx."""
+        inbox = self.namespace.folders[6]
+        for item in items:
+            inbox.add(item)
+        entry_ids = ",".join(item.peek("EntryID") for item in items)
+        for sink in list(self.sinks):
+            handler = getattr(sink, "OnNewMailEx", None)
+            if handler is not None:
+                handler(entry_ids)
+
+    def GetNamespace(self, name):
+        self.stats.call("GetNamespace")
+        self.namespace.disconnected = False
+        return self.namespace
+
+    def restart(self):
+        """Simulate Outlook restarting: the namespace fails with RPC_E_DISCONNECTED until fetched again."""
+        self.namespace.disconnected = True
+
+    def CreateItem(self, item_type):
+        self.stats.call("CreateItem")
+        if item_type == 0:
+            item = FakeMailItem("", "", None, sender="", stats=self.stats)
+            # Saving a new mail files it as a draft
+            object.__setattr__(item, "_folder_ref", self.namespace.folders.get(16))
+        elif item_type == 1:
+            item = FakeAppointmentItem("", None, None, stats=self.stats)
+        else:
+            raise ValueError(f"Unsupported item type: {item_type}")
+        object.__setattr__(item, "_directory", self.namespace.directory)
+        return item
+
+
+def make_outlook(mails=0, appointments=0, users=0, seed=0, stats=None):
+    """Application with an Inbox (6), Calendar (9), empty Drafts (16) and directory of the given sizes."""
+    stats = stats or ComStats()
+    inbox = FakeFolder(make_mailbox(mails, seed, stats=stats), stats, name="Inbox")
+    calendar = FakeFolder(make_calendar(appointments, seed, stats=stats), stats, name="Calendar",
+                          default_item_type=1)
+    drafts = FakeFolder(stats=stats, name="Drafts")
+    directory = make_directory(users, seed, stats=stats)
+    return FakeApplication(FakeNamespace({6: inbox, 9: calendar, 16: drafts}, stats, directory), stats)
+
+
+def add_archives(namespace, stores=2, folders=8, mails=200, seed=0):
+    """Attach ``stores`` archive stores, each a tree of ``folders`` mail folders.
+
+    Every folder holds ``mails`` mails over the same days as the Inbox, so
+    searches find matches in all of them.
+    """
+    stats = namespace.stats
+    for store in range(stores):
+        root = FakeFolder(stats=stats, store_id=f"archive-{store}", name=f"Archive {store}")
+        parent = root
+        for index in range(folders):
+            items = make_mailbox(mails, seed * 1000 + (store + 1) * 100 + index, stats=stats)
+            folder = FakeFolder(items, stats, name=f"Project {index}")
+            # Half the folders are nested one level below the previous one
+            (parent if index % 2 else root).add_folder(folder)
+            parent = folder
+        root.add_folder(FakeFolder(stats=stats, name="Calendar", default_item_type=1))
+        namespace.add_store(root)
+    return namespace
+
+
+_JA_ROOMS = ["東京本社 10F 会議室A", "東京本社 12F 大会議室", "大阪支店 応接室", "オンライン (Teams)"]
+_JA_RECURRING = ["週次定例", "朝会", "1on1", "部会"]
+
+
+def make_calendar(count, seed=0, start=datetime.datetime(2025, 1, 6), recurring_every=25,
+                  occurrences=12, stats=None):
+    """Generate ``count`` appointments, six per day from ``start``.
+
+    Every ``recurring_every``-th appointment is a weekly series with
+    ``occurrences`` instances, expanded when ``IncludeRecurrences`` is set.
+    """
+    rng = random.Random(seed)
+    items = []
+    for n in range(count):
+        day, slot = divmod(n, 6)
+        begin = start + datetime.timedelta(days=day, hours=9 + slot * 1.5)
+        end = begin + datetime.timedelta(minutes=rng.choice((30, 60)))
+        body = "\r\n".join(rng.choice(_JA_PHRASES) for _ in range(rng.randint(1, 4)))
+        series = ()
+        subject = f"{rng.choice(_JA_SUBJECTS)} #{n}"
+        if recurring_every and n % recurring_every == 0:
+            subject = f"{rng.choice(_JA_RECURRING)} #{n}"
+            series = [(begin + datetime.timedelta(weeks=w), end + datetime.timedelta(weeks=w))
+                      for w in range(occurrences)]
+        items.append(FakeAppointmentItem(subject, begin, end, location=rng.choice(_JA_ROOMS), body=body,
+                                         busy_status=rng.choice((1, 2, 2, 2)), entry_id=f"appt-{seed}-{n:07d}",
+                                         occurrences=series, stats=stats))
+    return items
+
+
+_JA_FAMILY = ["山田", "佐藤", "鈴木", "高橋", "田中", "伊藤", "渡辺", "山本", "中村", "小林"]
+_JA_GIVEN = ["太郎", "花子", "一郎", "美咲", "健", "次郎", "陽子", "大輔", "恵", "翔"]
+_DEPARTMENTS = ["営業部", "開発部", "人事部", "経理部", "情報システム部"]
+
+
+def make_directory(count, seed=0, stats=None):
+    """Directory of ``count`` users with Japanese names and busy calendars."""
+    rng = random.Random(seed)
+    users = []
+    for n in range(count):
+        name = f"{_JA_FAMILY[n % len(_JA_FAMILY)]} {_JA_GIVEN[(n // len(_JA_FAMILY)) % len(_JA_GIVEN)]}"
+        if n >= len(_JA_FAMILY) * len(_JA_GIVEN):
+            name += f" {n}"
+        users.append(FakeExchangeUser(name, f"user{n:05d}@example.com", department=rng.choice(_DEPARTMENTS),
+                                      job_title=rng.choice(["主任", "課長", "部長", "担当"]), company="Example株式会社",
+                                      phone=f"03-0000-{n:04d}", location="東京本社", stats=stats))
+    return FakeDirectory(users, stats)
+
+
+# -- win32com / pythoncom stand-ins --------------------------------------------
+
+RPC_E_DISCONNECTED = -2147417848
+
+
+class FakeComError(Exception):
+    """``pywintypes.com_error``: args are (hresult, message, excepinfo, argerror)."""
+
+    def __init__(self, hresult, message="", excepinfo=None, argerror=None):
+        super().__init__(hresult, message, excepinfo, argerror)
+        self.hresult = hresult
+
+
+_current = {"application": None}
+
+
+def _dispatch(prog_id):
+    application = _current["application"]
+    if application is None:
+        raise RuntimeError("No fake Outlook installed")
+    application.stats.call("Dispatch")
+    return application
+
+
+def _dispatch_with_events(obj, sink_class):
+    sink = sink_class()
+    sinks = getattr(getattr(obj, "folder", None), "sinks", None)
+    if sinks is None:
+        sinks = getattr(obj, "sinks", None)
+    if sinks is not None:
+        sinks.append(sink)
+    return sink
+
+
+_client = types.ModuleType("win32com.client")
+_client.Dispatch = _dispatch
+_client.DispatchWithEvents = _dispatch_with_events
+_win32com = types.ModuleType("win32com")
+_win32com.client = _client
+_pythoncom = types.ModuleType("pythoncom")
+_pythoncom.CoInitialize = lambda: None
+_pythoncom.CoUninitialize = lambda: None
+_pythoncom.PumpWaitingMessages = lambda: None
+_pythoncom.com_error = FakeComError
+
+
+@contextlib.contextmanager
+def installed(application):
+    """Serve ``application`` from ``win32com.client.Dispatch`` while active.
+
+    The stand-in modules stay the same objects across installs, so modules
+    that imported ``win32com.client`` earlier see the current application.
+    """
+    names = ("win32com", "win32com.client", "pythoncom")
+    saved = {name: sys.modules.get(name) for name in names}
+    previous = _current["application"]
+    sys.modules.update({"win32com": _win32com, "win32com.client": _client, "pythoncom": _pythoncom})
+    _current["application"] = application
+    try:
+        yield application
+    finally:
+        _current["application"] = previous
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+_SERVER_SCRIPT = r"""
+import asyncio, json, os, sys, tempfile
+sys.path[:0] = [os.path.join({root!r}, "src"), os.path.join({root!r}, "test")]
+scratch = tempfile.mkdtemp()
+os.environ.update(OUTLOOK_OUTBOX=os.path.join(scratch, "outbox.db"),
+                  OUTLOOK_ATTACHMENT_CACHE=os.path.join(scratch, "attachments"))
+from fake_outlook import ComStats, installed, make_outlook
+stats = ComStats()
+application = make_outlook(mails={mails}, appointments={appointments}, stats=stats)
+with installed(application):
+    import outlook_tools.server as server
+    async def main():
+{body}
+    try:
+        print(json.dumps(asyncio.run(main()), ensure_ascii=False, default=str))
+    finally:
+        server.com.shutdown()
+        server.search_pool.shutdown()
+        server.attachment_search.shutdown()
+"""
+
+
+def run_server(body, mails=0, appointments=0):
+    """Run ``body`` (the inside of ``async def main()``, using ``server`` and ``stats``) against
+    the real server module over a fake Outlook, in a fresh process, and return its JSON result.
+
+    The server keeps module-level state (connections, caches, executors),
+    so each run imports it anew.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = _SERVER_SCRIPT.format(root=root, mails=mails, appointments=appointments,
+                                   body=textwrap.indent(textwrap.dedent(body), " " * 8))
+    env = {name: value for name, value in os.environ.items() if not name.startswith("OUTLOOK_")}
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                            encoding="utf-8", timeout=120, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
@@ -0,0 +1,100 @@
+import unittest
+from datetime import datetime
+
+from src.outlook_tools.appointment_batch import (
+    CREATED, DUPLICATE, FAILED, NOT_SAVED, ROLLED_BACK, AppointmentRequest, find_clashes, format_results, parse_requests,
+)
+from src.outlook_tools.table_reader import AppointmentRow
+
+from fake_outlook import ComStats, FakeAppointmentItem, installed, make_outlook
+
+
+def request(number, subject, start, end, busy_status=2):
+    return AppointmentRequest(number, subject, datetime(2025, 1, 6, *start), datetime(2025, 1, 6, *end),
+                              busy_status=busy_status)
+
+
+class TestParseRequests(unittest.TestCase):
+    def test_every_problem_is_reported(self):
+        requests, errors = parse_requests([
+            {"subject": "OK", "start_time": "2025-01-06 09:00", "end_time": "2025-01-06 10:00"},
+            {"subject": "", "start_time": "tomorrow-ish", "end_time": "2025-01-06 10:00"},
+            {"subject": "Backwards", "start_time": "2025-01-06 10:00", "end_time": "2025-01-06 09:00"},
+            {"subject": "Odd", "start_time": "2025-01-06 09:00", "end_time": "2025-01-06 10:00",
+             "busy_status": 9, "room": "A"},
+            "not an object",
+        ], datetime.fromisoformat)
+        self.assertEqual([r.subject for r in requests], ["OK"])
+        self.assertEqual(errors, [
+            "Item 2: subject is required; invalid start_time 'tomorrow-ish'",
+            "Item 3: end_time must be after start_time",
+            "Item 4: unknown field 'room'; busy_status must be 0-4",
+            "Item 5: expected an object with subject, start_time, end_time, location, description, "
+            "categories, busy_status",
+        ])
+
+
+class TestFindClashes(unittest.TestCase):
+    def test_duplicates_and_overlaps_against_calendar_and_batch(self):
+        existing = [AppointmentRow.from_item(item) for item in (
+            FakeAppointmentItem("Standup", datetime(2025, 1, 6, 9), datetime(2025, 1, 6, 9, 15)),
+            FakeAppointmentItem("Offsite", datetime(2025, 1, 6, 8), datetime(2025, 1, 6, 18), busy_status=0),
+            FakeAppointmentItem("Review", datetime(2025, 1, 6, 13), datetime(2025, 1, 6, 14)),
+        )]
+        clashes = find_clashes([
+            request(1, "Standup", (9,), (9, 15)),
+            request(2, "Design", (13, 30), (15,)),
+            request(3, "Lunch", (12,), (13,)),
+            request(4, "Follow-up", (14, 30), (15, 30)),
+            request(5, "Focus", (13,), (14,), busy_status=0),
+        ], existing)
+        self.assertEqual([clash.duplicate for clash in clashes], [True, False, False, False, False])
+        self.assertEqual(clashes[1].conflicts, ["Review (2025-01-06 13:00-14:00)"])
+        self.assertEqual(clashes[2].conflicts, [])
+        # Overlaps an earlier entry of the same batch
+        self.assertEqual(clashes[3].conflicts, ["Design (2025-01-06 13:30-15:00)"])
+        self.assertEqual(clashes[4].conflicts, [])
+
+
+class TestAddAppointments(unittest.TestCase):
+    def setUp(self):
+        self.stats = ComStats()
+        self.application = make_outlook(appointments=300, stats=self.stats)
+        self.calendar = self.application.namespace.GetDefaultFolder(9)
+
+    def service(self):
+        from src.outlook_tools.calendar_service import OutlookCalendarService
+        return OutlookCalendarService()
+
+    def requests(self):
+        return [request(n, f"Shift {n}", (6 + n,), (6 + n, 30), busy_status=1) for n in range(1, 5)]
+
+    def test_batch_is_checked_with_one_ranged_fetch(self):
+        with installed(self.application):
+            service = self.service()
+            service.add_appointments(self.requests()[:1])
+            tables = len(self.calendar.tables)
+            results = service.add_appointments(self.requests())
+        self.assertEqual(len(self.calendar.tables), tables + 1)
+        self.assertEqual([result.status for result in results], [DUPLICATE, CREATED, CREATED, CREATED])
+        self.assertTrue(all(self.calendar.item(result.entry_id) for result in results[1:]))
+        self.assertTrue(format_results(results).startswith("Added 3 of 4 appointment(s):"))
+
+    def test_rollback_deletes_saved_items(self):
+        with installed(self.application):
+            service = self.service()
+            save = service._save
+
+            def failing_save(request):
+                if request.number == 3:
+                    raise RuntimeError("The operation failed.")
+                return save(request)
+
+            service._save = failing_save
+            results = service.add_appointments(self.requests(), rollback=True)
+        self.assertEqual([result.status for result in results], [ROLLED_BACK, ROLLED_BACK, FAILED, NOT_SAVED])
+        self.assertFalse(any(self.calendar.item(result.entry_id) for result in results[:2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import concurrent.futures
+import os
+import tempfile
+import time
+import unittest
+import zipfile
+from datetime import date, datetime
+
+from src.outlook_tools.attachments import AttachmentSearch, TextCache, cache_key, extract_text
+from src.outlook_tools.mail_query import MailQuery
+from src.outlook_tools.mail_search import FolderRef, scan_folder
+
+from fake_outlook import ComStats, FakeMailItem, make_outlook
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "attachments")
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+def read_fixture(name):
+    with open(fixture(name), "rb") as f:
+        return f.read()
+
+
+class TestExtractText(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(extract_text(fixture("report.docx")),
+                         "Project Falcon status report\n移行計画は 予定どおり進んでいます。\nRisk: vendor delay\n")
+        self.assertEqual(extract_text(fixture("budget.xlsx")),
+                         "Item\tAmount\t\nCloud hosting\t125000\t\n研修費\t48000\t\n")
+        # Slides in slide order, not archive order
+        self.assertEqual(extract_text(fixture("slides.pptx")), "Kickoff\nRoadmap 2026\nNext steps\n")
+        self.assertEqual(extract_text(fixture("invoice.pdf")), "Invoice 2025-0042 Total due: (JPY) 88,000\n")
+        self.assertIn("札幌", extract_text(fixture("notes.txt")))
+
+    def test_multibyte_text_cut_by_the_cap_is_still_decoded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for encoding in ("utf-8", "utf-8-sig", "cp932"):
+                path = os.path.join(directory, f"{encoding}.txt")
+                with open(path, "w", encoding=encoding) as f:
+                    f.write("議事録" * 100)
+                # The 40 bytes read end in the middle of a UTF-8 character
+                self.assertEqual(extract_text(path, max_chars=10), "議事録議事録議事録議", encoding)
+
+    def test_output_and_inflation_are_capped(self):
+        self.assertEqual(extract_text(fixture("report.docx"), max_chars=14), "Project Falcon")
+        # A small archive inflating to megabytes of markup before any text
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bomb.docx")
+            padding = "<w:p/>" * 2_000_000
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("word/document.xml",
+                                 '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                                 f'<w:body>{padding}<w:p><w:r><w:t>hidden</w:t></w:r></w:p></w:body></w:document>')
+            self.assertLess(os.path.getsize(path), 100_000)
+            started = time.perf_counter()
+            self.assertNotIn("hidden", extract_text(path, max_chars=100))
+            self.assertLess(time.perf_counter() - started, 1.0)
+
+
+class TestTextCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = TextCache(self.directory.name, max_bytes=25)
+        cache.put("a", "x" * 10)
+        cache.put("b", "y" * 10)
+        self.assertEqual(cache.get("a"), "x" * 10)
+        cache.put("c", "z" * 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        # Reopened from disk, in the same order of use
+        reopened = TextCache(self.directory.name, max_bytes=25)
+        self.assertEqual(reopened.get("c"), "z" * 10)
+        self.assertEqual(reopened.stats()["bytes"], 20)
+
+    def test_keys_cover_entry_index_and_size(self):
+        keys = {cache_key("e", 1, 10), cache_key("e", 2, 10), cache_key("e", 1, 11), cache_key("f", 1, 10)}
+        self.assertEqual(len(keys), 4)
+
+
+class TestAttachmentSearch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.stats = ComStats()
+        self.temp_dir = os.path.join(self.directory.name, "temp")
+        os.mkdir(self.temp_dir)
+
+    def make_search(self, executor=None, **options):
+        search = AttachmentSearch(TextCache(os.path.join(self.directory.name, "cache")), executor=executor,
+                                  temp_dir=self.temp_dir, **options)
+        self.addCleanup(search.shutdown)
+        return search
+
+    def make_mail(self, *names, entry_id="mail-1"):
+        return FakeMailItem("資料送付", "添付をご確認ください。", datetime(2025, 1, 6, 9), entry_id=entry_id,
+                            stats=self.stats, attachments=[(name, read_fixture(name)) for name in names])
+
+    def test_keywords_are_found_in_attachments_by_the_process_pool(self):
+        search = self.make_search()
+        mail = self.make_mail("report.docx", "invoice.pdf", "budget.xlsx")
+        match = search.find(mail, "mail-1", "JPY")
+        self.assertEqual(match.file_name, "invoice.pdf")
+        self.assertIn("Total due: (JPY) 88,000", match.excerpt)
+        self.assertEqual(search.find(mail, "mail-1", "cloud HOSTING").file_name, "budget.xlsx")
+        self.assertIsNone(search.find(mail, "mail-1", "札幌"))
+        # Saved files are removed once extracted
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_text_is_extracted_once(self):
+        search = self.make_search(concurrent.futures.ThreadPoolExecutor(2))
+        mail = self.make_mail("report.docx", "notes.txt")
+        self.assertEqual(search.find(mail, "mail-1", "札幌").file_name, "notes.txt")
+        saved = self.stats.calls
+        self.assertEqual(search.find(mail, "mail-1", "falcon").file_name, "report.docx")
+        self.assertEqual(self.stats.calls - saved, 2)  # Attachments.Item only, no SaveAsFile
+        stats = search.stats()
+        self.assertEqual((stats["extracted"], stats["cache"]["hits"]), (2, 2))
+
+        # The cache outlives the search
+        other = self.make_search(concurrent.futures.ThreadPoolExecutor(1))
+        self.assertIsNotNone(other.find(mail, "mail-1", "vendor delay"))
+        self.assertEqual(other.stats()["extracted"], 0)
+
+    def test_large_embedded_and_unknown_attachments_are_skipped(self):
+        search = self.make_search(concurrent.futures.ThreadPoolExecutor(1), max_size=1024)
+        mail = FakeMailItem("x", "", datetime(2025, 1, 6), entry_id="mail-2", stats=self.stats, attachments=[
+            ("big.txt", b"needle " * 1000), ("image.png", b"needle"), ("notes.txt", b"needle")])
+        mail.Attachments.Item(3).Type = 5  # olEmbeddeditem
+        self.assertIsNone(search.find(mail, "mail-2", "needle"))
+        self.assertEqual(search.stats()["skipped"], 1)
+
+    def test_scan_finds_mail_by_attachment_text(self):
+        namespace = make_outlook(mails=20, stats=self.stats).namespace
+        inbox = namespace.GetDefaultFolder(6)
+        inbox.add(self.make_mail("slides.pptx", entry_id="mail-slides"))
+        ref = FolderRef(inbox.StoreID, inbox.EntryID, inbox.FolderPath)
+        search = self.make_search(concurrent.futures.ThreadPoolExecutor(1))
+
+        query = MailQuery.for_date(date(2025, 1, 6), "roadmap", attachments=True)
+        self.assertIn('"urn:schemas:httpmail:hasattachment" = 1', query.to_dasl())
+        hits = scan_folder(namespace, ref, query, 10, attachments=search)
+        self.assertEqual([(hit.entry_id, hit.attachment.file_name) for hit in hits], [("mail-slides", "slides.pptx")])
+        # Without the flag only subjects and bodies are searched
+        self.assertEqual(scan_folder(namespace, ref, MailQuery.for_date(date(2025, 1, 6), "roadmap"), 10,
+                                     attachments=search), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from bench_outlook import run_benchmarks
+
+# COM calls / property reads allowed per run at the size below. Tighten these
+# when a change makes a path cheaper; a failure means a path got chattier.
+BUDGETS = {
+    "get_calendar_items (cold)": (3, 28),
+    "get_calendar_items (cached)": (0, 0),
+    "search_emails": (177, 350),
+    "search_emails (limit 20)": (42, 90),
+    "search_user (cold)": (4, 10),
+    "search_user (cached)": (0, 0),
+    "add_appointment": (2, 4),
+    # With more workers, fewer scans benefit from the bound found by earlier ones
+    "search all stores (workers=1)": (150, 95),
+    "search all stores (workers=4)": (300, 240),
+    "tool get_calendar": (12, 20),
+    "tool search_email": (24, 30),
+    "tool search_contact (cold)": (6, 10),
+    "tool add_appointment": (2, 8),
+}
+
+
+class TestBenchmarks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = {result.name: result
+                       for result in run_benchmarks(mails=5000, appointments=2000, users=200, runs=5)}
+
+    def test_every_scenario_ran(self):
+        self.assertEqual(set(self.results), set(BUDGETS))
+        for result in self.results.values():
+            self.assertLessEqual(result.p50_ms, result.p99_ms)
+
+    def test_com_traffic_stays_within_budget(self):
+        for name, (calls, reads) in BUDGETS.items():
+            with self.subTest(name):
+                self.assertLessEqual(self.results[name].com_calls, calls)
+                self.assertLessEqual(self.results[name].com_reads, reads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+from datetime import datetime, timedelta
+
+from src.outlook_tools.calendar_cache import CalendarCacheEvents, CalendarRangeCache, fetch_appointments
+from src.outlook_tools.table_reader import OutlookTableBackend, TableReader
+
+from fake_outlook import ComStats, FakeAppointmentItem, FakeComObject, FakeFolder, FakeNamespace
+
+MONDAY = datetime(2025, 1, 6)
+
+
+def make_calendar(stats):
+    items = []
+    for day in range(14):
+        for hour in (9, 13, 16):
+            start = MONDAY + timedelta(days=day, hours=hour)
+            items.append(FakeAppointmentItem(f"Meeting {day}-{hour}", start, start + timedelta(hours=1),
+                                             entry_id=f"appt-{day}-{hour}", stats=stats))
+    # Crosses midnight between Tuesday and Wednesday
+    items.append(FakeAppointmentItem("Night shift", MONDAY + timedelta(days=1, hours=23),
+                                     MONDAY + timedelta(days=2, hours=1), entry_id="night", stats=stats))
+    standup = [(MONDAY + timedelta(days=d, hours=8), MONDAY + timedelta(days=d, hours=8, minutes=15))
+               for d in range(14)]
+    items.append(FakeAppointmentItem("Standup", standup[0][0], standup[0][1], entry_id="standup",
+                                     occurrences=standup, stats=stats))
+    return FakeFolder(items, stats)
+
+
+class CalendarFixture:
+    def __init__(self, max_rows=5000):
+        self.stats = ComStats()
+        self.folder = make_calendar(self.stats)
+        self.reader = TableReader(OutlookTableBackend(self.folder, FakeNamespace({9: self.folder}, self.stats)))
+        self.cache = CalendarRangeCache(self.fetch, max_rows=max_rows)
+        self.events = CalendarCacheEvents()
+        self.events.cache = self.cache
+        self.events.entry_ids = lambda: {row[0] for row in OutlookTableBackend(self.folder, None)
+                                         .rows(None, ("EntryID",), 1000)}
+
+    def fetch(self, start, end):
+        return fetch_appointments(self.folder, self.reader, start, end)
+
+    def uncached(self, start, end):
+        return [(row.entry_id, row.start) for row in self.fetch(start, end)
+                if row.start >= start and row.end <= end]
+
+
+def keys(rows):
+    return [(row.entry_id, row.start) for row in rows]
+
+
+class TestCalendarRangeCache(unittest.TestCase):
+    def test_sub_ranges_are_served_from_memory(self):
+        fixture = CalendarFixture()
+        week = fixture.cache.get(MONDAY, MONDAY + timedelta(days=7))
+        self.assertEqual(keys(week), fixture.uncached(MONDAY, MONDAY + timedelta(days=7)))
+        fixture.stats.reset()
+
+        tuesday = fixture.cache.get(MONDAY + timedelta(days=1), MONDAY + timedelta(days=2))
+
+        self.assertEqual(fixture.stats.calls, 0)
+        self.assertEqual([row.subject for row in tuesday],
+                         ["Standup", "Meeting 1-9", "Meeting 1-13", "Meeting 1-16"])
+        self.assertEqual(fixture.cache.stats()["hits"], 1)
+
+    def test_only_uncovered_gaps_are_fetched(self):
+        fixture = CalendarFixture()
+        fixture.cache.get(MONDAY, MONDAY + timedelta(days=2))
+        fixture.cache.get(MONDAY + timedelta(days=4), MONDAY + timedelta(days=5))
+        fetched = []
+        fixture.cache._fetch = lambda start, end: fetched.append((start, end)) or fixture.fetch(start, end)
+
+        rows = fixture.cache.get(MONDAY, MONDAY + timedelta(days=7))
+
+        self.assertEqual(fetched, [(MONDAY + timedelta(days=2), MONDAY + timedelta(days=4)),
+                                   (MONDAY + timedelta(days=5), MONDAY + timedelta(days=7))])
+        # The event crossing the first range's end is still found exactly once
+        self.assertEqual(keys(rows), fixture.uncached(MONDAY, MONDAY + timedelta(days=7)))
+        self.assertEqual([row.entry_id for row in rows].count("night"), 1)
+        self.assertEqual(fixture.cache.stats()["partial_hits"], 1)
+
+    def test_item_change_event_invalidates_moved_item(self):
+        fixture = CalendarFixture()
+        fixture.cache.get(MONDAY, MONDAY + timedelta(days=14))
+        item = next(i for i in fixture.folder.Items if i.peek("EntryID") == "appt-0-9")
+        item.Start = MONDAY + timedelta(days=10, hours=11)
+        item.End = MONDAY + timedelta(days=10, hours=12)
+
+        fixture.events.OnItemChange(item)
+
+        monday = [row.entry_id for row in fixture.cache.get(MONDAY, MONDAY + timedelta(days=1))]
+        later = [row.entry_id for row in fixture.cache.get(MONDAY + timedelta(days=10),
+                                                           MONDAY + timedelta(days=11))]
+        self.assertNotIn("appt-0-9", monday)
+        self.assertIn("appt-0-9", later)
+
+    def test_item_add_and_remove_events(self):
+        fixture = CalendarFixture()
+        fixture.cache.get(MONDAY, MONDAY + timedelta(days=7))
+        added = FakeAppointmentItem("New", MONDAY + timedelta(days=3, hours=11), MONDAY + timedelta(days=3, hours=12),
+                                    entry_id="new", stats=fixture.stats)
+        fixture.folder.add(added)
+        fixture.events.OnItemAdd(added)
+        self.assertIn("new", [row.entry_id for row in fixture.cache.get(MONDAY, MONDAY + timedelta(days=7))])
+
+        removed = next(i for i in fixture.folder.Items if i.peek("EntryID") == "appt-5-13")
+        fixture.folder.remove(removed)
+        fixture.events.OnItemRemove()
+        rows = fixture.cache.get(MONDAY, MONDAY + timedelta(days=7))
+        self.assertNotIn("appt-5-13", [row.entry_id for row in rows])
+        self.assertEqual(keys(rows), fixture.uncached(MONDAY, MONDAY + timedelta(days=7)))
+
+    def test_recurring_change_invalidates_whole_pattern(self):
+        fixture = CalendarFixture()
+        fixture.cache.get(MONDAY, MONDAY + timedelta(days=14))
+        series = FakeComObject(EntryID="standup", Start=MONDAY + timedelta(hours=8),
+                               End=MONDAY + timedelta(hours=8, minutes=15), IsRecurring=True,
+                               GetRecurrencePattern=lambda: FakeComObject(
+                                   NoEndDate=False, PatternStartDate=MONDAY,
+                                   PatternEndDate=MONDAY + timedelta(days=13)))
+
+        fixture.events.OnItemChange(series)
+
+        self.assertEqual(fixture.cache.stats()["rows"], 0)
+        self.assertEqual(fixture.cache.stats()["ranges"], 0)
+
+    def test_write_invalidates_its_range(self):
+        fixture = CalendarFixture()
+        fixture.cache.get(MONDAY, MONDAY + timedelta(days=7))
+        fixture.cache.invalidate_range(MONDAY + timedelta(days=2, hours=10), MONDAY + timedelta(days=2, hours=11))
+        fetched = []
+        fixture.cache._fetch = lambda start, end: fetched.append((start, end)) or fixture.fetch(start, end)
+
+        rows = fixture.cache.get(MONDAY, MONDAY + timedelta(days=7))
+
+        self.assertEqual(len(fetched), 1)
+        self.assertEqual(keys(rows), fixture.uncached(MONDAY, MONDAY + timedelta(days=7)))
+
+    def test_least_recently_used_ranges_are_evicted(self):
+        fixture = CalendarFixture(max_rows=10)
+        for day in range(5):
+            fixture.cache.get(MONDAY + timedelta(days=day), MONDAY + timedelta(days=day + 1))
+
+        stats = fixture.cache.stats()
+        self.assertLessEqual(stats["rows"], 10)
+        self.assertGreater(stats["evictions"], 0)
+        rows = fixture.cache.get(MONDAY, MONDAY + timedelta(days=1))
+        self.assertEqual(keys(rows), fixture.uncached(MONDAY, MONDAY + timedelta(days=1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+from datetime import datetime
+
+from src.outlook_tools.changes import ADDED, CHANGED, MAIL, REMOVED, ChangeLog, ChangeTokenError, ChangeWatcher
+
+from fake_outlook import Clock, ComStats, FakeAppointmentItem, FakeMailItem, installed, make_outlook, run_server
+
+
+def make_log(capacity=100):
+    clock = Clock()
+    return ChangeLog(capacity, debounce=1.0, max_delay=5.0, clock=clock,
+                     now=lambda: datetime(2025, 1, 6, 9, 0, int(clock.now))), clock
+
+
+class TestChangeLog(unittest.TestCase):
+    def test_bursts_for_one_item_settle_as_one_change(self):
+        log, clock = make_log()
+        log.record(MAIL, ADDED, "mail-1")
+        log.record(MAIL, ADDED, "mail-1", "Hello", datetime(2025, 1, 6, 8, 59), "\\\\Mailbox\\Inbox")
+        clock.now = 0.5
+        log.record(MAIL, CHANGED, "mail-1", "Hello (edited)")
+        self.assertEqual(log.flush(), 0)  # still within the debounce window
+
+        clock.now = 1.5
+        self.assertEqual(log.flush(), 1)
+        [change] = log.since().changes
+        self.assertEqual((change.action, change.subject, change.folder), (ADDED, "Hello (edited)", "\\\\Mailbox\\Inbox"))
+
+        # An item changing all the time still settles after max_delay
+        for step in range(12):
+            clock.now = 2 + step * 0.5
+            log.record(MAIL, CHANGED, "mail-2")
+        self.assertEqual(log.flush(), 1)
+        self.assertEqual(log.stats()["events"], 15)
+
+    def test_tokens_return_each_change_once(self):
+        log, clock = make_log()
+        start = log.token
+        for n in range(3):
+            log.record(MAIL, ADDED, f"mail-{n}")
+        log.flush(force=True)
+        first = log.since(start, limit=2)
+        self.assertEqual([change.entry_id for change in first.changes], ["mail-0", "mail-1"])
+        self.assertTrue(first.more)
+        second = log.since(first.token)
+        self.assertEqual([change.entry_id for change in second.changes], ["mail-2"])
+        self.assertEqual(log.since(second.token).changes, [])
+        self.assertEqual(log.since(second.token).token, second.token)
+        with self.assertRaises(ChangeTokenError):
+            log.since("not-a-token")
+
+    def test_lost_changes_are_reported(self):
+        log, clock = make_log(capacity=2)
+        token = log.token
+        for n in range(3):
+            log.record(MAIL, ADDED, f"mail-{n}")
+            log.flush(force=True)
+        batch = log.since(token)
+        self.assertTrue(batch.missed)
+        self.assertEqual([change.entry_id for change in batch.changes], ["mail-1", "mail-2"])
+        self.assertFalse(log.since(batch.token).missed)
+
+        # Outlook reconnected: events may have been lost in between
+        log.record(MAIL, CHANGED, "mail-2")
+        log.mark_missed()
+        batch = log.since(batch.token)
+        self.assertTrue(batch.missed)
+        self.assertEqual([change.action for change in batch.changes], [CHANGED])
+        # Tokens of an earlier server run
+        self.assertTrue(log.since("0000-5").missed)
+
+
+class TestChangeWatcher(unittest.TestCase):
+    def test_synthetic_outlook_events_are_recorded(self):
+        stats = ComStats()
+        application = make_outlook(mails=5, appointments=5, stats=stats)
+        inbox = application.namespace.GetDefaultFolder(6)
+        calendar = application.namespace.GetDefaultFolder(9)
+        log, clock = make_log()
+        watcher = ChangeWatcher(log)
+        with installed(application):
+            watcher.watch(application, inbox, calendar)
+        token = log.token
+
+        # NewMailEx and ItemAdd for the same messages
+        application.deliver(FakeMailItem("Invoice", "", datetime(2025, 1, 6, 9), entry_id="new-1", stats=stats),
+                            FakeMailItem("Agenda", "", datetime(2025, 1, 6, 9), entry_id="new-2", stats=stats))
+        meeting = FakeAppointmentItem("Review", datetime(2025, 1, 7, 10), datetime(2025, 1, 7, 11),
+                                      entry_id="appt-new", stats=stats)
+        calendar.add(meeting)
+        calendar.change(meeting)
+        calendar.remove(meeting)
+        log.flush(force=True)
+
+        changes = log.since(token).changes
+        self.assertEqual([(change.kind, change.action, change.entry_id, change.subject) for change in changes], [
+            ("mail", ADDED, "new-1", "Invoice"),
+            ("mail", ADDED, "new-2", "Agenda"),
+            ("appointment", ADDED, "appt-new", "Review"),
+            ("appointment", REMOVED, "", None),
+        ])
+        self.assertEqual(changes[2].time, datetime(2025, 1, 7, 10))
+        self.assertEqual(changes[3].folder, calendar.FolderPath)
+
+        watcher.stop()
+        inbox.add(FakeMailItem("Late", "", datetime(2025, 1, 6, 10), entry_id="new-3", stats=stats))
+        self.assertEqual(log.stats()["pending"], 0)
+
+
+class TestServerNotifications(unittest.TestCase):
+    def test_only_sessions_that_ask_are_notified(self):
+        result = run_server("""
+            import types
+            from datetime import datetime
+            from fake_outlook import FakeMailItem
+
+            class Session:
+                def __init__(self):
+                    self.updates = []
+                async def send_resource_updated(self, uri):
+                    self.updates.append(str(uri))
+
+            session = Session()
+            server.mcp.get_context = lambda: types.SimpleNamespace(session=session)
+            server.change_log.debounce = 0.05
+
+            async def deliver(n, notify=None):
+                token = server.change_log.token
+                await server.get_changes(token, notify=notify)
+                application.deliver(FakeMailItem(f"Mail {n}", "", datetime(2025, 1, 6, 9), entry_id=f"new-{n}"))
+                await asyncio.sleep(0.3)
+                return len(session.updates)
+
+            return [await deliver(1), await deliver(2, True), await deliver(3), await deliver(4, False)]
+        """)
+        # Calling get_changes alone does not enroll; notify=true does until notify=false
+        self.assertEqual(result, [0, 1, 2, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
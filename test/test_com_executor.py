@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.outlook_tools.com_executor import (
+    ComBusyError, ComExecutor, ComExecutorError, ComTimeoutError, LazyComObject,
+)
+
+
+class SlowComObject:
+    """Fake COM object that must stay on the thread that created it."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.owner = threading.get_ident()
+        self.calls = 0
+
+    def Query(self, value):
+        if threading.get_ident() != self.owner:
+            raise RuntimeError("The application called an interface that was marshalled for a different thread")
+        time.sleep(self.delay)
+        self.calls += 1
+        return value
+
+
+class ApartmentLog:
+    def __init__(self):
+        self.initialized = []
+        self.finalized = []
+
+    def make_executor(self, **kwargs):
+        return ComExecutor(
+            initializer=lambda: self.initialized.append(threading.get_ident()),
+            finalizer=lambda: self.finalized.append(threading.get_ident()),
+            **kwargs,
+        )
+
+
+class TestComExecutor(unittest.TestCase):
+    def setUp(self):
+        self.log = ApartmentLog()
+
+    def test_jobs_run_on_initialized_worker_without_blocking_loop(self):
+        executor = self.log.make_executor()
+        com_object = executor.submit(SlowComObject, 0.2).result()
+
+        async def main():
+            ticks = 0
+
+            async def heartbeat():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            beat = asyncio.create_task(heartbeat())
+            result = await executor.run(com_object.Query, "ok")
+            beat.cancel()
+            return result, ticks
+
+        result, ticks = asyncio.run(main())
+        self.assertEqual(result, "ok")
+        self.assertGreater(ticks, 5)
+        self.assertEqual(self.log.initialized, [com_object.owner])
+        executor.shutdown()
+        self.assertEqual(self.log.finalized, [com_object.owner])
+
+    def test_timeout_drops_queued_jobs(self):
+        executor = self.log.make_executor()
+        com_object = executor.submit(SlowComObject, 0.2).result()
+
+        async def main():
+            first = asyncio.create_task(executor.run(com_object.Query, 1, timeout=0.05))
+            second = asyncio.create_task(executor.run(com_object.Query, 2, timeout=0.05))
+            return await asyncio.gather(first, second, return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertTrue(all(isinstance(r, ComTimeoutError) for r in results))
+        executor.shutdown()
+        # The running job finishes; the queued one never reaches Outlook.
+        self.assertEqual(com_object.calls, 1)
+
+    def test_cancellation_drops_queued_job(self):
+        executor = self.log.make_executor()
+        com_object = executor.submit(SlowComObject, 0.1).result()
+
+        async def main():
+            running = asyncio.create_task(executor.run(com_object.Query, 1))
+            queued = asyncio.create_task(executor.run(com_object.Query, 2))
+            await asyncio.sleep(0.01)
+            queued.cancel()
+            return await running
+
+        self.assertEqual(asyncio.run(main()), 1)
+        executor.shutdown()
+        self.assertEqual(com_object.calls, 1)
+
+    def test_full_queue_applies_backpressure(self):
+        executor = self.log.make_executor(max_queue=2)
+        gate = threading.Event()
+        executor.submit(gate.wait)
+        time.sleep(0.05)  # let the worker pick up the blocking job
+        executor.submit(lambda: None)
+        executor.submit(lambda: None)
+        with self.assertRaises(ComBusyError):
+            executor.submit(lambda: None)
+        gate.set()
+        executor.shutdown()
+
+    def test_multiple_workers_each_own_an_apartment(self):
+        executor = self.log.make_executor(workers=3)
+
+        def per_thread_object():
+            if not hasattr(executor.local, "com_object"):
+                executor.local.com_object = SlowComObject(0.05)
+            return executor.local.com_object.Query(threading.get_ident())
+
+        async def main():
+            return await asyncio.gather(*(executor.run(per_thread_object) for _ in range(9)))
+
+        started = time.perf_counter()
+        threads = asyncio.run(main())
+        elapsed = time.perf_counter() - started
+        executor.shutdown()
+        self.assertEqual(len(set(self.log.initialized)), 3)
+        self.assertLessEqual(set(threads), set(self.log.initialized))
+        self.assertLess(elapsed, 9 * 0.05)
+
+
+class TestLazyComObject(unittest.TestCase):
+    def test_object_is_created_on_first_job_on_the_worker(self):
+        executor = ComExecutor(initializer=lambda: None, finalizer=lambda: None)
+        created = []
+
+        def factory():
+            created.append(threading.get_ident())
+            return SlowComObject(0)
+
+        lazy = LazyComObject(executor, factory)
+        self.assertFalse(lazy.created)
+        self.assertEqual(created, [])
+
+        async def main():
+            return await asyncio.gather(executor.run(lazy.Query, 1), executor.run(lazy.Query, 2))
+
+        self.assertEqual(asyncio.run(main()), [1, 2])
+        self.assertEqual(len(created), 1)
+        self.assertEqual(executor.submit(lambda: lazy.get().owner).result(), created[0])
+        executor.shutdown()
+
+    def test_get_refuses_to_create_off_the_worker(self):
+        executor = ComExecutor(initializer=lambda: None, finalizer=lambda: None)
+        lazy = LazyComObject(executor, SlowComObject)
+        with self.assertRaises(ComExecutorError):
+            lazy.get()
+        lazy.warm_up().result()
+        self.assertTrue(lazy.created)
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
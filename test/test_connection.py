@@ -0,0 +1,98 @@
+import threading
+import unittest
+
+from src.outlook_tools.connection import RPC_E_DISCONNECTED, OutlookConnections, is_disconnected
+
+from fake_outlook import Clock, ComStats, FakeComError, make_outlook
+
+
+class TestOutlookConnections(unittest.TestCase):
+    def setUp(self):
+        self.stats = ComStats()
+        self.application = make_outlook(mails=5, stats=self.stats)
+        self.dispatched = 0
+        self.failures = 0
+        self.clock = Clock()
+        self.sleeps = []
+        self.connections = OutlookConnections(self.dispatch, probe_interval=30, clock=self.clock,
+                                              sleep=self.sleeps.append)
+
+    def dispatch(self, name):
+        self.dispatched += 1
+        if self.failures:
+            self.failures -= 1
+            raise FakeComError(-2146959355, "Server execution failed")
+        return self.application
+
+    def test_connections_are_kept_per_thread(self):
+        first = self.connections.get()
+        self.assertIs(self.connections.get(), first)
+        self.assertIs(self.connections.default_folder(6), self.connections.default_folder(6))
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.connections.get()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], first)
+        self.assertEqual(self.dispatched, 2)
+        stats = self.connections.stats()
+        self.assertEqual((stats["connects"], stats["reuses"]), (2, 3))
+        self.assertGreaterEqual(stats["saved_setup_ms"], 0)
+
+    def test_idle_connection_is_probed_and_replaced_after_a_restart(self):
+        self.connections.get()
+        self.application.restart()
+        self.clock.now = 10
+        # Within the probe interval the handle is trusted as is
+        self.connections.get()
+        self.assertEqual(self.dispatched, 1)
+
+        self.clock.now = 100
+        self.connections.get()
+        self.assertEqual(self.dispatched, 2)
+        self.assertEqual(self.connections.stats()["failed_probes"], 1)
+
+    def test_reads_are_retried_on_a_fresh_connection(self):
+        resets = []
+        self.connections.on_reset(lambda: resets.append(True))
+        self.connections.get()
+        self.application.restart()
+
+        inbox = self.connections.call(lambda: self.connections.namespace().GetDefaultFolder(6))
+        self.assertIs(inbox, self.application.namespace.folders[6])
+        self.assertEqual(self.dispatched, 2)
+        self.assertEqual(resets, [True])
+        self.assertEqual(self.sleeps, [0.5])
+        self.assertEqual(self.connections.stats()["retries"], 1)
+
+    def test_other_errors_are_not_retried(self):
+        calls = []
+
+        def read():
+            calls.append(True)
+            raise KeyError("missing")
+
+        with self.assertRaises(KeyError):
+            self.connections.call(read)
+        self.assertEqual(len(calls), 1)
+
+    def test_dispatch_is_retried_with_backoff(self):
+        self.failures = 2
+        self.connections.get()
+        self.assertEqual(self.dispatched, 3)
+        self.assertEqual(self.sleeps, [0.5, 1.0])
+        self.failures = 3
+        self.connections.reset()
+        with self.assertRaises(FakeComError):
+            self.connections.get()
+
+    def test_disconnected_errors_are_recognized(self):
+        self.assertTrue(is_disconnected(FakeComError(RPC_E_DISCONNECTED)))
+        self.assertTrue(is_disconnected(FakeComError(-2147352567, "Exception occurred.",
+                                                     (0, None, None, None, 0, RPC_E_DISCONNECTED))))
+        self.assertFalse(is_disconnected(FakeComError(-2147352567)))
+        self.assertFalse(is_disconnected(ValueError("x")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from src.outlook_tools.contacts import (
+    MISSING, ContactCache, UserInfo, format_user_info, resolve_user_info,
+)
+
+from fake_outlook import Clock, FakeExchangeUser
+
+
+class FakeDirectory:
+    """Scratch mail item whose Recipients resolve against a dict."""
+
+    def __init__(self, users):
+        self.users = users
+        self.resolve_calls = 0
+        self.open_recipients = 0
+        self.Recipients = self
+
+    def Add(self, name):
+        directory = self
+        directory.open_recipients += 1
+
+        class Recipient:
+            def Resolve(self):
+                directory.resolve_calls += 1
+                return name in directory.users
+
+            @property
+            def AddressEntry(self):
+                user = directory.users[name]
+                return type("AddressEntry", (), {"GetExchangeUser": lambda _: user})()
+
+            def Delete(self):
+                directory.open_recipients -= 1
+
+        return Recipient()
+
+
+class TestContactCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = ContactCache(maxsize=2, ttl=60, negative_ttl=5, clock=self.clock)
+
+    def test_hits_misses_and_key_normalisation(self):
+        info = UserInfo("Yamada Taro", "yamada@example.com")
+        self.assertIs(self.cache.get("Yamada Taro"), MISSING)
+        self.cache.put("Yamada Taro", info)
+        self.assertIs(self.cache.get("  yamada   TARO "), info)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_negative_entries_expire_sooner(self):
+        self.cache.put("nobody", None)
+        self.cache.put("somebody", UserInfo("somebody"))
+        self.clock.now = 4
+        self.assertIsNone(self.cache.get("nobody"))
+        self.clock.now = 6
+        self.assertIs(self.cache.get("nobody"), MISSING)
+        self.assertEqual(self.cache.get("somebody").name, "somebody")
+        self.clock.now = 61
+        self.assertIs(self.cache.get("somebody"), MISSING)
+        self.assertEqual(self.cache.stats()["expirations"], 2)
+
+    def test_lru_eviction_and_invalidation(self):
+        for name in ("a", "b"):
+            self.cache.put(name, UserInfo(name))
+        self.cache.get("a")
+        self.cache.put("c", UserInfo("c"))
+        self.assertIs(self.cache.get("b"), MISSING)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertEqual(self.cache.invalidate("A"), 1)
+        self.assertEqual(self.cache.invalidate("a"), 0)
+        self.assertEqual(self.cache.invalidate(), 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_resolve_goes_to_outlook_once_per_name(self):
+        directory = FakeDirectory({"Sato": FakeExchangeUser("Sato Hanako", "sato@example.com", "営業部")})
+        cache = ContactCache()
+        for _ in range(3):
+            for name in ("Sato", "Unknown"):
+                cache.resolve(name, lambda n: resolve_user_info(directory, n))
+        self.assertEqual(directory.resolve_calls, 2)
+        self.assertEqual(directory.open_recipients, 0)
+        self.assertEqual(cache.get("sato").department, "営業部")
+        self.assertIsNone(cache.get("unknown"))
+
+
+class TestFormatUserInfo(unittest.TestCase):
+    def test_only_present_fields_are_listed(self):
+        text = format_user_info(UserInfo("Suzuki", email="suzuki@example.com", job_title="Manager"))
+        self.assertEqual(text, "User Information:\nName: Suzuki\nEmail: suzuki@example.com\nJob Title: Manager")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import random
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from src.outlook_tools.free_busy import SlotGrid, format_slots
+
+MONDAY = datetime(2025, 1, 6)
+
+
+def codes_for(busy_ranges, days=7, minutes=15, tentative_ranges=()):
+    """FreeBusy-style string starting at MONDAY midnight."""
+    codes = ["0"] * (days * 24 * 60 // minutes)
+    for value, ranges in (("2", busy_ranges), ("1", tentative_ranges)):
+        for start, end in ranges:
+            for i in range(int((start - MONDAY) / timedelta(minutes=minutes)),
+                           int((end - MONDAY) / timedelta(minutes=minutes))):
+                codes[i] = value
+    return "".join(codes)
+
+
+def at(day, hour, minute=0):
+    return MONDAY + timedelta(days=day, hours=hour, minutes=minute)
+
+
+class TestSlotGrid(unittest.TestCase):
+    def test_intersection_of_free_busy_and_local_calendar(self):
+        grid = SlotGrid(at(0, 9), at(0, 12))
+        alice = grid.from_codes("alice", codes_for([(at(0, 9), at(0, 10))]), MONDAY)
+        bob = grid.from_codes("bob", codes_for([(at(0, 10, 30), at(0, 11))]), MONDAY)
+        me = grid.from_intervals("me", [(at(0, 11, 30), at(0, 12), 2), (at(0, 9), at(0, 12), 0)])
+
+        slots = grid.find_slots([alice, bob, me], timedelta(minutes=30))
+
+        self.assertEqual([(s.start, s.end) for s in slots],
+                         [(at(0, 10), at(0, 10, 30)), (at(0, 11), at(0, 11, 30))])
+
+    def test_tentative_slots_rank_after_free_ones(self):
+        grid = SlotGrid(at(0, 9), at(0, 11))
+        alice = grid.from_codes("alice", codes_for([], tentative_ranges=[(at(0, 9), at(0, 10))]), MONDAY)
+
+        slots = grid.find_slots([alice], timedelta(hours=1))
+
+        self.assertEqual([(s.start, s.tentative) for s in slots],
+                         [(at(0, 10), []), (at(0, 9), ["alice"])])
+
+    def test_working_hours_and_unknown_data(self):
+        grid = SlotGrid(at(4, 0), at(7, 0))  # Friday to Sunday
+        # FreeBusy data only reaches Saturday; the rest counts as busy
+        short = grid.from_codes("carol", codes_for([], days=5), MONDAY)
+        allowed = grid.working_hours(9, 18)
+
+        slots = grid.find_slots([short], timedelta(hours=2), allowed=allowed, limit=20)
+
+        self.assertTrue(slots)
+        for slot in slots:
+            self.assertEqual(slot.start.weekday(), 4)
+            self.assertGreaterEqual(slot.start.hour, 9)
+            self.assertLessEqual(slot.end, at(4, 18))
+        # Non-overlapping suggestions covering the day
+        self.assertEqual(len(slots), 4)
+
+    def test_slots_start_on_step_boundaries(self):
+        grid = SlotGrid(at(0, 9, 10), at(0, 11))
+        slots = grid.find_slots([], timedelta(minutes=45), step_minutes=30)
+        self.assertEqual([s.start for s in slots], [at(0, 9, 30)])
+
+    def test_format_slots(self):
+        grid = SlotGrid(at(0, 9), at(0, 10))
+        text = format_slots(grid.find_slots([], timedelta(minutes=30)), timedelta(minutes=30), ["ghost"])
+        self.assertEqual(text, "Available slots (30 minutes):\n"
+                               "1. 2025-01-06 09:00 - 09:30\n"
+                               "2. 2025-01-06 09:30 - 10:00\n"
+                               "No free/busy information for: ghost")
+
+    def test_benchmark_dozens_of_attendees_over_four_weeks(self):
+        rng = random.Random(8)
+        days = 28
+        attendees = []
+        for n in range(40):
+            busy = []
+            for day in range(days):
+                for _ in range(rng.randint(0, 4)):
+                    start = at(day, rng.randint(8, 17), rng.choice((0, 15, 30, 45)))
+                    busy.append((start, start + timedelta(minutes=rng.choice((30, 60, 90)))))
+            attendees.append((f"user{n}", codes_for(busy, days=days + 1)))
+
+        started = time.perf_counter()
+        grid = SlotGrid(MONDAY, MONDAY + timedelta(days=days))
+        availability = [grid.from_codes(name, codes, MONDAY) for name, codes in attendees]
+        slots = grid.find_slots(availability, timedelta(minutes=30), allowed=grid.working_hours())
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 0.1)
+        for slot in slots:
+            for availability_ in availability:
+                self.assertFalse(availability_.busy & grid.span(slot.start, slot.end))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from src.outlook_tools.contacts import UserInfo
+from src.outlook_tools.gal_snapshot import GalDirectory, GalExport, GalIndex, GalSnapshot, format_candidates
+
+from fake_outlook import FakeDirectory, FakeExchangeUser, installed, make_outlook
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "gal_sample.json")
+
+
+class FakeAddressEntry:
+    def __init__(self, name, user_type=0):
+        self.AddressEntryUserType = user_type
+        self._name = name
+
+    def GetExchangeUser(self):
+        return FakeExchangeUser(self._name, f"{self._name.lower()}@example.com")
+
+
+class FakeAddressEntries:
+    def __init__(self, entries):
+        self._entries = entries
+        self.Count = len(entries)
+
+    def Item(self, index):
+        return self._entries[index - 1]
+
+
+class FakeNamespace:
+    def __init__(self, entries):
+        self._entries = FakeAddressEntries(entries)
+
+    def GetGlobalAddressList(self):
+        return type("AddressList", (), {"AddressEntries": self._entries})()
+
+
+class TestGalSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = GalSnapshot.load(FIXTURE)
+        self.index = GalIndex(self.snapshot.entries)
+
+    def names(self, query):
+        return [info.name for info, _ in self.index.search(query)]
+
+    def test_fixture_loads(self):
+        self.assertEqual(len(self.snapshot.entries), 8)
+        self.assertEqual(self.snapshot.created, datetime(2025, 1, 15, 9))
+        self.assertEqual(self.snapshot.entries[0].department, "営業部")
+
+    def test_partial_surname_returns_ranked_candidates(self):
+        self.assertEqual(self.names("山田"), ["山田 太郎", "山田 花子"])
+        self.assertEqual(set(self.names("山")), {"山田 太郎", "山田 花子", "山本 健"})
+
+    def test_exact_name_ranks_first(self):
+        results = self.index.search("山田太郎")
+        self.assertEqual(results[0][0].name, "山田 太郎")
+        self.assertEqual(results[0][1], 3.0)
+
+    def test_email_prefix_and_substring(self):
+        self.assertEqual(self.names("john.sm"), ["John Smith"])
+        self.assertEqual(self.names("Smith")[0], "John Smith")
+        self.assertIn("Jane Smithers", self.names("Smith"))
+        self.assertEqual(self.names("太郎"), ["山田 太郎"])
+
+    def test_fuzzy_match_tolerates_typos(self):
+        self.assertEqual(self.names("Jonh Smith")[0], "John Smith")
+        self.assertEqual(self.names("zzz"), [])
+
+    def test_lookup_accepts_only_a_unique_exact_match(self):
+        from src.outlook_tools.search_service import OutlookSearchService
+        application = make_outlook()
+        application.namespace.directory = FakeDirectory([FakeExchangeUser("Taro Suzuki", "suzuki@example.com")])
+        with installed(application):
+            service = OutlookSearchService()
+            service.gal = self.index
+            self.assertEqual(service.lookup_user("山田太郎").user.name, "山田 太郎")
+            # A lone fuzzy match Outlook cannot resolve either is only a candidate
+            lookup = service.lookup_user("Jonh Smith")
+            self.assertIsNone(lookup.user)
+            self.assertEqual([user.name for user, _ in lookup.candidates], ["John Smith"])
+            # A lone prefix match (taro.yamada@) does not hide the user Outlook resolves
+            self.assertEqual(service.lookup_user("Taro").user.name, "Taro Suzuki")
+
+    def test_candidate_formatting(self):
+        text = format_candidates("山田", self.index.search("山田"))
+        self.assertIn("1. 山田 太郎 <taro.yamada@example.co.jp> (営業部, 課長)", text)
+
+    def test_save_load_roundtrip_is_compressed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "gal.json.gz")
+            self.snapshot.save(path)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(2), b"\x1f\x8b")
+            loaded = GalSnapshot.load(path)
+        self.assertEqual(loaded.entries, self.snapshot.entries)
+
+    def test_export_in_chunks_and_directory_refresh(self):
+        entries = [FakeAddressEntry(f"User{n:03d}") for n in range(25)] + [FakeAddressEntry("Room", 8)]
+        export = GalExport(FakeNamespace(entries), chunk=10)
+        steps = 1
+        while not export.step():
+            steps += 1
+        self.assertEqual(steps, 3)
+        self.assertEqual(len(export.entries), 25)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "gal.json.gz")
+            directory = GalDirectory(path, max_age=timedelta(hours=1))
+            self.assertTrue(directory.stale)
+            self.assertEqual(directory.search("User001"), [])
+            directory.replace(export.snapshot())
+            self.assertFalse(directory.stale)
+            self.assertEqual(GalDirectory(path).search("user001")[0][0].name, "User001")
+
+    def test_lookup_is_sub_millisecond_on_large_directory(self):
+        surnames = ["山田", "田中", "佐藤", "鈴木", "高橋", "伊藤", "渡辺", "中村", "小林", "加藤"]
+        given = ["太郎", "花子", "一郎", "次郎", "美咲", "健", "翔太", "陽菜", "蓮", "結衣"]
+        entries = [UserInfo(f"{surnames[n % 10]}{n // 100} {given[(n // 10) % 10]}", f"user{n}@example.com")
+                   for n in range(20000)]
+        index = GalIndex(entries)
+        queries = ["山田1", "user1234", "佐藤5 翔太", "加藤99", "tanaka"] * 20
+        started = time.perf_counter()
+        for query in queries:
+            index.search(query)
+        self.assertLess((time.perf_counter() - started) / len(queries), 0.005)
+
+
+if __name__ == "__main__":
+    unittest.main()
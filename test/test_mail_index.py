@@ -0,0 +1,130 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from src.outlook_tools.mail_index import MailIndex, MailIndexEvents, ngram_query, ngram_terms
+
+from fake_outlook import ComStats, FakeFolder, FakeMailItem, make_mailbox
+
+
+def scan(items, start, end, keyword):
+    keyword = keyword.lower()
+    return sorted(
+        item.peek("EntryID") for item in items
+        if start <= item.peek("ReceivedTime") < end
+        and (keyword in item.peek("Subject").lower() or keyword in item.peek("Body").lower())
+    )
+
+
+class TestTokenizer(unittest.TestCase):
+    def test_japanese_text_becomes_bigrams(self):
+        self.assertEqual(ngram_terms("東京本社"), "東京 京本 本社")
+        self.assertEqual(ngram_terms("Ｂｕｄｇｅｔ 会"), "bu ud dg ge et 会")
+        self.assertEqual(ngram_query("京本社"), '"京本 本社"')
+        self.assertEqual(ngram_query("予算 review"), '"予算" AND "re ev vi ie ew"')
+        self.assertIsNone(ngram_query("会"))
+
+
+class TestMailIndex(unittest.TestCase):
+    def setUp(self):
+        self.stats = ComStats()
+        self.items = make_mailbox(500, stats=self.stats)
+        self.folder = FakeFolder(self.items, self.stats)
+        self.index = MailIndex(":memory:")
+
+    def tearDown(self):
+        self.index.close()
+
+    def crawl(self, limit):
+        chunks = 1
+        while not self.index.sync(self.folder, limit=limit):
+            chunks += 1
+        return chunks
+
+    def test_chunked_crawl_then_search_matches_scan(self):
+        self.assertFalse(self.index.ready)
+        self.assertEqual(self.crawl(limit=200), 3)
+        self.assertTrue(self.index.ready)
+        self.assertEqual(len(self.index), 500)
+
+        start, end = datetime(2025, 1, 1), datetime(2025, 1, 3)
+        for keyword in ("議事録", "京本社", "udge", "会", "REVIEW", "ご確認", "見つからない", ""):
+            found = sorted(mail.entry_id for mail in self.index.search(start, end, keyword))
+            self.assertEqual(found, scan(self.items, start, end, keyword), keyword)
+
+    def test_incremental_sync_reads_only_changed_items(self):
+        self.crawl(limit=None)
+        newest = self.index.high_water_mark
+        later = newest + timedelta(minutes=5)
+
+        changed = self.items[10]
+        changed.Subject = "件名を変更しました"
+        changed.LastModificationTime = later
+        self.folder.add(FakeMailItem("新着メール", "至急ご対応ください", later, entry_id="new-1",
+                                     stats=self.stats))
+
+        self.stats.reset()
+        self.assertTrue(self.index.sync(self.folder))
+        # Only items from the high-water minute onwards are read.
+        self.assertLess(len(self.stats.touched), 5)
+        self.assertEqual([m.entry_id for m in self.index.search(None, None, "至急")], ["new-1"])
+        self.assertEqual([m.entry_id for m in self.index.search(None, None, "件名を変更")],
+                         [changed.peek("EntryID")])
+        self.assertEqual(len(self.index), 501)
+
+    def test_events_add_and_remove(self):
+        self.crawl(limit=None)
+        events = MailIndexEvents()
+        events.index, events.folder = self.index, self.folder
+
+        item = FakeMailItem("イベント経由", "本文", datetime(2025, 1, 2, 9), entry_id="evt-1")
+        self.folder.add(item)
+        events.OnItemAdd(item)
+        self.assertEqual(len(self.index.search(None, None, "イベント経由")), 1)
+
+        self.folder.remove(item)
+        self.folder.remove(self.items[0])
+        events.OnItemRemove()
+        self.assertEqual(self.index.search(None, None, "イベント経由"), [])
+        self.assertEqual(len(self.index), 499)
+
+    def test_high_water_mark_tracks_newest_item(self):
+        self.crawl(limit=None)
+        self.assertEqual(self.index.high_water_mark, self.items[-1].peek("LastModificationTime"))
+
+
+    def test_indexes_without_conversations_are_migrated(self):
+        path = os.path.join(tempfile.mkdtemp(), "mail.db")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        old = sqlite3.connect(path)
+        old.execute("CREATE TABLE messages (entry_id TEXT PRIMARY KEY, received TEXT NOT NULL, subject TEXT NOT NULL,"
+                    " sender TEXT NOT NULL, recipients TEXT NOT NULL, body TEXT NOT NULL, modified TEXT NOT NULL)")
+        old.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        old.execute("CREATE VIRTUAL TABLE messages_fts USING fts5(terms, content='')")
+        first = self.items[0]
+        old.execute("INSERT INTO messages VALUES (?, '2025-01-01 08:00:00', ?, 'a', 'b', '本文', ?)",
+                    (first.peek("EntryID"), first.peek("Subject"), str(self.items[-1].peek("LastModificationTime"))))
+        old.execute("INSERT INTO messages_fts (rowid, terms) VALUES (1, ?)",
+                    (ngram_terms(first.peek("Subject") + "\n本文"),))
+        old.executemany("INSERT INTO meta VALUES (?, ?)",
+                        [("crawl_complete", "1"), ("high_water", str(self.items[-1].peek("LastModificationTime")))])
+        old.commit()
+        old.close()
+
+        index = MailIndex(path)
+        self.addCleanup(index.close)
+        # Rows indexed before the column existed are crawled again
+        self.assertFalse(index.ready)
+        self.assertIsNone(index.high_water_mark)
+        while not index.sync(self.folder):
+            pass
+        found = {mail.entry_id: mail.conversation_id for mail in index.search(None, None)}
+        self.assertEqual(found[first.peek("EntryID")], first.peek("ConversationID"))
+        self.assertEqual(len(found), len(self.items))
+
+
+if __name__ == "__main__":
+    unittest.main()
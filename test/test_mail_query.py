@@ -0,0 +1,73 @@
+import unittest
+from datetime import date, datetime, timedelta
+
+from src.outlook_tools.mail_query import MailQuery, dasl_datetime
+from src.outlook_tools.table_reader import MailRow, OutlookTableBackend, TableReader
+
+from fake_outlook import ComStats, FakeFolder, FakeMailItem, FakeNamespace
+
+
+def make_inbox(stats, days=30, per_day=20):
+    items = []
+    base = datetime(2025, 1, 1, 8, 0)
+    for day in range(days):
+        for n in range(per_day):
+            received = base + timedelta(days=day, minutes=17 * n)
+            subject = "週次定例 議事録" if n % 5 == 0 else f"Status update {n}"
+            body = "Budget review attached" if n % 7 == 0 else "本文です。よろしくお願いします。"
+            items.append(FakeMailItem(subject, body, received, stats=stats))
+    return FakeFolder(items, stats)
+
+
+def scan(inbox, target_date, keyword):
+    """The unfiltered behaviour: read every item and filter in Python."""
+    found = []
+    for message in inbox.Items:
+        if message.Class == 43 and message.ReceivedTime.date() == target_date:
+            if keyword.lower() in message.Subject.lower() or keyword.lower() in message.Body.lower():
+                found.append(message.EntryID)
+    return found
+
+
+def search(inbox, query):
+    """The search path: the DASL filter goes to Folder.GetTable, matches() re-checks the rows."""
+    reader = TableReader(OutlookTableBackend(inbox, FakeNamespace({6: inbox}, inbox.stats)))
+    return [row.entry_id for row in reader.read(MailRow, query.to_dasl(), sort="[ReceivedTime]")
+            if query.matches(row.received_time, row.subject, lambda: row.body)]
+
+
+class TestMailQuery(unittest.TestCase):
+    def test_dasl_filter_for_date_and_keyword(self):
+        query = MailQuery.for_date(date(2025, 1, 17), "O'Brien")
+        dasl = query.to_dasl()
+        self.assertTrue(dasl.startswith("@SQL="))
+        self.assertIn('"urn:schemas:httpmail:datereceived" >= ' + dasl_datetime(datetime(2025, 1, 17)), dasl)
+        self.assertIn('"urn:schemas:httpmail:datereceived" < ' + dasl_datetime(datetime(2025, 1, 18)), dasl)
+        self.assertIn("\"urn:schemas:httpmail:subject\" LIKE '%O''Brien%'", dasl)
+        self.assertIn("\"urn:schemas:httpmail:textdescription\" LIKE '%O''Brien%'", dasl)
+
+    def test_wildcard_keyword_is_left_to_postfilter(self):
+        query = MailQuery.for_date(date(2025, 1, 17), "100%")
+        self.assertNotIn("LIKE", query.to_dasl())
+        self.assertTrue(query.matches(datetime(2025, 1, 17, 9), "100% done", ""))
+        self.assertFalse(query.matches(datetime(2025, 1, 17, 9), "100 done", ""))
+
+    def test_empty_query_has_no_filter(self):
+        self.assertIsNone(MailQuery().to_dasl())
+
+    def test_filtered_table_matches_full_scan_and_touches_fewer_items(self):
+        stats = ComStats()
+        inbox = make_inbox(stats)
+        for keyword in ("議事録", "budget", "STATUS", "missing"):
+            stats.reset()
+            expected = scan(inbox, date(2025, 1, 17), keyword)
+            scan_touched = len(stats.touched)
+
+            stats.reset()
+            found = search(inbox, MailQuery.for_date(date(2025, 1, 17), keyword))
+            self.assertEqual(found, expected)
+            self.assertLess(len(stats.touched), scan_touched / 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
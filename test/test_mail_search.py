@@ -0,0 +1,123 @@
+import heapq
+import time
+import unittest
+from datetime import date
+
+from src.outlook_tools.com_executor import ComExecutor, ComTimeoutError
+from src.outlook_tools.mail_query import MailQuery
+from src.outlook_tools.mail_search import FolderSearch, SearchScope, resolve_scope, scan_folder
+from src.outlook_tools.paging import Cursor, paginate, query_scope
+
+from fake_outlook import ComStats, add_archives, make_outlook
+
+DAY = date(2025, 1, 1)
+
+
+def make_namespace(stats=None):
+    namespace = make_outlook(mails=150, stats=stats or ComStats()).namespace
+    return add_archives(namespace, stores=2, folders=6, mails=150)
+
+
+def make_executor(workers):
+    return ComExecutor(workers=workers, initializer=lambda: None, finalizer=lambda: None)
+
+
+class TestResolveScope(unittest.TestCase):
+    def setUp(self):
+        self.namespace = make_namespace()
+
+    def paths(self, scope):
+        return sorted(ref.path for ref in resolve_scope(self.namespace, scope))
+
+    def test_default_scope_is_the_inbox(self):
+        self.assertEqual(self.paths(SearchScope()), ["\\\\Mailbox\\Inbox"])
+
+    def test_paths_and_subfolders(self):
+        self.assertEqual(self.paths(SearchScope(("\\\\Archive 0\\Project 2",))), ["\\\\Archive 0\\Project 2"])
+        self.assertEqual(self.paths(SearchScope(("\\\\Archive 0/Project 2",), include_subfolders=True)),
+                         ["\\\\Archive 0\\Project 2", "\\\\Archive 0\\Project 2\\Project 3"])
+        self.assertEqual(self.paths(SearchScope(("Inbox",))), ["\\\\Mailbox\\Inbox"])
+
+    def test_all_stores_covers_mail_folders_only(self):
+        paths = self.paths(SearchScope(all_stores=True))
+        self.assertEqual(len(paths), 3 + 2 * 7)  # Mailbox root, Inbox, Drafts; each archive root + 6 folders
+        self.assertFalse(any(path.endswith("Calendar") for path in paths))
+
+    def test_unknown_folder(self):
+        with self.assertRaises(LookupError):
+            resolve_scope(self.namespace, SearchScope(("Inbox/Nope",)))
+
+
+class TestFolderSearch(unittest.TestCase):
+    def setUp(self):
+        self.stats = ComStats()
+        self.namespace = make_namespace(self.stats)
+        self.refs = resolve_scope(self.namespace, SearchScope(all_stores=True))
+        self.query = MailQuery.for_date(DAY, "会議")
+        self.executor = make_executor(3)
+        self.search = FolderSearch(self.executor, lambda: self.namespace)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def expected(self, limit=None):
+        hits = [hit for ref in self.refs for hit in scan_folder(self.namespace, ref, self.query, 10 ** 6)]
+        return [hit.key for hit in heapq.nsmallest(limit or len(hits), hits, key=lambda hit: hit.key)]
+
+    def test_merge_returns_the_earliest_matches_across_folders(self):
+        keys = [hit.key for hit in self.search.search(self.refs, self.query, 15)]
+        self.assertEqual(keys, self.expected(15))
+        self.assertEqual(len({entry_id for _, entry_id in keys}), 15)
+
+    def test_bound_from_earlier_folders_prunes_later_scans(self):
+        self.search.window = 1
+        self.stats.reset()
+        list(self.search.search(self.refs, self.query, 5))
+        pruned = self.stats.reads
+        self.search.window = len(self.refs)
+        self.stats.reset()
+        list(self.search.search(self.refs, self.query, 5))
+        self.assertLess(pruned, self.stats.reads)
+
+    def test_bodies_are_read_only_when_the_subject_does_not_match(self):
+        [inbox] = resolve_scope(self.namespace, SearchScope())
+        self.stats.reset()
+        self.assertTrue(scan_folder(self.namespace, inbox, MailQuery.for_date(DAY), 1000))
+        self.assertEqual(self.stats.read_counts["Body"], 0)
+
+        self.stats.reset()
+        hits = scan_folder(self.namespace, inbox, self.query, 1000)
+        by_body = [hit for hit in hits if "会議" not in hit.subject]
+        self.assertTrue(by_body and len(by_body) < len(hits))
+        self.assertEqual(self.stats.read_counts["Body"], len(by_body))
+
+    def test_timeout_bounds_the_whole_search(self):
+        class SlowSearch(FolderSearch):
+            def _scan(self, *args):
+                time.sleep(0.1)
+                return super()._scan(*args)
+
+        search = SlowSearch(self.executor, lambda: self.namespace)
+        search.window = 1
+        started = time.monotonic()
+        # Every folder answers well within the timeout, but all of them do not
+        with self.assertRaises(ComTimeoutError):
+            list(search.search(self.refs, self.query, 5, timeout=0.35))
+        self.assertLess(time.monotonic() - started, 0.1 * len(self.refs) - 0.2)
+
+    def test_pages_continue_across_folders(self):
+        self.query = MailQuery.for_date(DAY, "リリース判定")
+        scope = query_scope("search_email", DAY, "リリース判定", SearchScope(all_stores=True))
+        keys, cursor = [], None
+        while True:
+            hits = self.search.search(self.refs, self.query, 26, cursor)
+            page = paginate(hits, lambda hit: hit.key, lambda hit: hit.entry_id, scope, 25, cursor=cursor)
+            keys.extend(page.entries)
+            if page.cursor is None:
+                break
+            cursor = Cursor.decode(page.cursor, scope)
+        self.assertEqual(keys, [entry_id for _, entry_id in self.expected()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from src.outlook_tools.com_executor import ComExecutor
+from src.outlook_tools.outbox import CLOSED, FAILED, HELD, QUEUED, REVIEWING, SENT, Outbox, OutboxWorker
+
+from fake_outlook import FakeMailItem, make_outlook
+
+
+class OutboxTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "outbox.db")
+        self.outbox = Outbox(self.path)
+        self.outlook = make_outlook()
+        self.namespace = self.outlook.GetNamespace("MAPI")
+        self.executor = ComExecutor(initializer=lambda: None, finalizer=lambda: None, name="test-outbox")
+        self.worker = OutboxWorker(self.outbox, self.executor, lambda: self.namespace)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.outbox.close()
+        self.directory.cleanup()
+
+    def draft(self, subject="報告", hold=False):
+        mail = self.outlook.CreateItem(0)
+        mail.Subject = subject
+        mail.To = "a@example.com"
+        mail.Save()
+        drafts = self.namespace.GetDefaultFolder(16)
+        ticket = self.outbox.add(mail.EntryID, drafts.StoreID, subject, "a@example.com", hold=hold)
+        return mail, ticket
+
+
+class TestOutbox(OutboxTestCase):
+    def test_tickets_survive_a_restart(self):
+        _, first = self.draft("one")
+        _, second = self.draft("two", hold=True)
+        self.assertEqual([ticket.ticket for ticket in self.outbox.claim()], [first.ticket])
+        self.outbox.close()
+
+        reopened = Outbox(self.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get(first.ticket).state, REVIEWING)
+        self.assertEqual(reopened.get(second.ticket).state, HELD)
+        # A review cut short by the restart is queued again
+        self.assertEqual(reopened.recover(), 1)
+        self.assertEqual(reopened.counts(), {QUEUED: 1, HELD: 1})
+
+    def test_nothing_is_opened_until_first_use(self):
+        Outbox(os.path.join(self.directory.name, "unused", "outbox.db"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, "unused")))
+
+
+class TestOutboxWorker(OutboxTestCase):
+    def test_queued_drafts_are_confirmed_and_sent_in_the_background(self):
+        mails = [self.draft(f"mail {n}") for n in range(3)]
+        with mock.patch.object(FakeMailItem, "Display", autospec=True) as display:
+            self.assertEqual(self.worker.kick().result(5), 3)
+        self.assertEqual(display.call_count, 3)
+        drafts = self.namespace.GetDefaultFolder(16)
+        for mail, ticket in mails:
+            self.assertTrue(mail.peek("Sent"))
+            self.assertFalse(drafts.contains(mail))
+            self.assertEqual(self.outbox.get(ticket.ticket).state, SENT)
+
+    def test_confirmation_does_not_block_the_caller(self):
+        shown, close = threading.Event(), threading.Event()
+
+        def display(item, modal=False):
+            shown.set()
+            close.wait(5)
+
+        mail, ticket = self.draft()
+        with mock.patch.object(FakeMailItem, "Display", display):
+            future = self.worker.kick()
+            self.assertTrue(shown.wait(5))
+            self.assertEqual(self.outbox.get(ticket.ticket).state, REVIEWING)
+            # Queued while the first is on screen; the same run sends it afterwards
+            later, later_ticket = self.draft("later")
+            self.assertIs(self.worker.kick(), future)
+            close.set()
+            self.assertEqual(future.result(5), 2)
+        self.assertEqual(self.outbox.get(later_ticket.ticket).state, SENT)
+
+    def test_draft_sent_or_deleted_from_the_window_is_closed(self):
+        def display(item, modal=False):
+            item.Delete()
+
+        _, ticket = self.draft()
+        with mock.patch.object(FakeMailItem, "Display", display):
+            self.worker.kick().result(5)
+        self.assertEqual(self.outbox.get(ticket.ticket).state, CLOSED)
+
+    def test_missing_draft_fails_and_held_drafts_wait_for_release(self):
+        missing = self.outbox.add("mail-gone", "", "gone", "a@example.com")
+        mail, held = self.draft(hold=True)
+        self.worker.confirm = False
+        self.worker.kick().result(5)
+        self.assertEqual(self.outbox.get(missing.ticket).state, FAILED)
+        self.assertEqual(self.outbox.get(held.ticket).state, HELD)
+
+        self.assertEqual(self.outbox.release(), 1)
+        self.worker.kick().result(5)
+        self.assertEqual(self.outbox.get(held.ticket).state, SENT)
+        self.assertTrue(mail.peek("Sent"))
+
+
+if __name__ == "__main__":
+    unittest.main()
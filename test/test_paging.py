@@ -0,0 +1,94 @@
+import random
+import unittest
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+
+from src.outlook_tools.mail_query import MailQuery
+from src.outlook_tools.paging import Cursor, CursorError, paginate, query_scope
+from src.outlook_tools.table_reader import MailRow, OutlookTableBackend, TableReader
+
+from fake_outlook import ComStats, FakeFolder, FakeMailItem, FakeNamespace
+
+DAY = date(2025, 1, 2)
+
+
+def make_inbox(stats, count=40):
+    start = datetime(2025, 1, 2, 8, 0)
+    items = [
+        # Pairs of mails share a received time, to exercise tie handling
+        FakeMailItem(f"定例 #{n}", f"本文 {n}", start + timedelta(minutes=10 * (n // 2)),
+                     entry_id=f"mail-{n:03d}", stats=stats)
+        for n in range(count)
+    ]
+    random.Random(0).shuffle(items)
+    return FakeFolder(items, stats)
+
+
+def key(row):
+    return row.received_time, row.entry_id
+
+
+def render(row):
+    return f"{row.subject}\n{row.body}"
+
+
+class TestPaginate(unittest.TestCase):
+    def setUp(self):
+        self.stats = ComStats()
+        self.folder = make_inbox(self.stats)
+        self.reader = TableReader(OutlookTableBackend(self.folder, FakeNamespace({6: self.folder}, self.stats)))
+        self.query = MailQuery.for_date(DAY, "定例")
+        self.scope = query_scope("search_email", DAY, "定例")
+
+    def read_page(self, limit, cursor=None, max_bytes=32_000):
+        query = replace(self.query, start=cursor.resume_from) if cursor else self.query
+        rows = self.reader.read(MailRow, query.to_dasl(), sort="[ReceivedTime]")
+        return paginate(rows, key, render, self.scope, limit, max_bytes, cursor)
+
+    def test_pages_cover_every_result_once_across_ties(self):
+        entry_ids, cursor = [], None
+        while True:
+            page = self.read_page(3, cursor)
+            entry_ids.extend(entry.split("\n")[0].split("#")[1] for entry in page.entries)
+            if page.cursor is None:
+                break
+            cursor = Cursor.decode(page.cursor, self.scope)
+            self.assertEqual(cursor.offset, len(entry_ids))
+        # Tied received times come back in any order, but none is lost or repeated
+        self.assertEqual(sorted(entry_ids, key=int), [str(n) for n in range(40)])
+
+    def test_scan_stops_once_the_page_is_full(self):
+        page = self.read_page(5)
+        self.assertEqual(len(page.entries), 5)
+        # GetTable and one GetArray batch, then one GetItemFromID per rendered body;
+        # the result showing that more exist is not rendered
+        self.assertEqual(self.stats.calls, 2 + 5)
+
+    def test_resumed_scan_is_pushed_into_the_filter(self):
+        page = self.read_page(10)
+        self.read_page(10, Cursor.decode(page.cursor, self.scope))
+        self.assertIn("'01/02/2025", self.folder.tables[0])
+        self.assertNotEqual(self.folder.tables[0], self.folder.tables[1])
+        self.assertEqual(self.stats.calls, 2 * (2 + 10))
+
+    def test_byte_budget_ends_the_page_early(self):
+        one = len(render(next(iter(self.reader.read(MailRow)))).encode("utf-8"))
+        page = self.read_page(20, max_bytes=one * 3)
+        self.assertEqual(len(page.entries), 3)
+        self.assertIsNotNone(page.cursor)
+
+    def test_oversized_first_result_is_clipped(self):
+        page = self.read_page(20, max_bytes=5)
+        self.assertEqual(len(page.entries), 1)
+        self.assertLessEqual(len(page.entries[0].encode("utf-8")), 5)
+
+    def test_cursor_is_bound_to_its_query(self):
+        page = self.read_page(3)
+        with self.assertRaises(CursorError):
+            Cursor.decode(page.cursor, query_scope("search_email", DAY, "other"))
+        with self.assertRaises(CursorError):
+            Cursor.decode("not a cursor", self.scope)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from src.outlook_tools.calendar_cache import fetch_appointments
+from src.outlook_tools.snapshot import (
+    APPOINTMENT, DELETED, MAIL, Snapshot, SnapshotError, SnapshotExport, SnapshotWriter, compact,
+)
+from src.outlook_tools.table_reader import OutlookTableBackend, TableReader
+
+from fake_outlook import FakeMailItem, make_outlook, run_server
+
+WINDOW = (datetime(2025, 1, 1), datetime(2025, 4, 1))
+
+
+def appointment(entry_id, start, minutes, subject, categories="", attendees="", busy_status=2):
+    return (entry_id, start, start + timedelta(minutes=minutes), subject, "会議室A", categories, busy_status,
+            "山田 太郎", attendees)
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "snapshot.bin")
+        self.writer = SnapshotWriter(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self):
+        snapshot = Snapshot(self.path)
+        self.addCleanup(snapshot.close)
+        return snapshot
+
+
+class TestSnapshotFile(SnapshotTestCase):
+    def setUp(self):
+        super().setUp()
+        monday = datetime(2025, 1, 6, 10)
+        self.writer.append(APPOINTMENT, [
+            appointment("a-2", monday + timedelta(days=1), 30, "Team X sync", "Team X", "佐藤; 鈴木"),
+            appointment("a-1", monday, 60, "設計レビュー", "Team X, 開発", "佐藤"),
+            appointment("a-3", monday + timedelta(days=7), 90, "team x retro", "Team X", "鈴木"),
+            appointment("a-4", monday + timedelta(days=40), 60, "Quarter planning"),
+        ])
+        self.writer.append(MAIL, [
+            ("m-1", datetime(2025, 1, 6, 9), "リリース判定のお知らせ", "佐藤", "me", "\\\\Mailbox\\Inbox"),
+            ("m-2", datetime(2025, 1, 7, 9), "Re: Release plan", "鈴木", "me; 佐藤", "\\\\Mailbox\\Inbox"),
+        ])
+
+    def test_range_keyword_and_person_filters(self):
+        snapshot = self.open()
+        week = snapshot.appointments(datetime(2025, 1, 6), datetime(2025, 1, 13))
+        self.assertEqual([item.entry_id for item in week], ["a-1", "a-2"])
+        self.assertEqual(week[0].end, datetime(2025, 1, 6, 11))
+        # ASCII is matched case-insensitively, Japanese as is
+        matches = snapshot.appointments(*WINDOW, keyword="TEAM X")
+        self.assertEqual([item.entry_id for item in matches], ["a-2", "a-3"])
+        self.assertEqual([item.entry_id for item in snapshot.appointments(*WINDOW, keyword="レビュー")], ["a-1"])
+        self.assertEqual([item.entry_id for item in snapshot.appointments(*WINDOW, attendee="鈴木")], ["a-2", "a-3"])
+        self.assertEqual([mail.entry_id for mail in snapshot.mails(*WINDOW, keyword="release")], ["m-2"])
+        self.assertEqual([mail.entry_id for mail in snapshot.mails(*WINDOW, person="佐藤")], ["m-1", "m-2"])
+
+    def test_aggregations(self):
+        snapshot = self.open()
+        self.assertEqual(snapshot.aggregate(APPOINTMENT, "category", *WINDOW),
+                         [("Team X", 3, 3.0), ("(none)", 1, 1.0), ("開発", 1, 1.0)])
+        self.assertEqual(snapshot.aggregate(APPOINTMENT, "month", *WINDOW, person="佐藤"), [("2025-01", 2, 1.5)])
+        self.assertEqual(snapshot.aggregate(MAIL, "weekday", *WINDOW), [("Mon", 1, 0.0), ("Tue", 1, 0.0)])
+        with self.assertRaises(SnapshotError):
+            snapshot.aggregate(MAIL, "location")
+
+    def test_later_segments_supersede_and_delete(self):
+        self.writer.append(APPOINTMENT, [appointment("a-1", datetime(2025, 1, 8, 15), 30, "設計レビュー (延期)")])
+        self.writer.append(DELETED, [("a-3", APPOINTMENT), ("m-1", MAIL)])
+        snapshot = self.open()
+        items = snapshot.appointments(*WINDOW)
+        self.assertEqual([(item.entry_id, item.subject) for item in items],
+                         [("a-2", "Team X sync"), ("a-1", "設計レビュー (延期)"), ("a-4", "Quarter planning")])
+        self.assertEqual(snapshot.count(MAIL), 1)
+
+        size = os.path.getsize(self.path)
+        compact(self.path)
+        self.assertLess(os.path.getsize(self.path), size)
+        self.assertEqual(self.open().appointments(*WINDOW), items)
+
+    def test_torn_last_segment_is_ignored_and_overwritten(self):
+        with open(self.path, "ab") as f:
+            f.write(b"SEG1\x02partial")
+        reader = self.open()
+        self.assertEqual(reader.count(APPOINTMENT), 4)
+        self.writer.append(MAIL, [("m-3", datetime(2025, 1, 8, 9), "新着", "高橋", "me", "")])
+        self.assertEqual(self.open().count(MAIL), 3)
+        # The file was replaced rather than truncated under the open reader
+        self.assertEqual(len(reader.mails(*WINDOW)), 2)
+
+    def test_compaction_keeps_the_export_mark(self):
+        self.writer.append(DELETED, [("a-1", APPOINTMENT), ("a-2", APPOINTMENT), ("a-3", APPOINTMENT),
+                                     ("a-4", APPOINTMENT), ("m-1", MAIL), ("m-2", MAIL)],
+                           mark=datetime(2025, 1, 9))
+        compact(self.path)
+        snapshot = self.open()
+        self.assertEqual((snapshot.count(MAIL), snapshot.count(APPOINTMENT)), (0, 0))
+        self.assertEqual(snapshot.mark, datetime(2025, 1, 9))
+
+    def test_other_files_are_rejected(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.path)
+
+
+class TestSnapshotExport(SnapshotTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outlook = make_outlook(mails=300, appointments=150)
+        self.namespace = self.outlook.GetNamespace("MAPI")
+        self.inbox = self.namespace.GetDefaultFolder(6)
+        self.calendar = self.namespace.GetDefaultFolder(9)
+
+    def export(self, known=None, window=WINDOW):
+        export = SnapshotExport(self.writer, self.namespace, [(self.inbox, self.inbox.FolderPath)], self.calendar,
+                                window, since=known.mark if known else None, batch=50, known=known)
+        steps = 1
+        while not export.step():
+            steps += 1
+        return export, steps
+
+    def test_export_matches_outlook_and_deltas_append_changes(self):
+        export, steps = self.export()
+        self.assertGreater(steps, 5)
+        snapshot = self.open()
+        self.assertEqual(snapshot.count(MAIL), 300)
+        self.assertIsNotNone(snapshot.mark)
+
+        week = (datetime(2025, 1, 13), datetime(2025, 1, 20))
+        reader = TableReader(OutlookTableBackend(self.calendar, self.namespace))
+        expected = [row for row in fetch_appointments(self.calendar, reader, *week)
+                    if row.start >= week[0] and row.end <= week[1]]
+        self.assertEqual(sorted((item.start, item.subject) for item in snapshot.appointments(*week)),
+                         sorted((row.start, row.subject) for row in expected))
+
+        changed, removed = self.inbox.Items._items[:2]
+        changed.Subject = "件名を変更"
+        changed.LastModificationTime = snapshot.mark + timedelta(hours=1)
+        self.inbox.remove(removed)
+        added = FakeMailItem("新しいメール", "本文", datetime(2025, 1, 20, 9), entry_id="mail-new",
+                             LastModificationTime=snapshot.mark + timedelta(hours=2))
+        self.inbox.add(added)
+        size = os.path.getsize(self.path)
+
+        delta, _ = self.export(known=snapshot.summary())
+        self.assertEqual(delta.exported, {MAIL: 2, APPOINTMENT: 0, DELETED: 1})
+        # Only the changes were appended
+        self.assertLess(os.path.getsize(self.path) - size, 1024)
+        updated = self.open()
+        self.assertEqual(updated.count(MAIL), 300)
+        subjects = {mail.entry_id: mail.subject for mail in updated.mails(*WINDOW)}
+        self.assertEqual(subjects[changed.EntryID], "件名を変更")
+        self.assertNotIn(removed.EntryID, subjects)
+        self.assertEqual(subjects["mail-new"], "新しいメール")
+        self.assertEqual(updated.mark, snapshot.mark + timedelta(hours=2))
+
+
+    def test_delta_fills_in_a_moving_window(self):
+        self.export(window=(WINDOW[0], datetime(2025, 2, 1)))
+        self.export(known=self.open().summary(), window=WINDOW)
+        moved = self.open().appointments(*WINDOW)
+
+        full_path = os.path.join(self.directory.name, "full.bin")
+        self.writer = SnapshotWriter(full_path)
+        self.export()
+        with Snapshot(full_path) as full:
+            self.assertEqual(sorted((item.start, item.entry_id) for item in moved),
+                             sorted((item.start, item.entry_id) for item in full.appointments(*WINDOW)))
+
+
+class TestServerExport(unittest.TestCase):
+    def test_exports_close_the_file_and_compact_on_request(self):
+        result = run_server("""
+            import os, tempfile
+            import outlook_tools.snapshot as snapshot
+            server.SNAPSHOT_PATH = os.path.join(tempfile.mkdtemp(), "snapshot.bin")
+            # A writer must never find the file mapped by this process
+            mapped = []
+            opened, closed, append = snapshot.Snapshot.__init__, snapshot.Snapshot.close, snapshot.SnapshotWriter.append
+            def track_open(self, path):
+                opened(self, path)
+                mapped.append(self)
+            def track_close(self):
+                if self in mapped:
+                    mapped.remove(self)
+                closed(self)
+            def checked_append(self, *args, **kwargs):
+                assert not mapped, "snapshot file is mapped during an append"
+                return append(self, *args, **kwargs)
+            snapshot.Snapshot.__init__, snapshot.Snapshot.close = track_open, track_close
+            snapshot.SnapshotWriter.append = checked_append
+
+            results = []
+            for compact in (False, False, True):
+                page = await server.export_snapshot(compact=compact, output="json")
+                results.append([page.structuredContent["mails"], page.structuredContent["compacted"],
+                                os.path.getsize(server.SNAPSHOT_PATH)])
+            with snapshot.Snapshot(server.SNAPSHOT_PATH) as result:
+                results.append([result.count(snapshot.MAIL), result.mark is not None])
+            return results
+        """, mails=100, appointments=20)
+        first, second, third, final = result
+        self.assertEqual([first[:2], second[:2], third[:2]], [[100, False], [0, False], [0, True]])
+        # Compaction drops the empty delta segments
+        self.assertLess(third[2], second[2])
+        self.assertEqual(final, [100, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
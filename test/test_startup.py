@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports the server against stub COM modules whose Dispatch behaves like a
+# cold Outlook, then measures the time until the first list_tools answer.
+STARTUP_SCRIPT = r"""
+import asyncio, json, sys, time, types
+
+started = time.perf_counter()
+dispatched = []
+
+def Dispatch(name):
+    dispatched.append(name)
+    time.sleep(3)  # a cold Outlook launch
+
+client = types.ModuleType("win32com.client")
+client.Dispatch = Dispatch
+client.DispatchWithEvents = lambda obj, cls: Dispatch("events")
+win32com = types.ModuleType("win32com")
+win32com.client = client
+pythoncom = types.ModuleType("pythoncom")
+pythoncom.CoInitialize = lambda: None
+pythoncom.CoUninitialize = lambda: None
+pythoncom.PumpWaitingMessages = lambda: None
+sys.modules.update({"win32com": win32com, "win32com.client": client, "pythoncom": pythoncom})
+
+import outlook_tools.server as server
+imported = time.perf_counter()
+tools = asyncio.run(server.mcp.list_tools())
+print(json.dumps({
+    "import": imported - started,
+    "first_list_tools": time.perf_counter() - started,
+    "tools": len(tools),
+    "dispatched": dispatched,
+    "lazy_modules": [name for name in ("outlook_tools.calendar_service", "outlook_tools.search_service",
+                                       "dateutil.parser") if name not in sys.modules],
+}))
+"""
+
+
+def measure_startup():
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, "src"))
+    env.pop("OUTLOOK_MAIL_INDEX", None)
+    env.pop("OUTLOOK_GAL_SNAPSHOT", None)
+    output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], env=env, cwd=ROOT,
+                            capture_output=True, text=True, timeout=60, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class TestStartup(unittest.TestCase):
+    def test_first_list_tools_does_not_touch_outlook(self):
+        result = measure_startup()
+        self.assertEqual(result["dispatched"], [])
+        self.assertEqual(len(result["lazy_modules"]), 3)
+        self.assertGreater(result["tools"], 0)
+        # Well under the cold-Outlook delay; mostly the cost of importing mcp
+        self.assertLess(result["first_list_tools"], 2.0)
+
+
+if __name__ == "__main__":
+    print(json.dumps(measure_startup(), indent=2))
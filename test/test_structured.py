@@ -0,0 +1,96 @@
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from src.outlook_tools.contacts import UserInfo
+from src.outlook_tools.paging import paginate, query_scope
+from src.outlook_tools.structured import (
+    APPOINTMENT_FIELDS, USER_FIELDS, OutputError, dumps, json_result, json_size, output_format, reply, to_json,
+)
+from src.outlook_tools.table_reader import AppointmentRow, OutlookTableBackend, TableReader
+
+from fake_outlook import ComStats, FakeAppointmentItem, FakeFolder, FakeNamespace, run_server
+
+
+def make_rows(stats, count=20):
+    base = datetime(2025, 1, 6, 9, 0)
+    folder = FakeFolder([
+        FakeAppointmentItem(f"Meeting {n}", base + timedelta(hours=n), base + timedelta(hours=n, minutes=30),
+                            location="Room A", body=f"Agenda {n}\r\nDetails", stats=stats)
+        for n in range(count)
+    ], stats)
+    return TableReader(OutlookTableBackend(folder, FakeNamespace({9: folder}, stats))).read(AppointmentRow)
+
+
+class TestSerializer(unittest.TestCase):
+    def test_datetimes_and_dataclasses(self):
+        tagged = datetime(2025, 1, 6, 9, 30, 15, 500, tzinfo=timezone(timedelta(hours=9)))
+        user = UserInfo("山田 太郎", email="yamada@example.com", department="営業部")
+        self.assertEqual(to_json({"at": tagged, "user": user, "days": (tagged.date(),)}), {
+            "at": "2025-01-06T09:30:15",
+            # Unset fields are left out
+            "user": {"name": "山田 太郎", "email": "yamada@example.com", "department": "営業部"},
+            "days": ["2025-01-06"],
+        })
+        self.assertEqual(dumps({"name": "山田"}), '{"name":"山田"}')
+
+    def test_results_carry_text_and_structured_content(self):
+        result = json_result({"removed": 2, "at": datetime(2025, 1, 6)})
+        self.assertEqual(result.structuredContent, {"removed": 2, "at": "2025-01-06T00:00:00"})
+        self.assertEqual(json.loads(result.content[0].text), result.structuredContent)
+        self.assertEqual(reply("text", "Removed 2.", {"removed": 2}), "Removed 2.")
+        self.assertEqual(reply("json", "User not found: x").structuredContent, {"error": "User not found: x"})
+
+    def test_unknown_formats_and_fields_are_rejected(self):
+        self.assertEqual(output_format("", "json"), "json")
+        self.assertEqual(output_format(" JSON "), "json")
+        with self.assertRaises(OutputError):
+            output_format("xml")
+        with self.assertRaisesRegex(OutputError, "Unknown field\\(s\\): mail. Available: name, email"):
+            USER_FIELDS.project(["name", "mail"])
+
+
+class TestProjection(unittest.TestCase):
+    def test_projected_out_bodies_are_never_read(self):
+        stats = ComStats()
+        rows = list(make_rows(stats))
+        stats.reset()
+        projection = APPOINTMENT_FIELDS.project(["subject", "start"])
+        self.assertEqual(projection(rows[1]), {"subject": "Meeting 1", "start": "2025-01-06T10:00:00"})
+        projection.all(rows)
+        self.assertEqual(stats.reads, 0)
+
+        records = APPOINTMENT_FIELDS.project().all(rows[:3])
+        self.assertEqual(stats.reads, 3)
+        self.assertEqual(records[0]["body_preview"], "Agenda 0 Details")
+        self.assertEqual(list(records[0]), list(APPOINTMENT_FIELDS.fields))
+
+    def test_json_pages_are_bounded_by_their_size(self):
+        stats = ComStats()
+        projection = APPOINTMENT_FIELDS.project(["entry_id", "subject"])
+        record_size = json_size(projection(next(iter(make_rows(stats)))))
+        page = paginate(make_rows(stats), lambda row: (row.start, row.entry_id), projection, query_scope("t"),
+                        limit=20, max_bytes=record_size * 5, size=json_size)
+        self.assertEqual(len(page.entries), 5)
+        self.assertIsInstance(page.entries[0], dict)
+        self.assertIsNotNone(page.cursor)
+
+
+class TestServerProjection(unittest.TestCase):
+    def test_search_email_reads_no_bodies_for_a_subject_only_projection(self):
+        result = run_server("""
+            counts = {}
+            for keyword, fields in (("", ["subject"]), ("リリース判定", ["subject"]), ("", None)):
+                stats.reset()
+                page = await server.search_email("2025-01-01", keyword, output="json", fields=fields)
+                counts[keyword + str(fields)] = [len(page.structuredContent["emails"]), stats.read_counts["Body"]]
+            return counts
+        """, mails=200)
+        self.assertEqual(result["['subject']"], [20, 0])
+        # Subjects matching the keyword need no body to confirm the match
+        self.assertEqual(result["リリース判定['subject']"], [14, 0])
+        self.assertEqual(result["None"], [20, 20])
+
+
+if __name__ == "__main__":
+    unittest.main()
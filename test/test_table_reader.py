@@ -0,0 +1,103 @@
+import unittest
+from datetime import datetime, timedelta
+
+from src.outlook_tools.table_reader import (
+    JET_DATE_FORMAT, AppointmentRow, MailRow, OutlookTableBackend, TableReader,
+)
+
+from fake_outlook import ComStats, FakeAppointmentItem, FakeFolder, FakeMailItem, FakeNamespace
+
+
+def make_calendar(stats, count=1000):
+    base = datetime(2025, 1, 6, 9, 0)
+    items = [
+        FakeAppointmentItem(f"Meeting {n}", base + timedelta(hours=n), base + timedelta(hours=n, minutes=30),
+                            location="Room A", body=f"Agenda {n}", stats=stats)
+        for n in range(count)
+    ]
+    return FakeFolder(items, stats)
+
+
+class ListBackend:
+    """A TableBackend that is not Outlook at all."""
+
+    def __init__(self, rows, bodies):
+        self._rows = rows
+        self._bodies = bodies
+
+    def rows(self, filter, columns, batch_size, sort=None):
+        return iter(self._rows)
+
+    def item(self, entry_id):
+        return None
+
+    def body(self, entry_id):
+        return self._bodies[entry_id]
+
+
+class TestTableReader(unittest.TestCase):
+    def test_rows_are_fetched_in_batches_without_per_item_reads(self):
+        stats = ComStats()
+        folder = make_calendar(stats)
+        reader = TableReader(OutlookTableBackend(folder, FakeNamespace({9: folder}, stats)), batch_size=100)
+        stats.reset()
+
+        rows = list(reader.read(AppointmentRow, "[Start] >= '01/06/2025 12:00 AM'"))
+
+        self.assertEqual(len(rows), 1000)
+        self.assertEqual(stats.reads, 0)
+        self.assertEqual(stats.calls, 1 + 10)  # GetTable + one GetArray per batch
+        self.assertEqual(rows[3].subject, "Meeting 3")
+        self.assertEqual(rows[3]["start"], "2025-01-06 12:00")
+        self.assertEqual(rows[3].get("location"), "Room A")
+        self.assertIsNone(rows[3].get("missing"))
+
+    def test_body_is_loaded_lazily_and_once(self):
+        stats = ComStats()
+        folder = make_calendar(stats, count=10)
+        namespace = FakeNamespace({9: folder}, stats)
+        rows = list(TableReader(OutlookTableBackend(folder, namespace)).read(AppointmentRow))
+        stats.reset()
+
+        self.assertEqual(rows[2]["body"], "Agenda 2")
+        self.assertEqual(rows[2].body, "Agenda 2")
+        self.assertEqual(stats.reads, 1)
+        self.assertEqual(stats.calls, 1)  # a single GetItemFromID
+
+    def test_rows_from_live_items(self):
+        appointment = FakeAppointmentItem("Standup", datetime(2025, 1, 6, 9), datetime(2025, 1, 6, 9, 15),
+                                          body="daily")
+        row = AppointmentRow.from_item(appointment)
+        self.assertEqual(row.subject, "Standup")
+        self.assertEqual(row.body, "daily")
+        self.assertIs(row.item(), appointment)
+
+    def test_mail_rows_and_pluggable_backend(self):
+        received = datetime(2025, 1, 6, 10)
+        backend = ListBackend(
+            [("m1", "Hello", received, "Alice", "bob@example.com", "IPM.Note"),
+             ("m2", "Invite", received, "Carol", "bob@example.com", "IPM.Schedule.Meeting.Request")],
+            {"m1": "body one", "m2": "body two"},
+        )
+        rows = list(TableReader(backend).read(MailRow))
+        self.assertEqual([row.is_mail for row in rows], [True, False])
+        self.assertEqual(rows[0].sender, "Alice")
+        self.assertEqual(rows[0].body, "body one")
+
+    def test_mail_table_honours_dasl_filter(self):
+        stats = ComStats()
+        mails = [FakeMailItem(f"Subject {n}", "body", datetime(2025, 1, 1 + n % 3, 12), stats=stats)
+                 for n in range(30)]
+        folder = FakeFolder(mails, stats)
+        reader = TableReader(OutlookTableBackend(folder, FakeNamespace({6: folder}, stats)))
+        rows = list(reader.read(MailRow, "@SQL=\"urn:schemas:httpmail:subject\" LIKE '%Subject 1%'"))
+        self.assertEqual(sorted(row.subject for row in rows),
+                         sorted(f"Subject {n}" for n in range(30) if "Subject 1" in f"Subject {n}"))
+
+    def test_jet_dates_use_a_12_hour_clock(self):
+        self.assertEqual(datetime(2025, 1, 6, 14, 30).strftime(JET_DATE_FORMAT), "01/06/2025 02:30 PM")
+        self.assertEqual(datetime(2025, 1, 6, 0, 15).strftime(JET_DATE_FORMAT), "01/06/2025 12:15 AM")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from datetime import date, datetime
+
+from src.outlook_tools.mail_query import MailQuery
+from src.outlook_tools.mail_search import FolderRef, scan_folder
+from src.outlook_tools.threads import ThreadIndex, collapse, conversation_depth, read_conversation
+
+from fake_outlook import ComStats, FakeFolder, make_outlook, make_thread, run_server
+
+DAY = date(2025, 1, 1)
+
+
+class ThreadsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.stats = ComStats()
+        self.namespace = make_outlook(mails=100, stats=self.stats).namespace
+        self.inbox = self.namespace.GetDefaultFolder(6)
+        self.sent = self.inbox.Parent.add_folder(FakeFolder(stats=self.stats, name="Sent Items"))
+        # Replies alternate between the Inbox and Sent Items
+        self.thread = make_thread("リリース判定会議", 5, datetime(2025, 1, 1, 9, 5), stats=self.stats,
+                                  senders=("佐藤", "自分"))
+        for number, item in enumerate(self.thread):
+            (self.sent if number % 2 else self.inbox).add(item)
+
+
+class TestCollapse(ThreadsTestCase):
+    def test_hits_of_a_conversation_collapse_into_one_thread(self):
+        ref = FolderRef(self.inbox.StoreID, self.inbox.EntryID, self.inbox.FolderPath)
+        hits = scan_folder(self.namespace, ref, MailQuery.for_date(DAY, ""), 1000)
+        threads = collapse(hits)
+        self.assertEqual(len(threads), len(hits) - 2)
+        thread = next(thread for thread in threads if thread.count > 1)
+        self.assertEqual(thread.thread_id, "conv-thread")
+        self.assertEqual([hit.entry_id for hit in thread.messages], ["thread-000", "thread-002", "thread-004"])
+        self.assertEqual(thread.participants, ["佐藤"])
+        self.assertEqual([thread.key for thread in threads], sorted(thread.key for thread in threads))
+
+    def test_thread_index_remembers_recent_threads(self):
+        index = ThreadIndex(max_threads=2)
+        hits = [type("Hit", (), {"entry_id": f"mail-{n}", "store_id": "store-1", "conversation_id": f"conv-{n}",
+                                 "received_time": datetime(2025, 1, 1, n), "sender": ""})() for n in range(3)]
+        for thread in collapse(hits):
+            index.add(thread)
+        self.assertIsNone(index.locate("conv-0"))
+        self.assertEqual(index.locate("conv-2"), ("mail-2", "store-1"))
+        self.assertEqual(len(index), 2)
+
+
+class TestReadConversation(ThreadsTestCase):
+    def test_whole_conversation_is_read_as_one_table(self):
+        self.stats.reset()
+        conversation = read_conversation(self.namespace, "thread-004", self.inbox.StoreID)
+        self.assertEqual([message.entry_id for message in conversation.messages],
+                         [f"thread-{n:03d}" for n in range(5)])
+        self.assertEqual([message.depth for message in conversation.messages], [0, 1, 2, 3, 4])
+        self.assertEqual(conversation.latest.subject, "RE: リリース判定会議")
+        self.assertEqual(conversation.latest.sender, "佐藤")
+        # GetItemFromID, GetConversation, GetTable and one GetArray; no per-message reads
+        self.assertEqual((self.stats.calls, self.stats.reads), (4, 0))
+
+    def test_conversation_depth(self):
+        self.assertEqual(conversation_depth("00" * 22), 0)
+        self.assertEqual(conversation_depth(bytes(32)), 2)
+        self.assertEqual(conversation_depth(""), 0)
+
+
+class TestCollapsedSearch(unittest.TestCase):
+    def test_only_the_latest_message_of_each_returned_thread_is_opened(self):
+        result = run_server("""
+            counts = {}
+            for keyword in ("", "リリース判定"):
+                stats.reset()
+                text = await server.search_email("2025-01-01", keyword, limit=5, collapse_threads=True)
+                counts[keyword] = [text.count("Thread ID:"), stats.read_counts["Body"]]
+            return counts
+        """, mails=200)
+        self.assertEqual(result, {"": [5, 5], "リリース判定": [5, 5]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import inspect
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from src.outlook_tools import tracing
+from src.outlook_tools.tracing import LatencyHistogram, Tracer, traced, untraced
+
+from fake_outlook import ComStats, installed, make_calendar, make_outlook, FakeFolder
+
+
+def operations(tracer):
+    return {entry["operation"]: entry["count"] for entry in tracer.stats(top=100)["com"]["operations"]}
+
+
+class TestComProxy(unittest.TestCase):
+    def test_disabled_tracing_returns_the_object_itself(self):
+        folder = FakeFolder()
+        self.assertIs(traced(folder, "Folder", Tracer(com_enabled=False)), folder)
+
+    def test_gets_calls_and_iteration_are_counted(self):
+        tracer = Tracer(com_enabled=True)
+        folder = traced(FakeFolder(make_calendar(30)), "Folder", tracer)
+
+        items = folder.Items
+        items.IncludeRecurrences = True
+        subjects = [item.Subject for item in items.Restrict("[BusyStatus] = 2")]
+
+        counts = operations(tracer)
+        self.assertEqual(counts["get Items"], 1)
+        self.assertEqual(counts["set IncludeRecurrences"], 1)
+        self.assertEqual(counts["call Restrict"], 1)
+        self.assertEqual(counts["iter Restrict"], len(subjects))
+        self.assertEqual(counts["get Subject"], len(subjects))
+        self.assertEqual(tracer.stats()["com"]["totals"]["get"], 1 + len(subjects))
+
+    def test_proxies_are_unwrapped_when_passed_back_to_com(self):
+        tracer = Tracer(com_enabled=True)
+        raw_folder = FakeFolder()
+        folder = traced(raw_folder, "Folder", tracer)
+        item = folder.Items.Add()
+        folder.add(item)
+        self.assertTrue(raw_folder.contains(untraced(item)))
+        self.assertIs(untraced(folder), raw_folder)
+
+    def test_services_report_com_operations(self):
+        tracer = tracing.tracer
+        previous = tracer.com_enabled
+        tracer.com_enabled = True
+        tracer.reset()
+        try:
+            with installed(make_outlook(appointments=200, stats=ComStats())):
+                from src.outlook_tools.calendar_service import OutlookCalendarService
+                service = OutlookCalendarService()
+                service.get_calendar_items(datetime(2025, 1, 6), datetime(2025, 1, 13))
+        finally:
+            tracer.com_enabled = previous
+        counts = operations(tracer)
+        tracer.reset()
+        self.assertEqual(counts["call GetTable"], 1)
+        self.assertEqual(counts["call Restrict"], 1)
+        self.assertGreaterEqual(counts["call GetArray"], 1)
+
+
+class TestToolTiming(unittest.TestCase):
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        for ms in [0.5] * 90 + [30] * 9 + [4000]:
+            histogram.add(ms)
+        summary = histogram.summary()
+        self.assertEqual((summary["p50_ms"], summary["p90_ms"], summary["p99_ms"]), (1.0, 1.0, 50.0))
+        self.assertEqual(summary["max_ms"], 4000)
+        self.assertEqual(summary["histogram"], {"<=1ms": 90, "<=50ms": 9, "<=5000ms": 1})
+
+    def test_timed_tools_keep_their_signature_and_count_errors(self):
+        tracer = Tracer()
+
+        @tracer.timed
+        async def get_calendar(start_date: str, end_date: str = "") -> str:
+            if not start_date:
+                raise ValueError("missing")
+            return "ok"
+
+        self.assertEqual(list(inspect.signature(get_calendar).parameters), ["start_date", "end_date"])
+        self.assertEqual(asyncio.run(get_calendar("2025-01-06")), "ok")
+        with self.assertRaises(ValueError):
+            asyncio.run(get_calendar(""))
+        summary = tracer.stats()["tools"]["get_calendar"]
+        self.assertEqual((summary["count"], summary["errors"]), (2, 1))
+
+    def test_chrome_trace_dump(self):
+        tracer = Tracer(com_enabled=True)
+        folder = traced(FakeFolder(make_calendar(5)), "Folder", tracer)
+        list(folder.Items)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = tracer.dump_trace(os.path.join(directory, "trace.json"))
+            with open(path, encoding="utf-8") as f:
+                trace = json.load(f)
+        names = [event["name"] for event in trace["traceEvents"]]
+        self.assertEqual(names, ["get Items"] + ["iter Items"] * 5)
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in trace["traceEvents"]))
+
+
+if __name__ == "__main__":
+    unittest.main()